@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+from urllib.parse import urlsplit
+
+import orjson
+
+from .cache import CacheMiss, ResponseCache
+from .http import TruncatedResponseError, decode_json
+from .ogc import features_from_truncated
+from .paging import PageSizeController
+from .ratelimit import DEFAULT_LIMITER, RateLimiter
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _require_aiohttp():
+    # Lazy import: only required when the async engine is used.
+    try:
+        import aiohttp  # type: ignore
+    except Exception as exc:
+        raise SystemExit("Missing dependency 'aiohttp'. Install with: pip install -r requirements.txt") from exc
+    return aiohttp
+
+
+async def _read_body(resp: Any) -> tuple[bytes, bool]:
+    """Async counterpart to `http._read_body`: (bytes received, connection cut mid-body)."""
+    aiohttp = _require_aiohttp()
+    chunks: list[bytes] = []
+    try:
+        async for chunk in resp.content.iter_chunked(256 * 1024):
+            chunks.append(chunk)
+    except aiohttp.ClientPayloadError:
+        return b"".join(chunks), True
+    return b"".join(chunks), False
+
+
+@dataclass
+class AsyncHttpClient:
+    """
+    Async counterpart to `HttpClient` (aiohttp), for keeping many page requests in flight.
+
+    Concurrency is bounded twice: `max_in_flight` caps the whole client and `per_host` caps
+    each host (api.ra.no, kart.ra.no), so hundreds of concurrent pagers cannot stampede one server.
+    Use as `async with AsyncHttpClient() as http: ...`.
+    """
+
+    timeout_s: float = 60.0
+    user_agent: str = "rag-for-ra/0.1"
+    retries: int = 5
+    backoff_s: float = 1.0
+    truncation_retries: int = 1
+    per_host: int = 32
+    max_in_flight: int = 256
+    cache: ResponseCache | None = None
+    limiter: RateLimiter | None = DEFAULT_LIMITER
+    _session: Any = field(default=None, init=False, repr=False)
+    _host_sems: dict[str, asyncio.Semaphore] = field(default_factory=dict, init=False, repr=False)
+
+    async def __aenter__(self) -> AsyncHttpClient:
+        aiohttp = _require_aiohttp()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.per_host),
+            timeout=aiohttp.ClientTimeout(total=self.timeout_s),
+            headers={
+                "User-Agent": self.user_agent,
+                "Accept": "application/json",
+                "Accept-Encoding": "identity",
+            },
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _host_sem(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host)
+            self._host_sems[host] = sem
+        return sem
+
+    async def get_json(self, url: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+        if self._session is None:
+            raise RuntimeError("AsyncHttpClient must be used as an async context manager.")
+        aiohttp = _require_aiohttp()
+        params = {k: str(v) for k, v in (params or {}).items()}
+        cached = self.cache.lookup(url, params) if self.cache is not None else None
+        if cached is not None and (self.cache.offline or self.cache.is_fresh(cached)):
+            return orjson.loads(cached.body)
+        if self.cache is not None and self.cache.offline:
+            raise CacheMiss(f"Offline and not cached: {url} {params}")
+
+        last_exc: Exception | None = None
+        truncations = 0
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with self._host_sem(url):
+                    if self.limiter is not None:
+                        await self.limiter.acquire_async(url)
+                    headers = cached.validators() if cached is not None else None
+                    async with self._session.get(url, params=params, headers=headers) as resp:
+                        retry_after = resp.headers.get("Retry-After")
+                        if self.limiter is not None:
+                            self.limiter.on_response(url, resp.status, retry_after)
+                        if resp.status == 304 and cached is not None:
+                            self.cache.refresh(cached)
+                            return orjson.loads(cached.body)
+                        resp.raise_for_status()
+                        body, cut_short = await _read_body(resp)
+                        data = decode_json(
+                            body, url=url, content_length=resp.headers.get("Content-Length"), cut_short=cut_short
+                        )
+                        if self.cache is not None:
+                            self.cache.store(url, params, body, resp.headers)
+                        return data
+            except aiohttp.ClientResponseError as exc:
+                last_exc = exc
+                if exc.status not in RETRY_STATUSES or attempt >= self.retries:
+                    break
+                if self.limiter is not None and retry_after:
+                    continue
+            except TruncatedResponseError as exc:
+                # Give up quickly so the pager can shrink the page (same policy as HttpClient).
+                last_exc = exc
+                truncations += 1
+                if truncations > self.truncation_retries or attempt >= self.retries:
+                    break
+                continue
+            except Exception as exc:  # noqa: BLE001 - boundary retry wrapper
+                last_exc = exc
+                if attempt >= self.retries:
+                    break
+            await asyncio.sleep(random.uniform(0.5, 1.0) * self.backoff_s * (2**attempt))
+        assert last_exc is not None
+        raise last_exc
+
+
+@dataclass(frozen=True)
+class AsyncOgcSource:
+    """Async counterpart to `OgcSource`."""
+
+    api_base: str
+    http: AsyncHttpClient
+
+    async def collections(self) -> list[dict[str, Any]]:
+        payload = await self.http.get_json(f"{self.api_base}/collections", params={"f": "json"})
+        return list(payload.get("collections", []))
+
+    async def _fetch_page(
+        self, url: str, params: dict[str, Any], offset: int, limit: int, page_size: PageSizeController
+    ) -> tuple[list[dict[str, Any]], int | None]:
+        """
+        (features, numberMatched) of one page at `offset`, with the salvaging and page-size backoff
+        of `OgcSource.iter_pages`: a truncated page shrinks the shared `page_size` and yields its
+        complete features (fewer than asked for; the caller resumes at the first missing offset),
+        other errors halve the request and are raised after 4 attempts.
+        """
+        cur_limit = limit
+        errors = 0
+        while True:
+            try:
+                payload = await self.http.get_json(url, params=dict(params, limit=cur_limit, offset=offset))
+            except CacheMiss:
+                raise
+            except TruncatedResponseError as exc:
+                page_size.on_truncation(cur_limit)
+                salvaged = features_from_truncated(exc)
+                if salvaged:
+                    return salvaged[:cur_limit], None
+                # The page is too large to arrive intact: shrink it, down to a single feature.
+                if cur_limit <= 1:
+                    raise
+                cur_limit = max(1, min(page_size.limit, cur_limit // 2))
+                continue
+            except Exception:
+                errors += 1
+                cur_limit = max(min(5, cur_limit), cur_limit // 2)
+                if errors >= 4:
+                    raise
+                continue
+            if cur_limit == limit:
+                page_size.on_success(limit)
+            matched = payload.get("numberMatched")
+            return list(payload.get("features") or []), matched if isinstance(matched, int) else None
+
+    async def _fetch_range(
+        self, url: str, params: dict[str, Any], start: int, end: int, page_size: PageSizeController
+    ) -> list[dict[str, Any]]:
+        """Features of offsets [start, end), in as many pages as truncation makes necessary."""
+        feats: list[dict[str, Any]] = []
+        offset = start
+        while offset < end:
+            page, _matched = await self._fetch_page(url, params, offset, min(page_size.limit, end - offset), page_size)
+            if not page:
+                break
+            feats.extend(page)
+            offset += len(page)
+        return feats
+
+    async def iter_pages(
+        self,
+        collection_id: str,
+        *,
+        limit: int = 50,
+        window: int = 8,
+        max_items: int | None = None,
+        bbox: str | None = None,
+        start_offset: int = 0,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """
+        Feature pages of a collection in offset order, like `OgcSource.iter_pages_prefetch`: once the
+        first page reports `numberMatched`, up to `window` page ranges are fetched concurrently (the
+        client's per-host limit bounds what the server sees) and yielded in order. Without it, or
+        past it (the collection grew), paging continues one page at a time. Truncated pages are
+        salvaged and shrink the page size shared by all ranges.
+        """
+        url = f"{self.api_base}/collections/{collection_id}/items"
+        params: dict[str, Any] = {"f": "json"}
+        if bbox:
+            params["bbox"] = bbox
+        page_size = PageSizeController(limit=limit, max_limit=limit)
+        offset = int(start_offset)
+        end = None if max_items is None else offset + max_items
+
+        page, matched = await self._fetch_page(url, params, offset, _clip(page_size.limit, offset, end), page_size)
+        if not page:
+            return
+        yield page
+        offset += len(page)
+
+        stop = offset if matched is None else matched if end is None else min(matched, end)
+        inflight: deque[asyncio.Task[list[dict[str, Any]]]] = deque()
+        try:
+            while True:
+                while len(inflight) < max(1, window) and offset < stop:
+                    range_end = min(offset + page_size.limit, stop)
+                    inflight.append(asyncio.ensure_future(self._fetch_range(url, params, offset, range_end, page_size)))
+                    offset = range_end
+                if not inflight:
+                    break
+                feats = await inflight.popleft()
+                if feats:
+                    yield feats
+        finally:
+            for task in inflight:
+                task.cancel()
+
+        while end is None or offset < end:
+            page, _matched = await self._fetch_page(url, params, offset, _clip(page_size.limit, offset, end), page_size)
+            if not page:
+                return
+            yield page
+            offset += len(page)
+
+    async def iter_items(
+        self,
+        collection_id: str,
+        *,
+        limit: int = 50,
+        window: int = 8,
+        max_items: int | None = None,
+        bbox: str | None = None,
+        start_offset: int = 0,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """The features of `iter_pages`, one at a time (without offset skipping)."""
+        pages = self.iter_pages(
+            collection_id, limit=limit, window=window, max_items=max_items, bbox=bbox, start_offset=start_offset
+        )
+        async for page in pages:
+            for feat in page:
+                yield feat
+
+
+def _clip(limit: int, offset: int, end: int | None) -> int:
+    return limit if end is None else max(1, min(limit, end - offset))
+
+
+@dataclass(frozen=True)
+class AsyncArcGisMapServer:
+    """Async counterpart to `ArcGisMapServer` (`f=json` only)."""
+
+    mapserver_base: str
+    http: AsyncHttpClient
+    max_allowable_offset: float | None = None
+    geometry_precision: int | None = None
+
+    async def service_info(self) -> dict[str, Any]:
+        return await self.http.get_json(self.mapserver_base, params={"f": "pjson"})
+
+    async def layer_info(self, layer_id: int) -> dict[str, Any]:
+        return await self.http.get_json(f"{self.mapserver_base}/{layer_id}", params={"f": "pjson"})
+
+    async def iter_layer_pages(
+        self,
+        layer_id: int,
+        *,
+        where: str = "1=1",
+        out_fields: str = "*",
+        bbox_wgs84: str | None = None,
+        page_size: int = 2000,
+        max_items: int | None = None,
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Feature pages of a layer (`resultOffset` paging)."""
+        url = f"{self.mapserver_base}/{layer_id}/query"
+        offset = 0
+        yielded = 0
+
+        base_params: dict[str, Any] = {
+            "f": "json",
+            "where": where,
+            "outFields": out_fields,
+            "returnGeometry": "true",
+            "outSR": 4326,
+        }
+        if self.max_allowable_offset is not None:
+            base_params["maxAllowableOffset"] = self.max_allowable_offset
+        if self.geometry_precision is not None:
+            base_params["geometryPrecision"] = self.geometry_precision
+        if bbox_wgs84:
+            base_params.update(
+                {
+                    "geometryType": "esriGeometryEnvelope",
+                    "geometry": bbox_wgs84,
+                    "inSR": 4326,
+                    "spatialRel": "esriSpatialRelIntersects",
+                }
+            )
+
+        while True:
+            params = dict(base_params)
+            params["resultOffset"] = offset
+            params["resultRecordCount"] = page_size
+
+            payload = await self.http.get_json(url, params=params)
+            feats = payload.get("features") or []
+            if max_items is not None:
+                feats = feats[: max_items - yielded]
+            if not feats:
+                return
+            yield feats
+            yielded += len(feats)
+            if max_items is not None and yielded >= max_items:
+                return
+            offset += len(feats)
+
+    async def iter_layer_features(self, layer_id: int, **kwargs: Any) -> AsyncIterator[dict[str, Any]]:
+        """The features of `iter_layer_pages`, one at a time."""
+        async for page in self.iter_layer_pages(layer_id, **kwargs):
+            for feat in page:
+                yield feat
+
@@ -1,11 +1,45 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Iterable
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Iterable, Iterator
 
+from .esri_pbf import decode_feature_collection
 from .http import HttpClient
 
 
+@dataclass(frozen=True)
+class IdRange:
+    """An inclusive ObjectID range of a layer, fetched as one unit (`where <oid> BETWEEN lo AND hi`)."""
+
+    lo: int
+    hi: int
+
+
+def id_ranges(object_ids: Iterable[int], size: int) -> list[IdRange]:
+    """Splits ObjectIDs into ranges of at most `size` ids each (sparse ids make ranges wider, not bigger)."""
+    ids = sorted(set(object_ids))
+    size = max(1, int(size))
+    return [IdRange(ids[i], ids[min(i + size, len(ids)) - 1]) for i in range(0, len(ids), size)]
+
+
+def feature_layers(service_info: dict[str, Any]) -> list[dict[str, Any]]:
+    """The feature layers of a MapServer's `service_info` (group layers and tables are left out)."""
+    out: list[dict[str, Any]] = []
+    for layer in service_info.get("layers") or []:
+        kind = layer.get("type")
+        if kind == "Feature Layer" or (kind is None and not layer.get("subLayerIds")):
+            out.append(layer)
+    return out
+
+
+def supports_pbf(layer_info: dict[str, Any]) -> bool:
+    """Whether a layer advertises `f=pbf` query responses (`supportedQueryFormats`, ArcGIS 10.7+)."""
+    formats = str(layer_info.get("supportedQueryFormats") or "")
+    return "pbf" in {f.strip().lower() for f in formats.split(",")}
+
+
 @dataclass(frozen=True)
 class ArcGisMapServer:
     """
@@ -13,10 +47,17 @@ class ArcGisMapServer:
 
     Example base URL:
       https://kart.ra.no/arcgis/rest/services/Distribusjon/Kulturminner20180301/MapServer
+
+    Queries use `query_format` ("json", or "pbf" for the much smaller protobuf responses, decoded
+    to the same dicts). `max_allowable_offset` (generalization tolerance, in degrees since results
+    are WGS84) and `geometry_precision` (decimals kept) shrink geometries server-side.
     """
 
     mapserver_base: str
     http: HttpClient = HttpClient()
+    query_format: str = "json"
+    max_allowable_offset: float | None = None
+    geometry_precision: int | None = None
 
     def service_info(self) -> dict[str, Any]:
         return self.http.get_json(self.mapserver_base, params={"f": "pjson"})
@@ -24,30 +65,32 @@ class ArcGisMapServer:
     def layer_info(self, layer_id: int) -> dict[str, Any]:
         return self.http.get_json(f"{self.mapserver_base}/{layer_id}", params={"f": "pjson"})
 
-    def iter_layer_features(
-        self,
-        layer_id: int,
-        *,
-        where: str = "1=1",
-        out_fields: str = "*",
-        bbox_wgs84: str | None = None,  # "minLon,minLat,maxLon,maxLat"
-        page_size: int = 2000,
-        max_items: int | None = None,
-    ) -> Iterable[dict[str, Any]]:
+    def for_layer(self, layer_info: dict[str, Any]) -> ArcGisMapServer:
+        """This client, or a `f=json` copy of it when `f=pbf` was asked for but the layer does not offer it."""
+        if self.query_format == "pbf" and not supports_pbf(layer_info):
+            return replace(self, query_format="json")
+        return self
+
+    def _query(self, layer_id: int, params: dict[str, Any]) -> dict[str, Any]:
         url = f"{self.mapserver_base}/{layer_id}/query"
-        offset = 0
-        yielded = 0
+        if params.get("f") == "pbf":
+            return self.http.get_bytes(url, params, decode=decode_feature_collection)
+        return self.http.get_json(url, params=params)
 
-        base_params: dict[str, Any] = {
-            "f": "json",
+    def _query_params(self, where: str, out_fields: str, bbox_wgs84: str | None) -> dict[str, Any]:
+        params: dict[str, Any] = {
+            "f": self.query_format,
             "where": where,
             "outFields": out_fields,
             "returnGeometry": "true",
             "outSR": 4326,
         }
-
+        if self.max_allowable_offset is not None:
+            params["maxAllowableOffset"] = self.max_allowable_offset
+        if self.geometry_precision is not None:
+            params["geometryPrecision"] = self.geometry_precision
         if bbox_wgs84:
-            base_params.update(
+            params.update(
                 {
                     "geometryType": "esriGeometryEnvelope",
                     "geometry": bbox_wgs84,
@@ -55,13 +98,108 @@ class ArcGisMapServer:
                     "spatialRel": "esriSpatialRelIntersects",
                 }
             )
+        return params
+
+    def count(self, layer_id: int, *, where: str = "1=1", bbox_wgs84: str | None = None) -> int:
+        """Number of features matching the query (`returnCountOnly`)."""
+        params = self._query_params(where, "*", bbox_wgs84)
+        params.update({"returnCountOnly": "true", "returnGeometry": "false"})
+        return int(self._query(layer_id, params).get("count") or 0)
+
+    def object_ids(self, layer_id: int, *, where: str = "1=1", bbox_wgs84: str | None = None) -> tuple[str, list[int]]:
+        """(ObjectID field name, sorted ObjectIDs) matching the query, from one `returnIdsOnly` request."""
+        params = self._query_params(where, "*", bbox_wgs84)
+        params.update({"returnIdsOnly": "true", "returnGeometry": "false"})
+        payload = self._query(layer_id, params)
+        return str(payload.get("objectIdFieldName") or "OBJECTID"), sorted(payload.get("objectIds") or [])
+
+    def range_features(
+        self,
+        layer_id: int,
+        rng: IdRange,
+        *,
+        oid_field: str = "OBJECTID",
+        where: str = "1=1",
+        out_fields: str = "*",
+        bbox_wgs84: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """All features of one ObjectID range, continuing after the last id if the server caps the result."""
+        out: list[dict[str, Any]] = []
+        lo = rng.lo
+        while lo <= rng.hi:
+            params = self._query_params(f"({where}) AND {oid_field} BETWEEN {lo} AND {rng.hi}", out_fields, bbox_wgs84)
+            params["orderByFields"] = f"{oid_field} ASC"
+            payload = self._query(layer_id, params)
+            feats = payload.get("features") or []
+            out.extend(feats)
+            if not feats or not payload.get("exceededTransferLimit"):
+                break
+            last = (feats[-1].get("attributes") or {}).get(oid_field)
+            if not isinstance(last, int):
+                break
+            lo = last + 1
+        return out
+
+    def iter_ranges(
+        self,
+        layer_id: int,
+        ranges: Iterable[IdRange],
+        *,
+        oid_field: str = "OBJECTID",
+        where: str = "1=1",
+        out_fields: str = "*",
+        bbox_wgs84: str | None = None,
+        workers: int = 4,
+    ) -> Iterator[tuple[IdRange, list[dict[str, Any]]]]:
+        """
+        Fetches ObjectID ranges concurrently (`workers` in flight) and yields them in the given order,
+        each with all of its features, so callers can checkpoint per completed range.
+        """
+        pending = deque(ranges)
+        inflight: deque[tuple[IdRange, Future[list[dict[str, Any]]]]] = deque()
+        ex = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rag-for-ra-arcgis")
+        try:
+            while pending or inflight:
+                while pending and len(inflight) < max(1, workers):
+                    rng = pending.popleft()
+                    fut = ex.submit(
+                        self.range_features,
+                        layer_id,
+                        rng,
+                        oid_field=oid_field,
+                        where=where,
+                        out_fields=out_fields,
+                        bbox_wgs84=bbox_wgs84,
+                    )
+                    inflight.append((rng, fut))
+                rng, fut = inflight.popleft()
+                yield rng, fut.result()
+        finally:
+            for _rng, fut in inflight:
+                fut.cancel()
+            ex.shutdown(wait=False)
+
+    def iter_layer_features(
+        self,
+        layer_id: int,
+        *,
+        where: str = "1=1",
+        out_fields: str = "*",
+        bbox_wgs84: str | None = None,  # "minLon,minLat,maxLon,maxLat"
+        page_size: int = 2000,
+        max_items: int | None = None,
+    ) -> Iterable[dict[str, Any]]:
+        offset = 0
+        yielded = 0
+
+        base_params = self._query_params(where, out_fields, bbox_wgs84)
 
         while True:
             params = dict(base_params)
             params["resultOffset"] = offset
             params["resultRecordCount"] = page_size
 
-            payload = self.http.get_json(url, params=params)
+            payload = self._query(layer_id, params)
             feats = payload.get("features") or []
             for feat in feats:
                 yield feat
@@ -73,4 +211,36 @@ class ArcGisMapServer:
                 return
             offset += len(feats)
 
+    def iter_layer_features_by_ids(
+        self,
+        layer_id: int,
+        *,
+        where: str = "1=1",
+        out_fields: str = "*",
+        bbox_wgs84: str | None = None,
+        range_size: int = 1000,
+        workers: int = 4,
+        max_items: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Like `iter_layer_features`, but without `resultOffset`: one `returnIdsOnly` request, then
+        ObjectID ranges fetched concurrently and yielded in ObjectID order (see `iter_ranges`).
+        """
+        oid_field, ids = self.object_ids(layer_id, where=where, bbox_wgs84=bbox_wgs84)
+        ranges = id_ranges(ids, range_size)
+        yielded = 0
+        for _rng, feats in self.iter_ranges(
+            layer_id,
+            ranges,
+            oid_field=oid_field,
+            where=where,
+            out_fields=out_fields,
+            bbox_wgs84=bbox_wgs84,
+            workers=workers,
+        ):
+            for feat in feats:
+                yield feat
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
 
@@ -4,9 +4,10 @@ import argparse
 import json
 import os
 import time
+from itertools import islice
 from pathlib import Path
 
-from .io import read_jsonl
+from .io import TEXT_FIELDS, iter_jsonl, strip_codec
 from .openai_utils import load_vs_id, uploads_enabled
 
 
@@ -35,28 +36,30 @@ def parse_args() -> argparse.Namespace:
 
 
 def prepare_text_from_jsonl(jsonl_path: Path, *, out_path: Path, max_docs: int) -> int:
-    docs = read_jsonl(jsonl_path)
+    docs = iter_jsonl(jsonl_path, TEXT_FIELDS)
     if max_docs and max_docs > 0:
-        docs = docs[:max_docs]
-
-    blocks: list[str] = []
-    for d in docs:
-        src = d.get("source") or {}
-        blocks.append(
-            "\n".join(
-                [
-                    f"DOC_ID: {d.get('doc_id','')}",
-                    f"TITLE: {d.get('title','')}",
-                    f"TEXT: {d.get('text','')}",
-                    f"SOURCE_URL: {src.get('web_url') or ''}",
-                    f"LICENSE: {src.get('license_name') or ''} {src.get('license_url') or ''}".strip(),
-                ]
-            ).strip()
-        )
+        docs = islice(docs, max_docs)
 
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text("\n\n---\n\n".join(blocks), encoding="utf-8")
-    return len(docs)
+    n = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        for d in docs:
+            src = d.get("source") or {}
+            if n:
+                f.write("\n\n---\n\n")
+            f.write(
+                "\n".join(
+                    [
+                        f"DOC_ID: {d.get('doc_id','')}",
+                        f"TITLE: {d.get('title','')}",
+                        f"TEXT: {d.get('text','')}",
+                        f"SOURCE_URL: {src.get('web_url') or ''}",
+                        f"LICENSE: {src.get('license_name') or ''} {src.get('license_url') or ''}".strip(),
+                    ]
+                ).strip()
+            )
+            n += 1
+    return n
 
 
 def main() -> None:
@@ -91,7 +94,7 @@ def main() -> None:
         if not jsonl_path.exists():
             raise SystemExit(f"JSONL file not found: {jsonl_path}")
 
-        txt_name = f"{jsonl_path.stem}.txt"
+        txt_name = f"{strip_codec(jsonl_path).stem}.txt"
         txt_path = out_dir / txt_name
 
         n_docs = prepare_text_from_jsonl(jsonl_path, out_path=txt_path, max_docs=args.max_docs)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Mapping
+from urllib.parse import urlencode
+
+import orjson
+
+from .openai_utils import REPO_ROOT
+
+
+DEFAULT_CACHE_DIR = REPO_ROOT / "artifacts" / "http_cache"
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a request has no cached response."""
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    key: str
+    body: bytes
+    meta: dict[str, Any]
+
+    @property
+    def age_s(self) -> float:
+        return time.time() - float(self.meta.get("stored_at") or 0)
+
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers for revalidating this entry."""
+        headers: dict[str, str] = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = str(self.meta["etag"])
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = str(self.meta["last_modified"])
+        return headers
+
+
+@dataclass(eq=False)
+class ResponseCache:
+    """
+    Opt-in on-disk cache for GET responses, keyed by a hash of the request (URL + sorted params).
+
+    - Entries younger than `ttl_s` are served without touching the network (`None` = never stale).
+    - Stale entries are revalidated with ETag / Last-Modified (a 304 refreshes the entry).
+    - `offline=True` serves whatever is cached regardless of age and raises `CacheMiss` otherwise,
+      which replays a previous harvest without network access.
+    - Total size is bounded by `max_bytes`; least recently used entries are evicted first.
+
+    Layout: `<root>/<key[:2]>/<key>.body` (raw response bytes) + `<key>.meta.json`.
+    """
+
+    root: Path = DEFAULT_CACHE_DIR
+    ttl_s: float | None = 24 * 3600
+    max_bytes: int = 2 * 1024**3
+    offline: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _size: int | None = field(default=None, init=False, repr=False)
+
+    @staticmethod
+    def key(url: str, params: Mapping[str, Any] | None = None) -> str:
+        query = urlencode(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return hashlib.sha256(f"GET {url}?{query}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        d = self.root / key[:2]
+        return d / f"{key}.body", d / f"{key}.meta.json"
+
+    def lookup(self, url: str, params: Mapping[str, Any] | None = None) -> CacheEntry | None:
+        key = self.key(url, params)
+        body_path, meta_path = self._paths(key)
+        try:
+            meta = orjson.loads(meta_path.read_bytes())
+            body = body_path.read_bytes()
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        if meta.get("sha256") != hashlib.sha256(body).hexdigest():
+            # Partially written or corrupted entry: treat as a miss.
+            return None
+        self._touch(body_path)
+        return CacheEntry(key=key, body=body, meta=meta)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.ttl_s is None or entry.age_s < self.ttl_s
+
+    def store(self, url: str, params: Mapping[str, Any] | None, body: bytes, headers: Mapping[str, str]) -> None:
+        key = self.key(url, params)
+        body_path, meta_path = self._paths(key)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "url": url,
+            "params": {str(k): str(v) for k, v in (params or {}).items()},
+            "stored_at": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "bytes": len(body),
+        }
+        old = body_path.stat().st_size if body_path.exists() else 0
+        # Write-then-rename so a crash never leaves a half-written entry behind.
+        tmp = body_path.with_suffix(f".tmp{threading.get_ident()}")
+        tmp.write_bytes(body)
+        os.replace(tmp, body_path)
+        meta_path.write_bytes(orjson.dumps(meta))
+        self._account(len(body) - old)
+
+    def refresh(self, entry: CacheEntry) -> None:
+        """Marks a revalidated (HTTP 304) entry as fresh again."""
+        _, meta_path = self._paths(entry.key)
+        entry.meta["stored_at"] = time.time()
+        meta_path.write_bytes(orjson.dumps(entry.meta))
+
+    def _touch(self, path: Path) -> None:
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def _bodies(self) -> list[Path]:
+        return list(self.root.glob("*/*.body")) if self.root.exists() else []
+
+    def _account(self, delta: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._bodies())
+            else:
+                self._size += delta
+            if self._size <= self.max_bytes:
+                return
+            # Evict least recently used (oldest mtime; hits touch their body) down to 90% of the cap.
+            target = int(self.max_bytes * 0.9)
+            for body_path in sorted(self._bodies(), key=lambda p: p.stat().st_mtime):
+                if self._size <= target:
+                    break
+                size = body_path.stat().st_size
+                body_path.unlink(missing_ok=True)
+                body_path.with_name(body_path.name[: -len(".body")] + ".meta.json").unlink(missing_ok=True)
+                self._size -= size
+
+
+def add_cache_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--cache", action="store_true", help="Cache HTTP responses on disk (artifacts/http_cache/).")
+    p.add_argument("--cache-dir", default=None, help="Response cache directory (implies --cache).")
+    p.add_argument(
+        "--cache-ttl-s",
+        type=float,
+        default=24 * 3600,
+        help="Serve cached responses younger than this without revalidation. 0 = always revalidate.",
+    )
+    p.add_argument("--cache-max-gb", type=float, default=2.0, help="Response cache size cap (LRU eviction).")
+    p.add_argument(
+        "--offline",
+        action="store_true",
+        help="Replay cached responses only (no network). Implies --cache; fails on cache misses.",
+    )
+
+
+def cache_from_args(args: argparse.Namespace) -> ResponseCache | None:
+    if not (args.cache or args.cache_dir or args.offline):
+        return None
+    return ResponseCache(
+        root=Path(args.cache_dir) if args.cache_dir else DEFAULT_CACHE_DIR,
+        ttl_s=float(args.cache_ttl_s),
+        max_bytes=int(float(args.cache_max_gb) * 1024**3),
+        offline=bool(args.offline),
+    )
+
@@ -6,14 +6,13 @@ import os
 from getpass import getpass
 from pathlib import Path
 
-from .state import load_json, save_json
+from .state import STATE_FILE, load_json, update_json
 
 
 DEFAULT_MODEL = "gpt-4.1-mini"
 DEFAULT_K = 5
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
-STATE_FILE = REPO_ROOT / ".rag_state.json"
 
 
 def _ensure_api_key() -> None:
@@ -58,7 +57,7 @@ def _get_vector_store_id(arg_vs_id: str | None) -> str:
 
     new_id = _prompt_vector_store_id()
     os.environ["OPENAI_VECTOR_STORE_ID"] = new_id
-    save_json(STATE_FILE, {"vector_store_id": new_id})
+    update_json(STATE_FILE, lambda state: state.update(vector_store_id=new_id))
     return new_id
 
 
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import orjson
+
+from .docstore import DocStore, is_store
+from .io import JsonlWriter, codec_for, ensure_parent, iter_jsonl, iter_lines
+from .jsonl_index import index_path
+from .state import load_json, update_json
+
+
+# Feature properties tried (in order) as "last modified" when no --delta-field is given.
+DELTA_FIELDS = (
+    "sistEndret",
+    "endretDato",
+    "sistOppdatert",
+    "oppdateringsdato",
+    "datoEndret",
+    "lastModified",
+    "updated",
+)
+
+# Re-fetch window before the previous high-water mark; upserts are idempotent, so overlap is free
+# and covers clock skew and records committed upstream while the last sync was running.
+OVERLAP = dt.timedelta(hours=1)
+
+
+def utc_now() -> str:
+    return dt.datetime.now(dt.timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def parse_timestamp(value: Any) -> dt.datetime | None:
+    """ISO 8601 date/datetime (or epoch milliseconds) as an aware UTC datetime; None if unparseable."""
+    if isinstance(value, bool) or value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return dt.datetime.fromtimestamp(value / 1000, dt.timezone.utc)
+    try:
+        when = dt.datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return when.replace(tzinfo=dt.timezone.utc) if when.tzinfo is None else when.astimezone(dt.timezone.utc)
+
+
+def format_timestamp(when: dt.datetime) -> str:
+    return when.astimezone(dt.timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def detect_field(properties: Iterable[dict[str, Any]]) -> str | None:
+    """The first of `DELTA_FIELDS` that holds a parseable timestamp in any of the property dicts."""
+    for props in properties:
+        for name in DELTA_FIELDS:
+            if parse_timestamp(props.get(name)) is not None:
+                return name
+    return None
+
+
+def newest(properties: Iterable[dict[str, Any]], field: str) -> dt.datetime | None:
+    stamps = (parse_timestamp(props.get(field)) for props in properties)
+    return max((when for when in stamps if when is not None), default=None)
+
+
+def jsonl_properties(path: Path) -> Iterator[dict[str, Any]]:
+    """Streams the `properties` of every document in a JSONL cache."""
+    for row in iter_jsonl(path, ("properties",)):
+        yield row.get("properties") or {}
+
+
+def delta_sidecar(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(jsonl_path.suffix + ".delta.json")
+
+
+def tombstones_path(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(jsonl_path.suffix + ".tombstones.jsonl")
+
+
+def load_mark(jsonl_path: Path) -> dict[str, Any]:
+    """The delta state of a JSONL cache: {"mark", "field", "mode", "synced_at", "docs"} (empty = never synced)."""
+    return load_json(delta_sidecar(jsonl_path))
+
+
+def save_mark(jsonl_path: Path, **values: Any) -> None:
+    update_json(delta_sidecar(jsonl_path), lambda state: state.update(values))
+
+
+def since(mark: str | None) -> str | None:
+    """The lower bound to request for a high-water mark (mark minus `OVERLAP`)."""
+    when = parse_timestamp(mark)
+    return None if when is None else format_timestamp(when - OVERLAP)
+
+
+def jsonl_digests(path: Path) -> dict[str, str]:
+    """
+    doc_id -> content hash of its JSONL row (the last one wins), for cheap change detection.
+    Rows written before documents carried `content_hash` get a line digest, which never matches.
+    """
+    digests: dict[str, str] = {}
+    if not path.exists():
+        return digests
+    for line in iter_lines(path):
+        row = orjson.loads(line)
+        digest = row.get("content_hash") or hashlib.blake2b(bytes(line).strip(), digest_size=16).hexdigest()
+        digests[str(row.get("doc_id", ""))] = digest
+    return digests
+
+
+def upsert_jsonl(path: Path, changed: dict[str, bytes], removed: Iterable[str] = ()) -> tuple[int, int, int]:
+    """
+    Rewrites a JSONL cache with `changed` rows (doc_id -> serialized row) replacing or adding
+    documents and `removed` doc_ids dropped (every row of them). Returns (updated, added, removed)
+    doc_id counts.
+
+    The file is rewritten to a temporary sibling and swapped in, so a crash leaves the old cache.
+    A document store is updated in place instead, in one transaction.
+    """
+    removed = set(removed)
+    if not changed and not removed:
+        return 0, 0, 0
+    if is_store(path):
+        with DocStore(path) as store:
+            return store.upsert(changed, removed)
+    ensure_parent(path)
+    pending = dict(changed)
+    updated: set[str] = set()
+    dropped: set[str] = set()
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with JsonlWriter(tmp, truncate=True, codec=codec_for(path)) as out:
+        if path.exists():
+            for line in iter_lines(path):
+                doc_id = str(orjson.loads(line).get("doc_id", ""))
+                if doc_id in removed:
+                    dropped.add(doc_id)
+                    continue
+                if doc_id in changed:
+                    # Appended caches can hold several rows of a doc_id: the new row replaces the
+                    # first, the others go (readers let the last row win).
+                    row = pending.pop(doc_id, None)
+                    if row is None:
+                        continue
+                    updated.add(doc_id)
+                    line = row
+                out.write(line)
+                out.write(b"\n")
+        for row in pending.values():
+            out.write(row)
+            out.write(b"\n")
+    # The row index moves with the rewritten file; dropped first, so a crash can't pair it with the wrong file.
+    index_path(path).unlink(missing_ok=True)
+    os.replace(tmp, path)
+    if index_path(tmp).exists():
+        os.replace(index_path(tmp), index_path(path))
+    return len(updated), len(pending), len(dropped)
+
+
+def record_tombstones(jsonl_path: Path, doc_ids: Iterable[str]) -> int:
+    """Appends removed doc_ids (with the removal time) to the cache's tombstone log."""
+    when = utc_now()
+    path = tombstones_path(jsonl_path)
+    n = 0
+    with path.open("ab") as f:
+        for doc_id in doc_ids:
+            f.write(orjson.dumps({"doc_id": doc_id, "removed_at": when}))
+            f.write(b"\n")
+            n += 1
+    return n
+
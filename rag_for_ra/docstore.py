@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import orjson
+
+
+# Caches with these suffixes are SQLite document stores instead of JSONL files.
+STORE_SUFFIXES = (".sqlite", ".db")
+
+# Property fields tried (in order) for the indexed `kommune` column.
+KOMMUNE_KEYS = ("kommune", "kommunenavn", "Kommune", "KOMMUNE")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id TEXT PRIMARY KEY,
+    dataset TEXT,
+    collection TEXT,
+    kommune TEXT,
+    content_hash TEXT,
+    row BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_collection ON docs (dataset, collection);
+CREATE INDEX IF NOT EXISTS docs_kommune ON docs (kommune);
+"""
+
+# Unchanged rows (same content_hash) are left alone, so re-ingests only write what changed.
+_UPSERT = """
+INSERT INTO docs (doc_id, dataset, collection, kommune, content_hash, row) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (doc_id) DO UPDATE SET
+    dataset = excluded.dataset,
+    collection = excluded.collection,
+    kommune = excluded.kommune,
+    content_hash = excluded.content_hash,
+    row = excluded.row
+WHERE docs.content_hash IS NOT excluded.content_hash OR excluded.content_hash IS NULL
+"""
+
+
+def is_store(path: Path) -> bool:
+    return path.suffix in STORE_SUFFIXES
+
+
+def _columns(row: bytes) -> tuple[Any, ...]:
+    doc = orjson.loads(row)
+    source = doc.get("source") or {}
+    props = doc.get("properties") or {}
+    kommune = next((props[k] for k in KOMMUNE_KEYS if props.get(k)), None)
+    return (
+        str(doc.get("doc_id", "")),
+        source.get("dataset"),
+        source.get("collection"),
+        None if kommune is None else str(kommune),
+        doc.get("content_hash") or None,
+        row,
+    )
+
+
+@dataclass(eq=False)
+class DocStore:
+    """
+    Documents keyed by doc_id in SQLite (WAL mode), a drop-in for a JSONL cache: `write` takes
+    JSONL bytes like `JsonlWriter`, but rows are upserted in batched transactions, so resumed or
+    overlapping runs update documents instead of duplicating them. Reads stream in insertion order,
+    optionally filtered on the indexed dataset/collection/kommune columns.
+    """
+
+    path: Path
+    batch_size: int = 500
+    _conn: sqlite3.Connection | None = field(default=None, init=False, repr=False)
+    _pending: list[tuple[Any, ...]] = field(default_factory=list, init=False, repr=False)
+    _partial: bytes = field(default=b"", init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __enter__(self) -> DocStore:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly per batch.
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    def write(self, data: bytes | memoryview) -> None:
+        """Queues the JSONL rows in `data` for upsert (a row may continue in the next call)."""
+        chunk = self._partial + bytes(data) if self._partial else bytes(data)
+        *rows, self._partial = chunk.split(b"\n")
+        self._pending.extend(_columns(row) for row in rows if row.strip())
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows: Iterable[Any]) -> int:
+        n = 0
+        for row in rows:
+            self.write(orjson.dumps(row) + b"\n")
+            n += 1
+        return n
+
+    def flush(self) -> None:
+        """Commits the queued rows in one transaction."""
+        assert self._conn is not None, "use DocStore as a context manager"
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_UPSERT, pending)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def tell(self) -> int:
+        """
+        Commits the queued rows and returns 0. Unlike `JsonlWriter.tell()`, this is not a position
+        to truncate back to: a store is never truncated, work cut short is upserted again. Callers
+        that checkpoint positions (e.g. `arcgis_ranges_jsonl`) skip truncation for stores (`is_store`).
+        """
+        self.flush()
+        return 0
+
+    def upsert(self, changed: dict[str, bytes], removed: Iterable[str] = ()) -> tuple[int, int, int]:
+        """Upserts serialized rows and deletes `removed` doc_ids in one transaction: (updated, added, removed)."""
+        assert self._conn is not None, "use DocStore as a context manager"
+        removed = list(removed)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = sum(
+                    self._conn.execute("SELECT count(*) FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()[0]
+                    for doc_id in changed
+                )
+                self._conn.executemany(_UPSERT, [_columns(row) for row in changed.values()])
+                dropped = sum(
+                    self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,)).rowcount for doc_id in removed
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return existing, len(changed) - existing, dropped
+
+    def lookup(self, doc_ids: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """doc_id -> its row, for the doc_ids present."""
+        assert self._conn is not None, "use DocStore as a context manager"
+        found: dict[str, dict[str, Any]] = {}
+        for doc_id in doc_ids:
+            hit = self._conn.execute("SELECT row FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if hit is not None:
+                found[doc_id] = orjson.loads(hit[0])
+        return found
+
+    def _where(self, filters: dict[str, str | None]) -> tuple[str, list[str]]:
+        terms = [(column, value) for column, value in filters.items() if value is not None]
+        sql = " AND ".join(f"{column} = ?" for column, _value in terms)
+        return (f" WHERE {sql}" if sql else ""), [value for _column, value in terms]
+
+    def iter_raw(
+        self, *, dataset: str | None = None, collection: str | None = None, kommune: str | None = None
+    ) -> Iterator[bytes]:
+        """Serialized rows (JSON bytes), streamed in insertion order."""
+        assert self._conn is not None, "use DocStore as a context manager"
+        where, params = self._where({"dataset": dataset, "collection": collection, "kommune": kommune})
+        for (row,) in self._conn.execute(f"SELECT row FROM docs{where} ORDER BY rowid", params):
+            yield row
+
+    def count(self, *, dataset: str | None = None, collection: str | None = None, kommune: str | None = None) -> int:
+        assert self._conn is not None, "use DocStore as a context manager"
+        where, params = self._where({"dataset": dataset, "collection": collection, "kommune": kommune})
+        return self._conn.execute(f"SELECT count(*) FROM docs{where}", params).fetchone()[0]
+
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass, field
+import hashlib
+from dataclasses import dataclass, field, fields
 from typing import Any
 
+import orjson
 
-@dataclass
+
+def fingerprint(value: Any) -> str:
+    """
+    Stable content hash: blake2b-128 (hex) of the key-sorted orjson serialization of `value`.
+    Unlike `hash()`, it is the same in every process and on every machine.
+    """
+    data = orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclass(slots=True)
 class SourceInfo:
     provider: str  # e.g. "Riksantikvaren"
     dataset: str  # e.g. "kulturminner" / "brukerminner"
@@ -15,10 +27,18 @@ class SourceInfo:
     web_url: str | None = None  # human-facing page when available
 
 
-@dataclass
+@dataclass(slots=True)
 class RagDocument:
     """
     Normalized document representation for upload/search.
+
+    Slotted and serialized by orjson directly (`to_json()`, or pass the document itself to the
+    JSONL writers): fields are written in declaration order, so the JSONL layout is the same as
+    `orjson.dumps(doc.to_dict())` without deep-copying properties and geometry first. `to_json()`
+    leaves `centroid` and `bbox` out while they are unset (the geometry is still inline).
+
+    `content_hash` is the `fingerprint` of all other fields, filled in on construction: equal
+    hashes mean an unchanged document, so it can be skipped without comparing the content.
     """
 
     doc_id: str
@@ -28,13 +48,39 @@ class RagDocument:
     source: SourceInfo = field(default_factory=lambda: SourceInfo(provider="", dataset="", collection=""))
     tags: list[str] = field(default_factory=list)
     geojson_geometry: dict[str, Any] | None = None
+    centroid: list[float] | None = None  # [x, y]; set when the geometry moved to a sidecar (geometry.py)
+    bbox: list[float] | None = None  # [minX, minY, maxX, maxY]; likewise
     properties: dict[str, Any] = field(default_factory=dict)
+    content_hash: str = ""
+
+    def __post_init__(self) -> None:
+        if not self.content_hash:
+            self.content_hash = fingerprint(self)
 
     def to_dict(self) -> dict[str, Any]:
-        d = asdict(self)
-        d["source"] = asdict(self.source)
+        """Shallow dict view (properties and geometry are shared with the document, not copied)."""
+        d = {f.name: getattr(self, f.name) for f in fields(self)}
+        d["source"] = {f.name: getattr(self.source, f.name) for f in fields(self.source)}
         return d
 
+    def to_json(self) -> bytes:
+        """One JSONL row (no trailing newline)."""
+        if self.centroid is not None or self.bbox is not None:
+            return orjson.dumps(self)
+        # A shallow dict: properties, geometry and source are still serialized in place.
+        return orjson.dumps({name: getattr(self, name) for name in _INLINE_FIELDS})
+
+
+# RagDocument fields written for a document whose geometry is inline.
+_INLINE_FIELDS = tuple(f.name for f in fields(RagDocument) if f.name not in ("centroid", "bbox"))
+
+
+# Fields of the default OGC schema (in order of preference where it matters); see schema.py.
+TITLE_KEYS = ("tittel", "navn", "gårdsnavn", "enkeltminneart", "lokalitetsart")
+TEXT_KEYS = ("beskrivelse", "informasjon", "kulturminnesøk", "datering", "vernetype", "vernelov", "kommune", "fylke")
+LINK_KEYS = ("linkKulturminnesøk", "linkkulturminnesok", "linkAskeladden")
+TAG_KEYS = ("minnetype", "enkeltminnekategori", "lokalitetskategori", "enkeltminneart", "lokalitetsart", "vernetype")
+
 
 def _clean_text(s: str) -> str:
     return " ".join(s.split())
@@ -49,74 +95,12 @@ def feature_to_document(
     license_url: str | None = None,
 ) -> RagDocument:
     """
-    Convert a GeoJSON Feature from api.ra.no into a retrieval document.
-    This is intentionally heuristic and will evolve as we learn the schemas.
+    Convert a GeoJSON Feature from api.ra.no into a retrieval document, using the collection's
+    schema (see `schema.py`: built-in defaults, overridable per collection with a schema file).
     """
-    props = dict(feature.get("properties") or {})
-    feat_id = str(feature.get("id") or props.get("id") or "")
-    if not feat_id:
-        feat_id = f"{dataset}:{collection}:{hash(str(props))}"
-
-    title = (
-        props.get("tittel")
-        or props.get("navn")
-        or props.get("gårdsnavn")
-        or props.get("enkeltminneart")
-        or props.get("lokalitetsart")
-        or feat_id
-    )
-    title = _clean_text(str(title))
-
-    parts: list[str] = []
-    for key in [
-        "beskrivelse",
-        "informasjon",
-        "kulturminnesøk",
-        "datering",
-        "vernetype",
-        "vernelov",
-        "kommune",
-        "fylke",
-    ]:
-        val = props.get(key)
-        if val is None:
-            continue
-        if isinstance(val, (str, int, float, bool)):
-            parts.append(f"{key}: {val}")
-    text = _clean_text("\n".join(parts)) if parts else title
-
-    web_url = props.get("linkKulturminnesøk") or props.get("linkkulturminnesok") or props.get("linkAskeladden")
-    src = SourceInfo(
-        provider="Riksantikvaren",
-        dataset=dataset,
-        collection=collection,
-        license_name=license_name,
-        license_url=license_url,
-        web_url=web_url,
-    )
-
-    tags: list[str] = []
-    for key in [
-        "minnetype",
-        "enkeltminnekategori",
-        "lokalitetskategori",
-        "enkeltminneart",
-        "lokalitetsart",
-        "vernetype",
-    ]:
-        v = props.get(key)
-        if isinstance(v, str) and v.strip():
-            tags.append(v.strip())
-
-    return RagDocument(
-        doc_id=f"{dataset}:{collection}:{feat_id}",
-        title=title,
-        text=text,
-        source=src,
-        tags=tags,
-        geojson_geometry=feature.get("geometry"),
-        properties=props,
-    )
+    from .schema import mapper  # schema.py builds on this module
+
+    return mapper(dataset, collection, license_name=license_name, license_url=license_url)(feature)
 
 
 def arcgis_feature_to_document(
@@ -127,47 +111,8 @@ def arcgis_feature_to_document(
     license_name: str | None = None,
     license_url: str | None = None,
 ) -> RagDocument:
-    attrs = dict(feature.get("attributes") or {})
-    geom = feature.get("geometry")
-
-    feat_id = str(attrs.get("OBJECTID") or attrs.get("objectid") or attrs.get("id") or "")
-    if not feat_id:
-        feat_id = f"{dataset}:{layer_name}:{hash(str(attrs))}"
-
-    title = (
-        attrs.get("navn")
-        or attrs.get("tittel")
-        or attrs.get("KULTURMINNE")
-        or attrs.get("LOKALITET")
-        or feat_id
-    )
-    title = _clean_text(str(title))
-
-    parts: list[str] = []
-    for key in ["BESKRIVELSE", "beskrivelse", "INFORMASJON", "informasjon", "KOMMUNE", "kommune", "FYLKE", "fylke"]:
-        val = attrs.get(key)
-        if val is None:
-            continue
-        if isinstance(val, (str, int, float, bool)):
-            parts.append(f"{key}: {val}")
-    text = _clean_text("\n".join(parts)) if parts else title
-
-    src = SourceInfo(
-        provider="Riksantikvaren",
-        dataset=dataset,
-        collection=layer_name,
-        license_name=license_name,
-        license_url=license_url,
-    )
-
-    return RagDocument(
-        doc_id=f"{dataset}:{layer_name}:{feat_id}",
-        title=title,
-        text=text,
-        source=src,
-        tags=[],
-        geojson_geometry=geom,
-        properties=attrs,
-    )
+    """Like `feature_to_document`, for an Esri JSON feature of an ArcGIS layer (schema `arcgis:<layer>`)."""
+    from .schema import mapper
 
+    return mapper(dataset, layer_name, license_name=license_name, license_url=license_url)(feature)
 
@@ -0,0 +1,278 @@
+"""
+Decoder for ArcGIS REST query responses in `f=pbf` (esriPBuffer.FeatureCollectionPBuffer).
+
+Hand-written protobuf wire-format parsing, so no generated code or protobuf runtime is needed.
+The result has the shape of an `f=json` query response (`fields`, `features` with `attributes`
+and Esri JSON `geometry`, `exceededTransferLimit`, ...), with quantized coordinates mapped back
+through the response's `transform`.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Iterator
+
+
+_FIELD_TYPES = {
+    0: "esriFieldTypeSmallInteger",
+    1: "esriFieldTypeInteger",
+    2: "esriFieldTypeSingle",
+    3: "esriFieldTypeDouble",
+    4: "esriFieldTypeString",
+    5: "esriFieldTypeDate",
+    6: "esriFieldTypeOID",
+    7: "esriFieldTypeGeometry",
+    8: "esriFieldTypeBlob",
+    9: "esriFieldTypeRaster",
+    10: "esriFieldTypeGUID",
+    11: "esriFieldTypeGlobalID",
+    12: "esriFieldTypeXML",
+}
+
+_GEOMETRY_TYPES = {
+    0: "esriGeometryPoint",
+    1: "esriGeometryMultipoint",
+    2: "esriGeometryPolyline",
+    3: "esriGeometryPolygon",
+    4: "esriGeometryMultipatch",
+    127: "esriGeometryNull",
+}
+
+
+def _varint(buf: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf: bytes) -> Iterator[tuple[int, int, Any]]:
+    """(field number, wire type, value) for each field of a message; value is int or bytes."""
+    pos, end = 0, len(buf)
+    try:
+        while pos < end:
+            key, pos = _varint(buf, pos)
+            num, wire = key >> 3, key & 7
+            if wire == 0:
+                val, pos = _varint(buf, pos)
+            elif wire == 2:
+                n, pos = _varint(buf, pos)
+                val = buf[pos : pos + n]
+                pos += n
+            elif wire == 1:
+                val = buf[pos : pos + 8]
+                pos += 8
+            elif wire == 5:
+                val = buf[pos : pos + 4]
+                pos += 4
+            else:
+                raise ValueError(f"Unsupported protobuf wire type {wire}")
+            if pos > end:
+                raise ValueError("Truncated protobuf message")
+            yield num, wire, val
+    except IndexError as exc:
+        raise ValueError("Truncated protobuf message") from exc
+
+
+def _packed(wire: int, val: Any) -> list[int]:
+    if wire == 0:
+        return [val]
+    out: list[int] = []
+    pos = 0
+    while pos < len(val):
+        n, pos = _varint(val, pos)
+        out.append(n)
+    return out
+
+
+def _zigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _signed64(n: int) -> int:
+    return n - (1 << 64) if n >= 1 << 63 else n
+
+
+def _double(val: bytes) -> float:
+    return struct.unpack("<d", val)[0]
+
+
+def _value(buf: bytes) -> Any:
+    for num, _wire, val in _fields(buf):
+        if num == 1:
+            return val.decode("utf-8")
+        if num == 2:
+            return struct.unpack("<f", val)[0]
+        if num == 3:
+            return _double(val)
+        if num in (4, 8):
+            return _zigzag(val)
+        if num in (5, 7):
+            return val
+        if num == 6:
+            return _signed64(val)
+        if num == 9:
+            return bool(val)
+    return None
+
+
+def _transform(buf: bytes) -> tuple[bool, list[float], list[float]]:
+    """(upper-left origin, [x, y, m, z] scale, [x, y, m, z] translate)."""
+    upper_left = True
+    scale = [1.0, 1.0, 1.0, 1.0]
+    translate = [0.0, 0.0, 0.0, 0.0]
+    for num, _wire, val in _fields(buf):
+        if num == 1:
+            upper_left = val == 0
+        elif num in (2, 3):
+            target = scale if num == 2 else translate
+            for i, _w, d in _fields(val):
+                if 1 <= i <= 4:
+                    target[i - 1] = _double(d)
+    return upper_left, scale, translate
+
+
+def _geometry(
+    buf: bytes,
+    geometry_type: str,
+    dims: int,
+    transform: tuple[bool, list[float], list[float]] | None,
+    has_z: bool,
+) -> dict[str, Any] | None:
+    lengths: list[int] = []
+    coords: list[int] = []
+    for num, wire, val in _fields(buf):
+        if num == 2:
+            lengths.extend(_packed(wire, val))
+        elif num == 3:
+            coords.extend(_zigzag(v) for v in _packed(wire, val))
+    if not coords:
+        return None
+
+    # Coordinates are delta-encoded per dimension across the whole geometry.
+    points: list[list[float]] = []
+    running = [0] * dims
+    for i in range(0, len(coords) - dims + 1, dims):
+        pt: list[float] = []
+        for d in range(dims):
+            running[d] += coords[i + d]
+            pt.append(running[d])
+        points.append(pt)
+    if transform is not None:
+        upper_left, scale, translate = transform
+        # Dimension order on the wire is x, y[, z][, m]; scale/translate are stored as x, y, m, z.
+        order = [0, 1] + ([3] if has_z else []) + ([2] if dims > 2 + has_z else [])
+        for pt in points:
+            for d, t in enumerate(order):
+                if t == 1 and upper_left:
+                    pt[d] = translate[1] - pt[d] * scale[1]
+                else:
+                    pt[d] = translate[t] + pt[d] * scale[t]
+
+    if geometry_type == "esriGeometryPoint":
+        pt = points[0]
+        out: dict[str, Any] = {"x": pt[0], "y": pt[1]}
+        if has_z and len(pt) > 2:
+            out["z"] = pt[2]
+        return out
+    if geometry_type == "esriGeometryMultipoint":
+        return {"points": points}
+    parts: list[list[list[float]]] = []
+    start = 0
+    for n in lengths or [len(points)]:
+        parts.append(points[start : start + n])
+        start += n
+    return {"rings": parts} if geometry_type == "esriGeometryPolygon" else {"paths": parts}
+
+
+def _feature_result(buf: bytes) -> dict[str, Any]:
+    out: dict[str, Any] = {"fields": [], "features": [], "exceededTransferLimit": False}
+    has_z = has_m = False
+    transform = None
+    raw_features: list[bytes] = []
+    geometry_type_code = 127
+    for num, _wire, val in _fields(buf):
+        if num == 1:
+            out["objectIdFieldName"] = val.decode("utf-8")
+        elif num == 2:
+            out["uniqueIdFieldName"] = val.decode("utf-8")
+        elif num == 3:
+            out["globalIdFieldName"] = val.decode("utf-8")
+        elif num == 7:
+            geometry_type_code = val
+        elif num == 8:
+            sr = {i: v for i, _w, v in _fields(val)}
+            if sr.get(1):
+                out["spatialReference"] = {"wkid": sr[1], "latestWkid": sr.get(2) or sr[1]}
+            elif sr.get(5):
+                out["spatialReference"] = {"wkt": sr[5].decode("utf-8")}
+        elif num == 9:
+            out["exceededTransferLimit"] = bool(val)
+        elif num == 10:
+            has_z = bool(val)
+        elif num == 11:
+            has_m = bool(val)
+        elif num == 12:
+            transform = _transform(val)
+        elif num == 13:
+            field_info = {i: v for i, _w, v in _fields(val)}
+            out["fields"].append(
+                {
+                    "name": field_info.get(1, b"").decode("utf-8"),
+                    "type": _FIELD_TYPES.get(field_info.get(2, -1), "esriFieldTypeString"),
+                    "alias": field_info.get(3, field_info.get(1, b"")).decode("utf-8"),
+                }
+            )
+        elif num == 15:
+            raw_features.append(val)
+    geometry_type = _GEOMETRY_TYPES.get(geometry_type_code, "esriGeometryNull")
+    out["geometryType"] = geometry_type
+    out["hasZ"], out["hasM"] = has_z, has_m
+
+    names = [f["name"] for f in out["fields"]]
+    dims = 2 + has_z + has_m
+    for raw in raw_features:
+        values: list[Any] = []
+        geometry = None
+        for num, _wire, val in _fields(raw):
+            if num == 1:
+                values.append(_value(val))
+            elif num == 2:
+                geometry = _geometry(val, geometry_type, dims, transform, has_z)
+        feature: dict[str, Any] = {"attributes": dict(zip(names, values))}
+        if geometry is not None:
+            feature["geometry"] = geometry
+        out["features"].append(feature)
+    return out
+
+
+def decode_feature_collection(body: bytes) -> dict[str, Any]:
+    """
+    Decodes an `f=pbf` query response into the equivalent `f=json` dict: features (attributes +
+    Esri JSON geometry), or `count` / `objectIds` for count-only and ids-only queries.
+    Raises ValueError on malformed or truncated input.
+    """
+    for num, _wire, val in _fields(bytes(body)):
+        if num != 2:
+            continue
+        for kind, wire, result in _fields(val):
+            if kind == 1:
+                return _feature_result(result)
+            if kind == 2:
+                return {"count": next((v for i, _w, v in _fields(result) if i == 1), 0)}
+            if kind == 3:
+                ids: list[int] = []
+                out: dict[str, Any] = {}
+                for i, w, v in _fields(result):
+                    if i == 1:
+                        out["objectIdFieldName"] = v.decode("utf-8")
+                    elif i == 3:
+                        ids.extend(_packed(w, v))
+                out["objectIds"] = ids
+                return out
+    raise ValueError("Not an ArcGIS FeatureCollection protobuf (no queryResult)")
+
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import struct
+import threading
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator
+
+import orjson
+
+from .documents import RagDocument
+from .io import ensure_parent, iter_jsonl
+
+
+# Record layout in `<jsonl>.geom`: little-endian (header length, coordinate count), the orjson
+# header (doc_id, geometry kind, part sizes) and the coordinates as float64. `<jsonl>.geom.idx`
+# holds one `[doc_id, offset]` JSON line per record; the last record of a doc_id wins.
+_RECORD = struct.Struct("<II")
+
+
+def geometry_sidecar(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(jsonl_path.suffix + ".geom")
+
+
+def geometry_index(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(jsonl_path.suffix + ".geom.idx")
+
+
+def _is_position(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and isinstance(value[0], (int, float))
+
+
+def _flatten(nested: Any, out: array, dims: list[int]) -> Any:
+    """Appends the positions of nested coordinate lists to `out`; returns their shape (counts per level)."""
+    if _is_position(nested):
+        dims.append(len(nested))
+        out.extend(float(c) for c in nested)
+        return None
+    shape = []
+    for item in nested:
+        if _is_position(item):
+            dims.append(len(item))
+            out.extend(float(c) for c in item)
+        else:
+            shape.append(_flatten(item, out, dims))
+    return len(nested) if not shape else shape
+
+
+def _unflatten(shape: Any, coords: list[float], pos: int, dim: int) -> tuple[Any, int]:
+    if shape is None:
+        return coords[pos : pos + dim], pos + dim
+    if isinstance(shape, int):
+        return [coords[i : i + dim] for i in range(pos, pos + shape * dim, dim)], pos + shape * dim
+    out = []
+    for part in shape:
+        item, pos = _unflatten(part, coords, pos, dim)
+        out.append(item)
+    return out, pos
+
+
+def _positions(geometry: dict[str, Any]) -> Iterator[list[float]]:
+    """Every vertex of a GeoJSON or Esri JSON geometry."""
+
+    def walk(nested: Any) -> Iterator[list[float]]:
+        if _is_position(nested):
+            yield nested
+        elif isinstance(nested, list):
+            for item in nested:
+                yield from walk(item)
+
+    if "coordinates" in geometry:
+        yield from walk(geometry["coordinates"])
+    elif "geometries" in geometry:
+        for member in geometry["geometries"] or []:
+            yield from _positions(member)
+    elif "x" in geometry and "y" in geometry:
+        if geometry["x"] is not None and geometry["y"] is not None:
+            yield [geometry["x"], geometry["y"]]
+    else:
+        for key in ("rings", "paths", "points"):
+            yield from walk(geometry.get(key) or [])
+
+
+def _ring_centroid(ring: list[list[float]]) -> tuple[float, float, float] | None:
+    """(area, cx, cy) of a closed ring (shoelace); None when degenerate."""
+    area = cx = cy = 0.0
+    for (x0, y0, *_), (x1, y1, *_) in zip(ring, ring[1:]):
+        cross = x0 * y1 - x1 * y0
+        area += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    if abs(area) < 1e-18:
+        return None
+    return area / 2, cx / (3 * area), cy / (3 * area)
+
+
+def bbox(geometry: dict[str, Any] | None) -> list[float] | None:
+    """[minX, minY, maxX, maxY] of a GeoJSON or Esri JSON geometry (None if it has no vertices)."""
+    xs: list[float] = []
+    ys: list[float] = []
+    for pos in _positions(geometry or {}):
+        xs.append(pos[0])
+        ys.append(pos[1])
+    return [min(xs), min(ys), max(xs), max(ys)] if xs else None
+
+
+def centroid(geometry: dict[str, Any] | None) -> list[float] | None:
+    """
+    Area-weighted centroid of the outer rings for polygons (GeoJSON Polygon/MultiPolygon, Esri
+    rings), else the mean vertex. None if the geometry has no vertices.
+    """
+    geometry = geometry or {}
+    rings: list[list[list[float]]] = []
+    kind = geometry.get("type")
+    if kind == "Polygon":
+        rings = (geometry.get("coordinates") or [])[:1]
+    elif kind == "MultiPolygon":
+        rings = [poly[0] for poly in geometry.get("coordinates") or [] if poly]
+    elif geometry.get("rings"):
+        rings = geometry["rings"]
+    weighted = [c for c in (_ring_centroid(r) for r in rings) if c is not None]
+    if kind is not None:
+        # GeoJSON outer rings only, whatever their winding; Esri holes wind the other way and subtract.
+        weighted = [(abs(a), x, y) for a, x, y in weighted]
+    area = sum(a for a, _x, _y in weighted)
+    if weighted and abs(area) > 1e-18:
+        return [sum(a * x for a, x, _y in weighted) / area, sum(a * y for a, _x, y in weighted) / area]
+    points = list(_positions(geometry))
+    if not points:
+        return None
+    return [sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)]
+
+
+def encode_geometry(doc_id: str, geometry: dict[str, Any]) -> bytes:
+    """One sidecar record for a GeoJSON or Esri JSON geometry."""
+    coords = array("d")
+    dims: list[int] = []
+    header: dict[str, Any] = {"doc_id": doc_id}
+    if "coordinates" in geometry:
+        header["kind"] = "coordinates"
+        header["shape"] = _flatten(geometry["coordinates"], coords, dims)
+    else:
+        key = next((k for k in ("rings", "paths", "points") if geometry.get(k)), None)
+        if key is not None:
+            header["kind"] = key
+            header["shape"] = _flatten(geometry[key], coords, dims)
+        elif geometry.get("x") is not None and "y" in geometry:
+            header["kind"] = "xy"
+            header["shape"] = None
+            xyz = [geometry["x"], geometry["y"]] + ([geometry["z"]] if geometry.get("z") is not None else [])
+            _flatten(xyz, coords, dims)
+    if "kind" not in header or len(set(dims)) > 1:
+        header = {"doc_id": doc_id, "kind": "json", "geometry": geometry}  # collections, mixed dimensions
+        coords = array("d")
+    else:
+        header["dim"] = dims[0] if dims else 2
+        # Everything besides the coordinates (type, spatialReference, ...) is kept in the header.
+        skip = {"coordinates", "rings", "paths", "points", "x", "y", "z"}
+        header["rest"] = {k: v for k, v in geometry.items() if k not in skip}
+    head = orjson.dumps(header)
+    return _RECORD.pack(len(head), len(coords)) + head + coords.tobytes()
+
+
+def decode_geometry(record: bytes) -> tuple[str, dict[str, Any]]:
+    """(doc_id, geometry) of a sidecar record."""
+    head_len, n = _RECORD.unpack_from(record)
+    start = _RECORD.size
+    header = orjson.loads(record[start : start + head_len])
+    if header["kind"] == "json":
+        return header["doc_id"], header["geometry"]
+    coords = array("d")
+    coords.frombytes(record[start + head_len : start + head_len + 8 * n])
+    values = coords.tolist()
+    geometry = dict(header.get("rest") or {})
+    nested, _pos = _unflatten(header["shape"], values, 0, header["dim"])
+    if header["kind"] == "xy":
+        geometry.update(zip(("x", "y", "z"), nested))
+    else:
+        geometry[header["kind"]] = nested
+    return header["doc_id"], geometry
+
+
+def split_geometry(doc: RagDocument) -> bytes | None:
+    """
+    Replaces a document's geometry with its centroid and bbox; returns the geometry's sidecar
+    record (None if the document has no geometry).
+    """
+    geometry = doc.geojson_geometry
+    if not geometry:
+        return None
+    doc.centroid = centroid(geometry)
+    doc.bbox = bbox(geometry)
+    doc.geojson_geometry = None
+    return encode_geometry(doc.doc_id, geometry)
+
+
+@dataclass(eq=False)
+class GeometrySidecar:
+    """
+    Append-only geometry store next to a JSONL cache. `detach(doc)` moves a document's geometry
+    into the sidecar and leaves its centroid and bbox inline, so JSONL scans stay small.
+    """
+
+    jsonl_path: Path
+    truncate: bool = False
+    _data: BinaryIO | None = field(default=None, init=False, repr=False)
+    _index: BinaryIO | None = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __enter__(self) -> GeometrySidecar:
+        ensure_parent(self.jsonl_path)
+        mode = "wb" if self.truncate else "ab"
+        self._data = geometry_sidecar(self.jsonl_path).open(mode)
+        self._index = geometry_index(self.jsonl_path).open(mode)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = self._index = None
+
+    def append(self, doc_id: str, record: bytes) -> None:
+        """Stores an `encode_geometry` record (e.g. one made by `split_geometry` in a worker process)."""
+        assert self._data is not None and self._index is not None, "use GeometrySidecar as a context manager"
+        with self._lock:
+            offset = self._data.tell()
+            self._data.write(record)
+            self._index.write(orjson.dumps([doc_id, offset]) + b"\n")
+
+    def detach(self, doc: RagDocument) -> RagDocument:
+        record = split_geometry(doc)
+        if record is not None:
+            self.append(doc.doc_id, record)
+        return doc
+
+
+@contextmanager
+def detached_geometry(
+    jsonl_path: Path, enabled: bool, *, truncate: bool = False
+) -> Iterator[Callable[[RagDocument], RagDocument]]:
+    """
+    A `detach(doc)` function for writers of `jsonl_path`: with `enabled`, a `GeometrySidecar`'s
+    (`truncate` when the JSONL is rewritten from scratch), otherwise one that leaves documents as they are.
+    """
+    if not enabled:
+        yield lambda doc: doc
+        return
+    with GeometrySidecar(jsonl_path, truncate=truncate) as sidecar:
+        yield sidecar.detach
+
+
+def load_geometry_index(jsonl_path: Path) -> dict[str, int]:
+    """doc_id -> offset of its latest geometry record (empty if there is no sidecar)."""
+    index: dict[str, int] = {}
+    path = geometry_index(jsonl_path)
+    if not path.exists():
+        return index
+    for doc_id, offset in iter_jsonl(path):
+        index[doc_id] = offset
+    return index
+
+
+def read_geometry(jsonl_path: Path, offset: int) -> dict[str, Any]:
+    """The geometry stored at `offset` of a JSONL cache's sidecar (see `load_geometry_index`)."""
+    with geometry_sidecar(jsonl_path).open("rb") as f:
+        f.seek(offset)
+        head = f.read(_RECORD.size)
+        head_len, n = _RECORD.unpack(head)
+        return decode_geometry(head + f.read(head_len + 8 * n))[1]
+
@@ -1,12 +1,163 @@
 from __future__ import annotations
 
+import random
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+from urllib.parse import urlsplit
 
+import orjson
 import requests
-from requests.exceptions import HTTPError
-from requests.exceptions import JSONDecodeError as RequestsJSONDecodeError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError, HTTPError
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from .cache import CacheMiss, ResponseCache
+from .ratelimit import DEFAULT_LIMITER, RateLimiter
+
+
+T = TypeVar("T")
+
+
+class TruncatedResponseError(ValueError):
+    """
+    A successful (HTTP 200) response whose body was cut short.
+
+    `api.ra.no` does this on large pages. Kept distinct from real server errors so OGC paging
+    can shrink or salvage the page instead of treating it as a bad offset. `body` holds the bytes
+    that did arrive.
+    """
+
+    def __init__(self, message: str, *, url: str, body: bytes, payload: dict[str, Any] | None = None) -> None:
+        super().__init__(message)
+        self.url = url
+        self.body = body
+        self.payload = payload
+
+
+class HedgeCancelled(Exception):
+    """Internal: the losing copy of a hedged request was aborted."""
+
+
+@dataclass(frozen=True)
+class _Fetched:
+    resp: requests.Response
+    body: bytes
+    cut_short: bool
+
+
+def _read_body(resp: requests.Response, cancel: threading.Event | None = None) -> tuple[bytes, bool]:
+    """Reads a streamed body as raw bytes; returns (bytes received, connection cut mid-body)."""
+    chunks: list[bytes] = []
+    try:
+        for chunk in resp.iter_content(chunk_size=256 * 1024):
+            chunks.append(chunk)
+            if cancel is not None and cancel.is_set():
+                resp.close()
+                break
+    except (ChunkedEncodingError, RequestsConnectionError):
+        resp.close()
+        return b"".join(chunks), True
+    return b"".join(chunks), False
+
+
+@dataclass(eq=False)
+class LatencyTracker:
+    """Rolling per-host histogram of successful request latencies (drives request hedging)."""
+
+    window: int = 256
+    _samples: dict[str, deque] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def record(self, url: str, seconds: float) -> None:
+        host = urlsplit(url).netloc
+        with self._lock:
+            samples = self._samples.get(host)
+            if samples is None:
+                samples = self._samples[host] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, url: str, q: float, *, min_samples: int = 20) -> float | None:
+        """The `q` latency quantile for `url`'s host, or None until `min_samples` were recorded."""
+        with self._lock:
+            samples = sorted(self._samples.get(urlsplit(url).netloc) or ())
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+DEFAULT_LATENCY = LatencyTracker()
+
+_HEDGE_POOL: ThreadPoolExecutor | None = None
+_HEDGE_POOL_LOCK = threading.Lock()
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global _HEDGE_POOL
+    with _HEDGE_POOL_LOCK:
+        if _HEDGE_POOL is None:
+            _HEDGE_POOL = ThreadPoolExecutor(max_workers=64, thread_name_prefix="rag-for-ra-hedge")
+        return _HEDGE_POOL
+
+
+def check_complete(
+    body: bytes,
+    *,
+    url: str = "",
+    content_length: str | int | None = None,
+    cut_short: bool = False,
+) -> bytes:
+    """Returns `body` unless the connection was cut or fewer bytes than Content-Length arrived."""
+    expected = int(content_length) if content_length not in (None, "") else None
+    if cut_short or (expected is not None and len(body) < expected):
+        raise TruncatedResponseError(
+            f"Truncated response ({len(body)} of {expected if expected is not None else '?'} bytes): {url}",
+            url=url,
+            body=body,
+        )
+    return body
+
+
+def decode_json(
+    body: bytes,
+    *,
+    url: str = "",
+    content_length: str | int | None = None,
+    cut_short: bool = False,
+) -> dict[str, Any]:
+    """
+    Decodes a JSON response body with orjson, raising `TruncatedResponseError` when it is incomplete.
+
+    Cheap checks run before parsing (connection cut, fewer bytes than Content-Length, no closing
+    brace). A body that still fails to parse counts as truncated too: a cut right after a nested
+    `}` (e.g. the end of a feature) passes the brace check. After parsing, a FeatureCollection with
+    fewer `features` than its `numberReturned` also counts as truncated.
+    """
+    check_complete(body, url=url, content_length=content_length, cut_short=cut_short)
+    if not body.rstrip().endswith((b"}", b"]")):
+        raise TruncatedResponseError(f"Truncated response (incomplete JSON, {len(body)} bytes): {url}", url=url, body=body)
+
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as exc:
+        raise TruncatedResponseError(
+            f"Truncated response (invalid JSON, {len(body)} bytes: {exc}): {url}", url=url, body=body
+        ) from exc
+    if isinstance(payload, dict):
+        returned = payload.get("numberReturned")
+        feats = payload.get("features")
+        if isinstance(returned, int) and isinstance(feats, list) and len(feats) < returned:
+            raise TruncatedResponseError(
+                f"Truncated response ({len(feats)} of {returned} features): {url}",
+                url=url,
+                body=body,
+                payload=payload,
+            )
+    return payload
 
 
 @dataclass(frozen=True)
@@ -16,43 +167,210 @@ class HttpClient:
 
     Note: `api.ra.no` occasionally returns truncated/invalid JSON even with HTTP 200.
     We use retries and request identity encoding to reduce compression-related truncation issues.
+    Bodies are read as raw bytes and decoded with orjson; truncation is raised as
+    `TruncatedResponseError` after `truncation_retries` extra attempts.
+
+    Each thread gets its own pooled `requests.Session` (keep-alive), so one instance can be
+    shared by every source and worker thread. `pool_size` sizes each of those per-thread pools
+    (hosts kept, and idle connections kept per host); it does not cap the client as a whole, which
+    holds up to one connection per host for every thread using it.
+
+    With a `cache`, responses are served from / stored in a `ResponseCache` (see cache.py).
+    Every request draws from `limiter`, a per-host adaptive token bucket shared process-wide by
+    default, so parallel jobs slow down together when the server throttles (see ratelimit.py).
+    Setting `hedge_quantile` enables hedged requests for slow outliers (see `_send`).
     """
 
     timeout_s: float = 60.0
     user_agent: str = "rag-for-ra/0.1"
     retries: int = 5
     backoff_s: float = 1.0
+    truncation_retries: int = 1
+    pool_size: int = 10
+    cache: ResponseCache | None = None
+    limiter: RateLimiter | None = DEFAULT_LIMITER
+    latency: LatencyTracker | None = DEFAULT_LATENCY
+    hedge_quantile: float | None = None  # e.g. 0.95; None disables hedging
+    hedge_min_samples: int = 20
+    hedge_min_delay_s: float = 0.25
+    _local: threading.local = field(default_factory=threading.local, init=False, repr=False, compare=False)
+
+    def session(self) -> requests.Session:
+        """Returns the calling thread's pooled session (created on first use)."""
+        sess = getattr(self._local, "session", None)
+        if sess is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            sess.headers.update(
+                {
+                    "User-Agent": self.user_agent,
+                    "Accept": "application/json",
+                    "Accept-Encoding": "identity",
+                }
+            )
+            self._local.session = sess
+        return sess
+
+    def close(self) -> None:
+        """Closes the calling thread's session, if any."""
+        sess = getattr(self._local, "session", None)
+        if sess is not None:
+            sess.close()
+            self._local.session = None
 
     def get_json(self, url: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
-        headers = {
-            "User-Agent": self.user_agent,
-            "Accept": "application/json",
-            "Accept-Encoding": "identity",
-        }
+        return self._get(url, params, decode_json, orjson.loads)
+
+    def get_json_body(self, url: str, params: dict[str, Any] | None = None) -> tuple[bytes, dict[str, Any]]:
+        """Like `get_json`, plus the raw body (e.g. to hand a page to another process without pickling it)."""
+
+        def decode_fresh(body: bytes, **received: Any) -> tuple[bytes, dict[str, Any]]:
+            return body, decode_json(body, **received)
+
+        return self._get(url, params, decode_fresh, lambda body: (body, orjson.loads(body)))
+
+    def get_bytes(self, url: str, params: dict[str, Any] | None = None, *, decode: Callable[[bytes], T] = bytes) -> T:
+        """
+        A binary response (e.g. ArcGIS `f=pbf`), checked for completeness and passed to `decode`,
+        with the same cache, rate limiting and retries as `get_json` (decode errors are retried
+        like invalid JSON).
+        """
+
+        def decode_fresh(body: bytes, **received: Any) -> T:
+            return decode(check_complete(body, **received))
+
+        return self._get(url, params, decode_fresh, decode, accept="*/*")
+
+    def _get(
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        decode: Callable[..., T],
+        decode_cached: Callable[[bytes], T],
+        *,
+        accept: str | None = None,
+    ) -> T:
+        cached = self.cache.lookup(url, params) if self.cache is not None else None
+        if cached is not None and (self.cache.offline or self.cache.is_fresh(cached)):
+            return decode_cached(cached.body)
+        if self.cache is not None and self.cache.offline:
+            raise CacheMiss(f"Offline and not cached: {url} {params or ''}")
+
         last_exc: Exception | None = None
+        truncations = 0
         for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(url)
             try:
-                resp = requests.get(url, params=params, headers=headers, timeout=self.timeout_s)
+                headers = cached.validators() if cached is not None else {}
+                if accept:
+                    headers["Accept"] = accept
+                fetched = self._send(url, params, headers or None)
+                resp = fetched.resp
+                if self.limiter is not None:
+                    self.limiter.on_response(url, resp.status_code, resp.headers.get("Retry-After"))
+                if resp.status_code == 304 and cached is not None:
+                    self.cache.refresh(cached)
+                    return decode_cached(cached.body)
                 resp.raise_for_status()
-                return resp.json()
-            except (RequestsJSONDecodeError, ValueError) as exc:
+                data = decode(
+                    fetched.body, url=url, content_length=resp.headers.get("Content-Length"), cut_short=fetched.cut_short
+                )
+                if self.cache is not None:
+                    # Only cache bodies that decoded completely, so truncated pages are never replayed.
+                    self.cache.store(url, params, fetched.body, resp.headers)
+                return data
+            except TruncatedResponseError as exc:
+                # Usually deterministic for a given page size: give up quickly so the caller can
+                # shrink the page (or salvage it) instead of sleeping through every retry.
+                last_exc = exc
+                truncations += 1
+                if truncations > self.truncation_retries or attempt >= self.retries:
+                    break
+            except ValueError as exc:
                 last_exc = exc
                 if attempt >= self.retries:
                     break
-                time.sleep(self.backoff_s * (2**attempt))
+                time.sleep(self._backoff(attempt))
             except HTTPError as exc:
                 last_exc = exc
                 status = getattr(exc.response, "status_code", None)
                 if status in {429, 500, 502, 503, 504} and attempt < self.retries:
-                    time.sleep(self.backoff_s * (2**attempt))
+                    if self.limiter is None or not exc.response.headers.get("Retry-After"):
+                        time.sleep(self._backoff(attempt))
+                    # With Retry-After, the shared limiter already holds back the whole host.
                     continue
                 break
             except Exception as exc:  # noqa: BLE001 - boundary retry wrapper
                 last_exc = exc
                 if attempt >= self.retries:
                     break
-                time.sleep(self.backoff_s * (2**attempt))
+                # Drop a possibly broken keep-alive connection before retrying.
+                self.close()
+                time.sleep(self._backoff(attempt))
+        assert last_exc is not None
+        raise last_exc
+
+    def _fetch_once(
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        headers: dict[str, str] | None,
+        cancel: threading.Event | None = None,
+    ) -> _Fetched:
+        started = time.monotonic()
+        resp = self.session().get(url, params=params, headers=headers, timeout=self.timeout_s, stream=True)
+        if resp.status_code >= 300:
+            resp.close()
+            return _Fetched(resp, b"", False)
+        body, cut_short = _read_body(resp, cancel)
+        if cancel is not None and cancel.is_set():
+            raise HedgeCancelled(url)
+        if self.latency is not None and not cut_short:
+            self.latency.record(url, time.monotonic() - started)
+        return _Fetched(resp, body, cut_short)
+
+    def _send(self, url: str, params: dict[str, Any] | None, headers: dict[str, str] | None) -> _Fetched:
+        """
+        One request, hedged when enabled: if the first attempt is still running after the host's
+        `hedge_quantile` latency, a duplicate is sent and whichever completes first wins. The loser's
+        body download is aborted (a request still waiting for headers finishes and is discarded).
+        """
+        delay = None
+        if self.hedge_quantile is not None and self.latency is not None:
+            delay = self.latency.quantile(url, self.hedge_quantile, min_samples=self.hedge_min_samples)
+        if delay is None:
+            return self._fetch_once(url, params, headers)
+
+        pool = _hedge_pool()
+        cancel_first, cancel_second = threading.Event(), threading.Event()
+        first = pool.submit(self._fetch_once, url, params, headers, cancel_first)
+        try:
+            return first.result(timeout=max(delay, self.hedge_min_delay_s))
+        except FuturesTimeout:
+            pass
+        if self.limiter is not None:
+            self.limiter.acquire(url)
+        second = pool.submit(self._fetch_once, url, params, headers, cancel_second)
+        pending = {first: cancel_first, second: cancel_second}
+        last_exc: BaseException | None = None
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.pop(fut)
+                exc = fut.exception()
+                if exc is None:
+                    for loser, cancel in pending.items():
+                        cancel.set()
+                        loser.cancel()
+                    return fut.result()
+                last_exc = exc
         assert last_exc is not None
         raise last_exc
 
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps parallel workers from retrying in lockstep.
+        return random.uniform(0.5, 1.0) * self.backoff_s * (2**attempt)
 
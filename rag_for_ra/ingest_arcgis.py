@@ -6,9 +6,13 @@ from pathlib import Path
 from tqdm import tqdm
 
 from .arcgis import ArcGisMapServer
+from .cache import add_cache_args, cache_from_args
 from .documents import arcgis_feature_to_document
-from .io import write_jsonl
+from .geometry import detached_geometry
+from .http import HttpClient
+from .io import add_compression_args, is_store, jsonl_suffix, write_jsonl
 from .openai_utils import REPO_ROOT
+from .schema import add_schema_args, schemas_from_args
 
 
 DEFAULT_MAPSERVER = "https://kart.ra.no/arcgis/rest/services/Distribusjon/Kulturminner20180301/MapServer"
@@ -21,14 +25,54 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--layer-name", default=None, help="Optional human name for the layer (used in doc IDs).")
     p.add_argument("--bbox", default=None, help="Optional bbox filter (WGS84): minLon,minLat,maxLon,maxLat.")
     p.add_argument("--page-size", type=int, default=2000, help="ArcGIS page size (resultRecordCount).")
+    p.add_argument(
+        "--by-ids",
+        action="store_true",
+        help="Fetch by ObjectID ranges (returnIdsOnly + `OBJECTID BETWEEN`) in parallel instead of resultOffset paging.",
+    )
+    p.add_argument("--range-size", type=int, default=1000, help="ObjectIDs per range with --by-ids.")
+    p.add_argument("--workers", type=int, default=4, help="Ranges fetched in parallel with --by-ids.")
+    p.add_argument(
+        "--format",
+        choices=["json", "pbf"],
+        default="json",
+        help="Query response format. pbf (protobuf) is several times smaller; falls back to json if the layer lacks it.",
+    )
+    p.add_argument(
+        "--max-allowable-offset",
+        type=float,
+        default=None,
+        help="Generalize geometries server-side to this tolerance (degrees, e.g. 0.0001).",
+    )
+    p.add_argument("--geometry-precision", type=int, default=None, help="Decimals kept in output coordinates (e.g. 6).")
     p.add_argument("--max-items", type=int, default=5000, help="Max features to ingest (safety default). Use 0 for unlimited.")
-    p.add_argument("--out", default=None, help="Output JSONL path. Default: artifacts/arcgis__<layerId>__<layerName>.jsonl")
+    p.add_argument(
+        "--out",
+        default=None,
+        help="Output JSONL path (.jsonl, .jsonl.gz or .jsonl.xz). Default: artifacts/arcgis__<layerId>__<layerName>.jsonl",
+    )
+    p.add_argument(
+        "--geometry-sidecar",
+        action="store_true",
+        help="Write geometries to a binary sidecar (<out>.geom, indexed by doc_id in <out>.geom.idx) and keep only "
+        "centroid and bbox in the JSONL.",
+    )
+    add_cache_args(p)
+    add_schema_args(p)
+    add_compression_args(p)
     return p.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    ms = ArcGisMapServer(mapserver_base=args.mapserver)
+    schemas_from_args(args)
+    ms = ArcGisMapServer(
+        mapserver_base=args.mapserver,
+        http=HttpClient(cache=cache_from_args(args)),
+        query_format=args.format,
+        max_allowable_offset=args.max_allowable_offset,
+        geometry_precision=args.geometry_precision,
+    )
 
     # Best-effort license inference: described as NLOD via GeoNorge in email (verify if needed per-layer).
     license_name = "NLOD"
@@ -36,21 +80,33 @@ def main() -> None:
 
     layer_info = ms.layer_info(args.layer_id)
     layer_name = args.layer_name or layer_info.get("name") or f"layer_{args.layer_id}"
+    ms = ms.for_layer(layer_info)
+    if ms.query_format != args.format:
+        print(f"Layer {args.layer_id} does not support f={args.format}; using f={ms.query_format}.")
 
-    out_path = Path(args.out) if args.out else REPO_ROOT / "artifacts" / f"arcgis__{args.layer_id}__{layer_name}.jsonl"
+    out_name = f"arcgis__{args.layer_id}__{layer_name}{jsonl_suffix(args.compress)}"
+    out_path = Path(args.out) if args.out else REPO_ROOT / "artifacts" / out_name
 
     max_items = None if args.max_items == 0 else args.max_items
 
+    if args.by_ids:
+        feats = ms.iter_layer_features_by_ids(
+            args.layer_id,
+            bbox_wgs84=args.bbox,
+            range_size=args.range_size,
+            workers=args.workers,
+            max_items=max_items,
+        )
+    else:
+        feats = ms.iter_layer_features(
+            args.layer_id,
+            bbox_wgs84=args.bbox,
+            page_size=args.page_size,
+            max_items=max_items,
+        )
+
     def row_iter():
-        for feat in tqdm(
-            ms.iter_layer_features(
-                args.layer_id,
-                bbox_wgs84=args.bbox,
-                page_size=args.page_size,
-                max_items=max_items,
-            ),
-            desc=f"arcgis layer {args.layer_id} ({layer_name})",
-        ):
+        for feat in tqdm(feats, desc=f"arcgis layer {args.layer_id} ({layer_name})"):
             doc = arcgis_feature_to_document(
                 dataset="arcgis",
                 layer_name=layer_name,
@@ -58,9 +114,11 @@ def main() -> None:
                 license_name=license_name,
                 license_url=license_url,
             )
-            yield doc.to_dict()
+            yield detach(doc)
 
-    n = write_jsonl(out_path, row_iter())
+    # A document store upserts into what is there, so its geometry sidecar is kept as well.
+    with detached_geometry(out_path, args.geometry_sidecar, truncate=not is_store(out_path)) as detach:
+        n = write_jsonl(out_path, row_iter())
     print(f"Wrote {n} documents to {out_path}")
 
 
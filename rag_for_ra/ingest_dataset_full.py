@@ -1,14 +1,20 @@
 from __future__ import annotations
 
 import argparse
+from collections import Counter
 from pathlib import Path
 
 from tqdm import tqdm
 
-from .documents import feature_to_document
-from .io import write_jsonl
-from .ogc import OgcSource
+from .cache import add_cache_args, cache_from_args
+from .http import HttpClient
+from .io import add_compression_args, jsonl_suffix
+from .ogc import OgcSource, paging_summary
 from .openai_utils import REPO_ROOT
+from .paging import PageSizeController
+from .pipeline import NormalizePool, NormalizeTask, feature_batches, page_batches, write_normalized
+from .schema import add_schema_args, schemas_from_args
+from .tiling import TileHarvester
 
 
 def parse_args() -> argparse.Namespace:
@@ -25,15 +31,45 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Comma-separated list of collection ids to ingest. Default: all collections in /collections.",
     )
-    p.add_argument("--limit", type=int, default=50, help="Paging size (keep small; see truncation note).")
+    p.add_argument("--limit", type=int, default=50, help="Initial paging size (keep small; see truncation note).")
+    p.add_argument(
+        "--max-limit",
+        type=int,
+        default=200,
+        help="Upper bound for the adaptive page size (remembered per collection in .rag_state.json). "
+        "Set to --limit to disable growth.",
+    )
     p.add_argument("--max-items-per-collection", type=int, default=0, help="0 = unlimited (full).")
+    p.add_argument(
+        "--tiled",
+        action="store_true",
+        help="Harvest each collection as a quadtree of bbox tiles over Norway instead of one deep offset scan.",
+    )
+    p.add_argument("--tile-max-items", type=int, default=5000, help="Split tiles until each matches at most this many features.")
+    p.add_argument("--prefetch", type=int, default=0, help="Pages kept in flight (concurrent, in-order paging). 0 = sequential.")
+    p.add_argument(
+        "--procs",
+        type=int,
+        default=0,
+        help="Worker processes for normalization and serialization. 0 = normalize on the fetching thread.",
+    )
+    p.add_argument(
+        "--geometry-sidecar",
+        action="store_true",
+        help="Write geometries to a binary sidecar (<out>.geom, indexed by doc_id in <out>.geom.idx) and keep only "
+        "centroid and bbox in the JSONL.",
+    )
+    add_cache_args(p)
+    add_schema_args(p)
+    add_compression_args(p)
     return p.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    schemas_from_args(args)
     api_base = f"https://api.ra.no/{args.dataset}"
-    src = OgcSource(api_base=api_base)
+    src = OgcSource(api_base=api_base, http=HttpClient(cache=cache_from_args(args)))
 
     # Best-effort license from OpenAPI.
     license_name = None
@@ -58,27 +94,40 @@ def main() -> None:
     out_dir.mkdir(parents=True, exist_ok=True)
 
     max_items = None if args.max_items_per_collection == 0 else args.max_items_per_collection
-
-    for cid in collection_ids:
-        out_path = out_dir / f"{args.dataset}__{cid}.jsonl"
-        print(f"\nIngesting {args.dataset}/{cid} → {out_path}")
-
-        def row_iter():
-            for feat in tqdm(
-                src.iter_items(str(cid), limit=args.limit, max_items=max_items),
-                desc=f"{args.dataset}/{cid}",
-            ):
-                doc = feature_to_document(
-                    dataset=args.dataset,
-                    collection=str(cid),
-                    feature=feat,
-                    license_name=license_name,
-                    license_url=license_url,
+    with NormalizePool(processes=max(0, args.procs)) as pool:
+        for cid in collection_ids:
+            cid = str(cid)
+            out_path = out_dir / f"{args.dataset}__{cid}{jsonl_suffix(args.compress)}"
+            print(f"\nIngesting {args.dataset}/{cid} → {out_path}")
+            page_size = PageSizeController.load(
+                f"{api_base}/collections/{cid}", limit=args.limit, max_limit=args.max_limit, cache=src.http.cache
+            )
+            strategies: Counter[str] = Counter()
+
+            if args.tiled:
+                harvester = TileHarvester(source=src, max_per_tile=args.tile_max_items, workers=max(1, args.prefetch))
+                feats = harvester.iter_items(
+                    cid, limit=args.limit, max_items=max_items, page_size=page_size, strategies=strategies
                 )
-                yield doc.to_dict()
-
-        n = write_jsonl(out_path, row_iter())
-        print(f"Wrote {n} documents to {out_path}")
+                batches = feature_batches(feats, 256)
+            else:
+                pages = src.iter_item_pages(
+                    cid,
+                    limit=args.limit,
+                    max_items=max_items,
+                    prefetch=args.prefetch,
+                    page_size=page_size,
+                    strategies=strategies,
+                )
+                batches = page_batches(pages, 256, raw=pool.processes > 0)
+
+            task = NormalizeTask(args.dataset, cid, license_name, license_url, detach_geometry=args.geometry_sidecar)
+            try:
+                with tqdm(desc=f"{args.dataset}/{cid}") as pbar:
+                    n = write_normalized(out_path, batches, task=task, pool=pool, truncate=True, progress=pbar.update)
+            finally:
+                page_size.save()
+            print(f"Wrote {n} documents to {out_path} (paging: {paging_summary(strategies)})")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import argparse
+from collections import Counter
 from pathlib import Path
+from typing import Any, Iterable
 
+import orjson
 from tqdm import tqdm
 
-from .documents import feature_to_document
-from .io import write_jsonl, write_jsonl_stream_append
-from .ogc import OgcSource
+from .cache import add_cache_args, cache_from_args
+from .http import HttpClient
+from .io import add_compression_args, jsonl_suffix, open_jsonl, strip_codec
+from .ogc import OgcSource, paging_summary
 from .openai_utils import REPO_ROOT
+from .paging import PageSizeController
+from .pipeline import NormalizePool, NormalizeTask, feature_batches, line_batches, page_batches, write_normalized
+from .schema import add_schema_args, schemas_from_args
 
 
 def parse_args() -> argparse.Namespace:
@@ -25,7 +32,14 @@ def parse_args() -> argparse.Namespace:
         help="Collection id under the dataset (see /collections). Example: kulturminner, brukerminner, sikringssoner.",
     )
     p.add_argument("--bbox", default=None, help="Optional bbox filter: minLon,minLat,maxLon,maxLat (CRS84).")
-    p.add_argument("--limit", type=int, default=50, help="Page size for OGC paging (keep small to avoid truncation).")
+    p.add_argument("--limit", type=int, default=50, help="Initial page size for OGC paging (keep small to avoid truncation).")
+    p.add_argument(
+        "--max-limit",
+        type=int,
+        default=200,
+        help="Upper bound for the adaptive page size (remembered per collection in .rag_state.json). "
+        "Set to --limit to disable growth.",
+    )
     p.add_argument(
         "--max-items",
         type=int,
@@ -36,15 +50,39 @@ def parse_args() -> argparse.Namespace:
     p.add_argument(
         "--out",
         default=None,
-        help="Output JSONL path. Default: artifacts/<dataset>__<collection>.jsonl",
+        help="Output JSONL path (.jsonl, .jsonl.gz or .jsonl.xz). Default: artifacts/<dataset>__<collection>.jsonl "
+        "(with --compress: .jsonl.gz / .jsonl.xz)",
+    )
+    p.add_argument("--prefetch", type=int, default=0, help="Pages kept in flight (concurrent, in-order paging). 0 = sequential.")
+    p.add_argument(
+        "--procs",
+        type=int,
+        default=0,
+        help="Worker processes for normalization and serialization. 0 = normalize on the fetching thread.",
+    )
+    p.add_argument(
+        "--features-file",
+        default=None,
+        help="Normalize a local bulk export instead of paging the API: GeoJSONL/JSONL (one feature per line, parsed "
+        "in the worker processes) or a GeoJSON FeatureCollection, optionally .gz/.xz. --max-items does not apply.",
     )
+    p.add_argument(
+        "--geometry-sidecar",
+        action="store_true",
+        help="Write geometries to a binary sidecar (<out>.geom, indexed by doc_id in <out>.geom.idx) and keep only "
+        "centroid and bbox in the JSONL.",
+    )
+    add_cache_args(p)
+    add_schema_args(p)
+    add_compression_args(p)
     return p.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    schemas_from_args(args)
     api_base = f"https://api.ra.no/{args.dataset}"
-    src = OgcSource(api_base=api_base)
+    src = OgcSource(api_base=api_base, http=HttpClient(cache=cache_from_args(args)))
 
     # Best-effort license from OpenAPI.
     license_name = None
@@ -57,29 +95,50 @@ def main() -> None:
     except Exception:
         pass
 
-    out_path = Path(args.out) if args.out else REPO_ROOT / "artifacts" / f"{args.dataset}__{args.collection}.jsonl"
+    out_name = f"{args.dataset}__{args.collection}{jsonl_suffix(args.compress)}"
+    out_path = Path(args.out) if args.out else REPO_ROOT / "artifacts" / out_name
     max_items = None if args.max_items == 0 else args.max_items
+    page_size = PageSizeController.load(
+        f"{api_base}/collections/{args.collection}",
+        limit=args.limit,
+        max_limit=args.max_limit,
+        cache=src.http.cache,
+    )
+    strategies: Counter[str] = Counter()
+    task = NormalizeTask(
+        args.dataset, args.collection, license_name, license_url, detach_geometry=args.geometry_sidecar
+    )
 
-    def row_iter():
-        for feat in tqdm(
-            src.iter_items(args.collection, limit=args.limit, max_items=max_items, bbox=args.bbox),
-            desc=f"{args.dataset}/{args.collection}",
-        ):
-            doc = feature_to_document(
-                dataset=args.dataset,
-                collection=args.collection,
-                feature=feat,
-                license_name=license_name,
-                license_url=license_url,
-            )
-            yield doc.to_dict()
-
-    if args.append:
-        n = write_jsonl_stream_append(out_path, row_iter())
+    batches: Iterable[list[dict[str, Any]] | bytes | tuple[bytes, ...]]
+    if args.features_file:
+        features_path = Path(args.features_file)
+        if strip_codec(features_path).suffix in {".geojsonl", ".jsonl", ".ndjson"}:
+            batches = line_batches(features_path, 256)
+        else:
+            with open_jsonl(features_path) as f:
+                batches = feature_batches(orjson.loads(f.read()).get("features") or [], 256)
     else:
-        n = write_jsonl(out_path, row_iter())
+        pages = src.iter_item_pages(
+            args.collection,
+            limit=args.limit,
+            max_items=max_items,
+            bbox=args.bbox,
+            prefetch=args.prefetch,
+            page_size=page_size,
+            strategies=strategies,
+        )
+        batches = page_batches(pages, 256, raw=args.procs > 0)
+
+    try:
+        with NormalizePool(processes=max(0, args.procs)) as pool, tqdm(desc=f"{args.dataset}/{args.collection}") as pbar:
+            n = write_normalized(
+                out_path, batches, task=task, pool=pool, truncate=not args.append, progress=pbar.update
+            )
+    finally:
+        page_size.save()
 
-    print(f"Wrote {n} documents to {out_path}")
+    source = args.features_file or f"paging: {paging_summary(strategies)}"
+    print(f"Wrote {n} documents to {out_path} ({source})")
 
 
 if __name__ == "__main__":
@@ -1,45 +1,307 @@
 from __future__ import annotations
 
+import argparse
+import gzip
+import lzma
+import mmap
+import os
+import zlib
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Iterable
+from typing import IO, Any, BinaryIO, Iterable, Iterator
 
 import orjson
 
+from .docstore import DocStore, is_store
+from .jsonl_index import RowIndexWriter, indexed_rows
+
+# The document fields the text preparation steps read (projection for `iter_jsonl`).
+TEXT_FIELDS = ("doc_id", "title", "text", "source")
+
+# File suffix -> codec of compressed JSONL artifacts (`<name>.jsonl.gz`, `<name>.jsonl.xz`).
+CODECS = {".gz": "gz", ".xz": "xz"}
+
 
 def ensure_parent(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def write_jsonl(path: Path, rows: Iterable[dict[str, Any]]) -> int:
-    ensure_parent(path)
-    n = 0
-    with path.open("wb") as f:
-        for row in rows:
-            f.write(orjson.dumps(row))
-            f.write(b"\n")
-            n += 1
-    return n
+def codec_for(path: Path) -> str | None:
+    return CODECS.get(path.suffix)
+
+
+def strip_codec(path: Path) -> Path:
+    """`x.jsonl.gz` -> `x.jsonl` (other paths unchanged)."""
+    return path.with_suffix("") if codec_for(path) else path
+
+
+def jsonl_suffix(compress: str | None) -> str:
+    return ".jsonl" if compress in (None, "none") else f".jsonl.{compress}"
+
+
+def add_compression_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--compress",
+        choices=["none", "gz", "xz"],
+        default="none",
+        help="Write JSONL caches compressed (<name>.jsonl.gz / .jsonl.xz). Readers detect the format from the suffix; "
+        "compressed caches stay appendable and resumable.",
+    )
+
+
+def open_jsonl(path: Path) -> IO[bytes]:
+    """A binary reader of a plain, .gz or .xz file (decompressed)."""
+    codec = codec_for(path)
+    if codec == "gz":
+        return gzip.open(path, "rb")
+    if codec == "xz":
+        return lzma.open(path, "rb")
+    return path.open("rb")
+
+
+def _decoder(codec: str | None) -> Any:
+    return zlib.decompressobj(31) if codec == "gz" else lzma.LZMADecompressor()
+
+
+def _decoded(path: Path, start: int = 0) -> Iterator[tuple[bytes, int | None]]:
+    """
+    (output, member_end) pieces of a .gz/.xz file from offset `start`: member_end is the file offset
+    where a member just ended, else None. Output after the last member_end belongs to a member an
+    interrupted write left incomplete.
+    """
+    codec = codec_for(path)
+    decoder = _decoder(codec)
+    pos = start
+    with path.open("rb") as f:
+        f.seek(start)
+        while chunk := f.read(1 << 20):
+            pos += len(chunk)
+            data = chunk
+            while data:
+                out = decoder.decompress(data)
+                if not decoder.eof:
+                    yield out, None
+                    break
+                data = decoder.unused_data
+                yield out, pos - len(data)
+                decoder = _decoder(codec)
+
+
+@dataclass(eq=False)
+class JsonlWriter:
+    """
+    Appends JSONL to a plain, .gz or .xz file (codec from the suffix unless given). Compressed
+    output is a series of independent members (ended by `flush`, or after `member_size` bytes of
+    rows), so a file can always be appended to later; an append first rewrites the complete rows
+    of a member an interrupted writer left unfinished. `tell()` is a point the file can be
+    truncated back to.
+    """
+
+    path: Path
+    truncate: bool = False
+    codec: str | None = None
+    member_size: int = 1 << 20
+    index: bool = True
+    _raw: BinaryIO | None = field(default=None, init=False, repr=False)
+    _member: gzip.GzipFile | lzma.LZMAFile | None = field(default=None, init=False, repr=False)
+    _member_bytes: int = field(default=0, init=False, repr=False)
+    _rows: RowIndexWriter | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.codec is None:
+            self.codec = codec_for(self.path)
+
+    def __enter__(self) -> JsonlWriter:
+        ensure_parent(self.path)
+        if self.truncate:
+            self._raw = self.path.open("wb")
+        if self.index and self.codec is None:
+            self._rows = RowIndexWriter(self.path, truncate=self.truncate).__enter__()
+        if self.truncate:
+            return self
+        salvaged = self._repair() if self.codec is not None and self.path.exists() else b""
+        self._raw = self.path.open("ab")
+        if salvaged:
+            self.write(salvaged)
+            self.flush()
+        return self
+
+    def _repair(self) -> bytes:
+        """Cuts an incomplete trailing member off the file; returns its complete rows (rewritten as a new member)."""
+        good = 0
+        for _out, end in _decoded(self.path):
+            if end is not None:
+                good = end
+        if good == self.path.stat().st_size:
+            return b""
+        rows = b"".join(out for out, _end in _decoded(self.path, good))
+        with self.path.open("r+b") as f:
+            f.truncate(good)
+        return rows[: rows.rfind(b"\n") + 1]
 
+    def __exit__(self, *exc: Any) -> None:
+        if self._raw is not None:
+            self.flush()
+            self._raw.close()
+            self._raw = None
+        if self._rows is not None:
+            self._rows.__exit__(*exc)
+            self._rows = None
 
-def write_jsonl_stream_append(path: Path, rows: Iterable[dict[str, Any]]) -> int:
-    ensure_parent(path)
-    n = 0
-    with path.open("ab") as f:
+    def write(self, data: bytes) -> None:
+        assert self._raw is not None, "use JsonlWriter as a context manager"
+        if self.codec is None:
+            self._raw.write(data)
+            if self._rows is not None:
+                self._rows.rows_written(data)
+            return
+        if self._member is None:
+            if self.codec == "gz":
+                self._member = gzip.GzipFile(filename="", fileobj=self._raw, mode="wb", mtime=0)
+            else:
+                self._member = lzma.LZMAFile(self._raw, mode="wb")
+        self._member.write(data)
+        self._member_bytes += len(data)
+        if self._member_bytes >= self.member_size:
+            self.flush()
+
+    def write_rows(self, rows: Iterable[Any]) -> int:
+        n = 0
         for row in rows:
-            f.write(orjson.dumps(row))
-            f.write(b"\n")
+            self.write(orjson.dumps(row) + b"\n")
             n += 1
-    return n
+        return n
 
+    def flush(self) -> None:
+        """Ends the current compressed member and flushes the file."""
+        if self._member is not None:
+            self._member.close()
+            self._member = None
+            self._member_bytes = 0
+        if self._raw is not None:
+            self._raw.flush()
+        if self._rows is not None:
+            self._rows.flush()
 
-def read_jsonl(path: Path) -> list[dict[str, Any]]:
-    rows: list[dict[str, Any]] = []
-    with path.open("rb") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
+    def tell(self) -> int:
+        assert self._raw is not None, "use JsonlWriter as a context manager"
+        self.flush()
+        return self._raw.tell()
+
+
+def open_writer(path: Path, *, truncate: bool = False) -> JsonlWriter | DocStore:
+    """
+    The writer of a document cache: a `DocStore` for `.sqlite` / `.db` paths, else a `JsonlWriter`.
+    A store is never truncated; rewritten documents are upserted by doc_id instead.
+    """
+    if is_store(path):
+        return DocStore(path)
+    return JsonlWriter(path, truncate=truncate)
+
+
+def write_jsonl(path: Path, rows: Iterable[Any]) -> int:
+    """Writes rows (dicts, or dataclasses such as `RagDocument`, which orjson serializes directly)."""
+    with open_writer(path, truncate=True) as f:
+        return f.write_rows(rows)
+
+
+def write_jsonl_stream_append(path: Path, rows: Iterable[Any]) -> int:
+    with open_writer(path) as f:
+        return f.write_rows(rows)
+
+
+def _split_lines(buf: bytes | mmap.mmap, start: int, end: int) -> Iterator[memoryview]:
+    """Zero-copy views of the non-blank, newline-terminated lines in buf[start:end] (and a final unterminated one)."""
+    view = memoryview(buf)
+    try:
+        pos = start
+        while pos < end:
+            nl = buf.find(b"\n", pos, end)
+            if nl < 0:
+                nl = end
+            line = view[pos:nl]
+            pos = nl + 1
+            if not line or (line[0] in b" \t\r" and not bytes(line).strip()):
+                line.release()
                 continue
-            rows.append(orjson.loads(line))
-    return rows
+            try:
+                yield line
+            finally:
+                line.release()
+    finally:
+        view.release()
 
 
+def iter_lines(path: Path) -> Iterator[memoryview]:
+    """
+    The non-blank lines of a JSONL file (without the newline) as zero-copy views: into a memory
+    map for plain files, into the decompressed chunk for .gz/.xz. A view is released when the next
+    line is requested: copy it (`bytes(line)`) to keep it. In a compressed file, the unterminated
+    last row of a member cut short by an interrupted write is skipped. A document store yields its
+    rows in insertion order.
+    """
+    if is_store(path):
+        yield from _iter_store_lines(path)
+        return
+    if codec_for(path) is not None:
+        yield from _iter_compressed_lines(path)
+        return
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _split_lines(mm, 0, len(mm))
+
+
+def _iter_compressed_lines(path: Path) -> Iterator[memoryview]:
+    tail = b""
+    complete = True
+    for out, end in _decoded(path):
+        complete = end is not None
+        buf = tail + out
+        cut = buf.rfind(b"\n") + 1
+        yield from _split_lines(buf, 0, cut)
+        tail = buf[cut:]
+    if tail and complete:
+        yield from _split_lines(tail, 0, len(tail))
+
+
+def _iter_store_lines(path: Path) -> Iterator[memoryview]:
+    if not path.exists():
+        raise FileNotFoundError(path)  # rather than creating an empty store
+    with DocStore(path) as store:
+        for row in store.iter_raw():
+            with memoryview(row) as line:
+                yield line
+
+
+def count_rows(path: Path) -> int:
+    """Rows of a JSONL file: from its row index when that covers the file, else by scanning it."""
+    if is_store(path):
+        if not path.exists():
+            raise FileNotFoundError(path)
+        with DocStore(path) as store:
+            return store.count()
+    if codec_for(path) is None:
+        n = indexed_rows(path)
+        if n is not None:
+            return n
+    return sum(1 for _ in iter_lines(path))
+
+
+def iter_jsonl(path: Path, fields: Iterable[str] | None = None) -> Iterator[Any]:
+    """
+    Parses a JSONL file lazily, one row at a time, so memory stays flat whatever its size.
+    With `fields`, rows are cut down to those top-level keys (when present) right after parsing.
+    """
+    keep = tuple(fields) if fields is not None else None
+    for line in iter_lines(path):
+        row = orjson.loads(line)
+        if keep is not None and isinstance(row, dict):
+            row = {k: row[k] for k in keep if k in row}
+        yield row
+
+
+def read_jsonl(path: Path) -> list[dict[str, Any]]:
+    """All rows of a JSONL file in memory; prefer `iter_jsonl` for caches of any size."""
+    return list(iter_jsonl(path))
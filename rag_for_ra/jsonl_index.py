@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator
+
+import orjson
+
+from .docstore import STORE_SUFFIXES
+
+
+# `<jsonl>.idx` holds one fixed-width record per row: little-endian (end offset of the row's line,
+# 64-bit key of its doc_id). Row n spans [end of row n-1, end of row n); the row count is the file
+# size / 16. Only plain JSONL is indexed (compressed caches can't be seeked into).
+_ENTRY = struct.Struct("<QQ")
+# Caches that can't be indexed: compressed (`io.CODECS`) or SQLite document stores.
+_UNSEEKABLE = (".gz", ".xz", *STORE_SUFFIXES)
+_DOC_ID = re.compile(rb'^\s*\{\s*"doc_id"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def index_path(jsonl_path: Path) -> Path:
+    return jsonl_path.with_suffix(jsonl_path.suffix + ".idx")
+
+
+def doc_key(doc_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def row_doc_id(line: bytes | memoryview) -> str:
+    """The doc_id of a JSONL row; rows written from `RagDocument` start with it, others are parsed."""
+    match = _DOC_ID.match(line)
+    if match is not None:
+        return orjson.loads(match.group(1))
+    return str(orjson.loads(line).get("doc_id", ""))
+
+
+def _row_key(line: bytes | memoryview) -> int:
+    try:
+        return doc_key(row_doc_id(line))
+    except orjson.JSONDecodeError:
+        return 0  # a damaged row still takes its place in the row count; it just can't be looked up
+
+
+def _scan(jsonl_path: Path, start: int) -> Iterator[tuple[int, int]]:
+    """(end offset, doc key) of the non-blank rows of a JSONL file from byte `start`."""
+    size = jsonl_path.stat().st_size
+    if size <= start:
+        return
+    with jsonl_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < size:
+            nl = mm.find(b"\n", pos)
+            end = size if nl < 0 else nl + 1
+            line = mm[pos:end]
+            pos = end
+            if line.strip():
+                yield end, _row_key(line)
+
+
+def _entries(path: Path) -> array:
+    entries = array("Q")
+    if path.exists():
+        data = path.read_bytes()
+        entries.frombytes(data[: len(data) - len(data) % _ENTRY.size])
+    return entries
+
+
+@dataclass(eq=False)
+class RowIndexWriter:
+    """
+    Keeps `<jsonl>.idx` in step with a JSONL file that is appended to (see `JsonlWriter`).
+    On open the index is reconciled with the file first: entries past its end (e.g. after a
+    checkpoint truncation) are dropped, rows the index lacks are scanned in.
+    """
+
+    jsonl_path: Path
+    truncate: bool = False
+    _file: BinaryIO | None = field(default=None, init=False, repr=False)
+    _offset: int = field(default=0, init=False, repr=False)
+    _partial: bytes = field(default=b"", init=False, repr=False)
+    _pending: array = field(default_factory=lambda: array("Q"), init=False, repr=False)
+
+    def __enter__(self) -> RowIndexWriter:
+        path = index_path(self.jsonl_path)
+        if self.truncate or not self.jsonl_path.exists():
+            self._file = path.open("wb")
+            return self
+        size = self.jsonl_path.stat().st_size
+        entries = _entries(path)
+        keep = len(entries)  # array items: two per row
+        while keep and entries[keep - 2] > size:
+            keep -= 2
+        self._file = path.open("r+b" if path.exists() else "wb")
+        self._file.truncate(keep * entries.itemsize)
+        self._file.seek(0, os.SEEK_END)
+        for end, key in _scan(self.jsonl_path, entries[keep - 2] if keep else 0):
+            self._pending.extend((end, key))
+        self._offset = size
+        self.flush()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def rows_written(self, data: bytes | memoryview) -> None:
+        """Records the rows completed by `data`, just appended to the JSONL file."""
+        chunk = self._partial + bytes(data) if self._partial else bytes(data)
+        base = self._offset - len(self._partial)
+        pos = 0
+        while (nl := chunk.find(b"\n", pos)) >= 0:
+            line = chunk[pos:nl]
+            if line.strip():
+                self._pending.extend((base + nl + 1, _row_key(line)))
+            pos = nl + 1
+        self._partial = chunk[pos:]
+        self._offset = base + len(chunk)
+
+    def flush(self) -> None:
+        """Writes the recorded entries (call after flushing the JSONL file, so the index never runs ahead)."""
+        if self._file is not None and self._pending:
+            self._file.write(self._pending.tobytes())
+            self._file.flush()
+            self._pending = array("Q")
+
+
+@dataclass(frozen=True)
+class RowIndex:
+    """
+    A loaded `<jsonl>.idx`: row count, byte ranges and doc_id lookups for a JSONL cache. The first
+    lookup maps doc keys to rows in one pass; later lookups are dict hits.
+    """
+
+    jsonl_path: Path
+    entries: array
+    _latest: dict[int, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _earlier: dict[int, list[int]] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def load(cls, jsonl_path: Path) -> RowIndex | None:
+        """The index of a JSONL file, or None if there is none or it doesn't cover the file exactly."""
+        path = index_path(jsonl_path)
+        if not jsonl_path.exists() or not path.exists():
+            return None
+        entries = _entries(path)
+        last = entries[-2] if entries else 0
+        return cls(jsonl_path, entries) if last == jsonl_path.stat().st_size else None
+
+    def __len__(self) -> int:
+        return len(self.entries) // 2
+
+    def span(self, row: int) -> tuple[int, int]:
+        """(start, end) byte offsets of row `row` (0-based)."""
+        return (self.entries[2 * row - 2] if row else 0), self.entries[2 * row]
+
+    def _rows_by_key(self) -> dict[int, int]:
+        """doc key -> its latest row (built on first use; superseded rows go to `_earlier`)."""
+        if self.entries and not self._latest:
+            keys = self.entries[1::2]
+            latest = dict(zip(keys, range(len(keys))))  # later rows overwrite earlier ones
+            earlier: dict[int, list[int]] = {}
+            if len(latest) < len(keys):
+                for row, key in enumerate(keys):
+                    if latest[key] != row:
+                        earlier.setdefault(key, []).append(row)
+            self._earlier.update(earlier)
+            self._latest.update(latest)
+        return self._latest
+
+    def rows_of(self, doc_id: str) -> list[int]:
+        """Rows whose doc_id key matches (oldest first; the last one is the current version)."""
+        key = doc_key(doc_id)
+        row = self._rows_by_key().get(key)
+        return [] if row is None else [*self._earlier.get(key, ()), row]
+
+    def read(self, row: int) -> dict[str, Any]:
+        start, end = self.span(row)
+        with self.jsonl_path.open("rb") as f:
+            f.seek(start)
+            return orjson.loads(f.read(end - start))
+
+    def lookup(self, doc_ids: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """doc_id -> its latest row, for the doc_ids present; one seek per document."""
+        wanted = {doc_key(doc_id): doc_id for doc_id in doc_ids}
+        rows = self._rows_by_key()
+        latest = sorted((rows[key], key) for key in wanted if key in rows)  # seek in file order
+        found: dict[str, dict[str, Any]] = {}
+        with self.jsonl_path.open("rb") as f:
+            for row, key in latest:
+                start, end = self.span(row)
+                f.seek(start)
+                doc = orjson.loads(f.read(end - start))
+                if doc.get("doc_id") == wanted[key]:  # 64-bit key collisions are verified away
+                    found[wanted[key]] = doc
+        return found
+
+
+def indexed_rows(jsonl_path: Path) -> int | None:
+    """The row count of a JSONL file from its index (two small reads), or None if the index doesn't cover it."""
+    path = index_path(jsonl_path)
+    if not jsonl_path.exists() or not path.exists():
+        return None
+    n = path.stat().st_size // _ENTRY.size
+    if n == 0:
+        return 0 if jsonl_path.stat().st_size == 0 else None
+    with path.open("rb") as f:
+        f.seek((n - 1) * _ENTRY.size)
+        end, _key = _ENTRY.unpack(f.read(_ENTRY.size))
+    return n if end == jsonl_path.stat().st_size else None
+
+
+def build_index(jsonl_path: Path) -> RowIndex | None:
+    """
+    Brings `<jsonl>.idx` up to date with an existing JSONL file (scanning only rows it lacks) and
+    loads it; None if the file ends in an unterminated row. Raises ValueError for a compressed
+    cache or a document store, whose rows have no byte offsets to seek to.
+    """
+    if jsonl_path.suffix in _UNSEEKABLE:
+        raise ValueError(f"{jsonl_path}: only plain JSONL caches can be indexed")
+    with RowIndexWriter(jsonl_path):
+        pass
+    return RowIndex.load(jsonl_path)
+
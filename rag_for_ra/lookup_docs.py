@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from .docstore import DocStore, is_store
+from .io import codec_for, iter_lines
+from .jsonl_index import RowIndex, build_index, row_doc_id
+from .openai_utils import REPO_ROOT
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Print the full JSONL records of documents by DOC_ID (e.g. from chat/search hits), "
+        "seeking through the caches' row index (<jsonl>.idx) instead of scanning them. Compressed "
+        "caches (.gz/.xz) are scanned; document stores (.sqlite/.db) are queried."
+    )
+    p.add_argument("doc_ids", nargs="+", help="doc_id values (the DOC_ID: line of a retrieved block).")
+    p.add_argument(
+        "--jsonl",
+        action="append",
+        default=[],
+        help="Cache to search (repeatable): JSONL, .jsonl.gz/.xz or a .sqlite/.db store. Default: every artifacts/sync/*.jsonl",
+    )
+    p.add_argument("--field", action="append", default=[], help="Print only these top-level fields (repeatable).")
+    return p.parse_args()
+
+
+def lookup(path: Path, doc_ids: list[str]) -> dict[str, dict[str, Any]] | None:
+    """doc_id -> its latest row in one cache; None if a plain cache ends in an unterminated row."""
+    if is_store(path):
+        with DocStore(path) as store:
+            return store.lookup(doc_ids)
+    if codec_for(path) is not None:
+        # No byte offsets to seek to in a compressed stream: one pass, the last row of a doc_id wins.
+        wanted = set(doc_ids)
+        found: dict[str, dict[str, Any]] = {}
+        for line in iter_lines(path):
+            if row_doc_id(line) in wanted:
+                doc = orjson.loads(line)
+                found[doc["doc_id"]] = doc
+        return found
+    # A missing or stale index is brought up to date first (a one-time scan of the rows it lacks).
+    index = RowIndex.load(path) or build_index(path)
+    return None if index is None else index.lookup(doc_ids)
+
+
+def main() -> None:
+    args = parse_args()
+    paths = [Path(p) for p in args.jsonl] or sorted((REPO_ROOT / "artifacts" / "sync").glob("*.jsonl"))
+    missing = list(dict.fromkeys(args.doc_ids))
+
+    for path in paths:
+        if not missing:
+            break
+        found = lookup(path, missing)
+        if found is None:
+            print(f"Skipping {path}: it ends in an unterminated row.", file=sys.stderr)
+            continue
+        for doc_id in missing:
+            if doc_id in found:
+                doc = found[doc_id]
+                if args.field:
+                    doc = {k: doc[k] for k in args.field if k in doc}
+                sys.stdout.write(orjson.dumps(doc).decode("utf-8") + "\n")
+        missing = [doc_id for doc_id in missing if doc_id not in found]
+
+    if missing:
+        raise SystemExit(f"Not found: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
+
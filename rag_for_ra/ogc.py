@@ -1,9 +1,127 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Iterable
+import re
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Iterable, Iterator
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
 
-from .http import HttpClient
+import orjson
+
+from .cache import CacheMiss
+from .http import HttpClient, TruncatedResponseError
+from .paging import PageSizeController
+
+
+_FEATURES_ARRAY = re.compile(rb'"features"\s*:\s*\[')
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+_STRING_TAIL = re.compile(rb'(?:[^"\\]|\\.)*"', re.S)
+
+
+def salvage_features(body: bytes) -> list[dict[str, Any]]:
+    """
+    Recovers every complete feature from a truncated GeoJSON FeatureCollection body.
+
+    Scans the `features` array with a small bracket/string-aware tokenizer and decodes each
+    top-level element once its closing brace has arrived; the partial tail is dropped.
+    """
+    m = _FEATURES_ARRAY.search(body)
+    if not m:
+        return []
+    out: list[dict[str, Any]] = []
+    pos = m.end()
+    depth = 0
+    start = -1
+    while True:
+        tok = _STRUCTURAL.search(body, pos)
+        if tok is None:
+            break
+        ch = body[tok.start()]
+        if ch == 0x22:  # '"': skip the whole string literal (brackets inside don't count)
+            tail = _STRING_TAIL.match(body, tok.end())
+            if tail is None:
+                break
+            pos = tail.end()
+            continue
+        if ch in (0x7B, 0x5B):  # '{' '['
+            if depth == 0:
+                start = tok.start()
+            depth += 1
+        else:  # '}' ']'
+            if depth == 0:
+                break  # end of the features array
+            depth -= 1
+            if depth == 0:
+                try:
+                    out.append(orjson.loads(body[start : tok.end()]))
+                except orjson.JSONDecodeError:
+                    break
+        pos = tok.end()
+    return out
+
+
+def features_from_truncated(exc: TruncatedResponseError) -> list[dict[str, Any]]:
+    """Complete features of a truncated page (parsed, or salvaged from the raw bytes)."""
+    if exc.payload is not None:
+        return list(exc.payload.get("features") or [])
+    return salvage_features(exc.body)
+
+
+def next_link(payload: dict[str, Any]) -> str | None:
+    """The `links[rel=next]` href of an items response, if the server provides one."""
+    for link in payload.get("links") or []:
+        if isinstance(link, dict) and link.get("rel") == "next" and link.get("href"):
+            return str(link["href"])
+    return None
+
+
+def _link_request(href: str, base_params: dict[str, Any], limit: int) -> tuple[str, dict[str, Any]]:
+    """Splits a next link into (url, params) with our page size, so caching and retries work as usual."""
+    parts = urlsplit(href)
+    params: dict[str, Any] = dict(parse_qsl(parts.query, keep_blank_values=True))
+    for key, value in base_params.items():
+        params.setdefault(key, value)
+    params["limit"] = limit
+    return urlunsplit(parts._replace(query="", fragment="")), params
+
+
+def paging_summary(strategies: Counter[str]) -> str:
+    """Human-readable paging strategy of a harvest, from page counts per `OgcPage.via`."""
+    if not strategies:
+        return "no pages"
+    names = {"next": "next links", "offset": "offset"}
+    return ", ".join(f"{names.get(via, via)} ({n} pages)" for via, n in strategies.most_common())
+
+
+@dataclass(frozen=True)
+class Projection:
+    """
+    Server-side trimming of items responses: only `properties` (None = all) and no geometry with
+    `skip_geometry`. These are pygeoapi's `properties=` / `skipGeometry=` query parameters; use
+    `OgcSource.projection()` to keep only what the server advertises.
+    """
+
+    properties: tuple[str, ...] | None = None
+    skip_geometry: bool = False
+
+    def params(self) -> dict[str, Any]:
+        params: dict[str, Any] = {}
+        if self.properties:
+            params["properties"] = ",".join(self.properties)
+        if self.skip_geometry:
+            params["skipGeometry"] = "true"
+        return params
+
+
+@dataclass(frozen=True)
+class OgcPage:
+    offset: int
+    features: list[dict[str, Any]]
+    number_matched: int | None = None
+    salvaged: bool = False  # features recovered from a truncated body
+    via: str = "offset"  # "next" when fetched through the previous page's links[rel=next]
+    body: bytes | None = None  # the raw response, when it holds exactly `features` (not salvaged or trimmed)
 
 
 @dataclass(frozen=True)
@@ -21,50 +139,398 @@ class OgcSource:
         payload = self.http.get_json(f"{self.api_base}/collections", params={"f": "json"})
         return list(payload.get("collections", []))
 
-    def iter_items(
+    def collection(self, collection_id: str) -> dict[str, Any]:
+        return self.http.get_json(f"{self.api_base}/collections/{collection_id}", params={"f": "json"})
+
+    def openapi(self) -> dict[str, Any]:
+        return self.http.get_json(f"{self.api_base}/api", params={"f": "json"})
+
+    def items_parameters(self, collection_id: str, openapi: dict[str, Any]) -> dict[str, dict[str, Any]]:
+        """Query parameters the OpenAPI document declares for the collection's items path (by name)."""
+        paths = openapi.get("paths") or {}
+        path = paths.get(f"/collections/{collection_id}/items") or paths.get("/collections/{collectionId}/items") or {}
+        out: dict[str, dict[str, Any]] = {}
+        for param in (path.get("get") or {}).get("parameters") or []:
+            ref = param.get("$ref") if isinstance(param, dict) else None
+            if isinstance(ref, str) and ref.startswith("#/"):
+                param = openapi
+                for part in ref[2:].split("/"):
+                    param = param.get(part) if isinstance(param, dict) else None
+            if isinstance(param, dict) and param.get("name"):
+                out[str(param["name"])] = param
+        return out
+
+    def projection(
+        self,
+        collection_id: str,
+        *,
+        properties: Iterable[str] | None = None,
+        skip_geometry: bool = False,
+        openapi: dict[str, Any] | None = None,
+    ) -> Projection:
+        """
+        The part of the wanted projection this server supports for `collection_id`.
+
+        Unknown property names are rejected by the server, so `properties` is narrowed to the names
+        the OpenAPI `properties` parameter enumerates (or the collection's queryables); when neither
+        is available, properties are not projected at all.
+        """
+        try:
+            params = self.items_parameters(collection_id, self.openapi() if openapi is None else openapi)
+        except Exception:
+            return Projection()
+        wanted: tuple[str, ...] | None = None
+        if properties is not None and "properties" in params:
+            schema = params["properties"].get("schema") or {}
+            known = (schema.get("items") or {}).get("enum") or schema.get("enum")
+            if not known:
+                try:
+                    queryables = self.http.get_json(
+                        f"{self.api_base}/collections/{collection_id}/queryables", params={"f": "json"}
+                    )
+                    known = list((queryables.get("properties") or {}).keys())
+                except Exception:
+                    known = None
+            if known:
+                wanted = tuple(p for p in properties if p in set(known)) or None
+        return Projection(properties=wanted, skip_geometry=skip_geometry and "skipGeometry" in params)
+
+    def count(self, collection_id: str, *, bbox: str | None = None, datetime: str | None = None) -> int | None:
+        """`numberMatched` for a query (one single-feature request); None if the server doesn't report it."""
+        params: dict[str, Any] = {"f": "json", "limit": 1}
+        if bbox:
+            params["bbox"] = bbox
+        if datetime:
+            params["datetime"] = datetime
+        payload = self.http.get_json(f"{self.api_base}/collections/{collection_id}/items", params=params)
+        matched = payload.get("numberMatched")
+        return matched if isinstance(matched, int) else None
+
+    def supports_datetime(self, collection_id: str) -> bool:
+        """Whether the collection advertises a temporal extent (i.e. can be filtered with `datetime`)."""
+        temporal = (self.collection(collection_id).get("extent") or {}).get("temporal") or {}
+        return any(any(v is not None for v in iv or []) for iv in temporal.get("interval") or [])
+
+    def iter_pages(
         self,
         collection_id: str,
         *,
         limit: int = 50,
         max_items: int | None = None,
         bbox: str | None = None,
+        datetime: str | None = None,
+        projection: Projection | None = None,
         start_offset: int = 0,
-    ) -> Iterable[dict[str, Any]]:
+        end_offset: int | None = None,
+        skip_failed: bool = False,
+        on_skip: Callable[[int, Exception], None] | None = None,
+        page_size: PageSizeController | None = None,
+    ) -> Iterator[OgcPage]:
         """
-        Iterates GeoJSON features for a collection using OGC paging via `offset`.
+        Iterates pages of a collection, following the server's `links[rel=next]` cursor when it
+        provides one and falling back to `offset` paging otherwise (or after a page whose links were
+        lost to truncation, or a next link that fails or doesn't continue at the expected offset).
+        Each page records how it was fetched in `OgcPage.via`.
 
-        Note: Some api.ra.no responses become invalid/truncated when `limit` is too large
-        (even with HTTP 200). We therefore default to a conservative page size.
+        The page size comes from `page_size` (default: a fresh controller starting at `limit`):
+        it shrinks on truncation and grows back after a run of clean pages. Truncated pages are
+        salvaged: every complete feature is yielded and paging resumes at the first missing offset.
+        Other errors halve the current request only; with `skip_failed`, an offset that still fails
+        at page size 1 is reported to `on_skip` and skipped, otherwise the error is raised after
+        4 attempts. `end_offset` (exclusive) stops paging at a fixed offset, e.g. for one range of a
+        prefetch. `datetime` is passed through as the OGC temporal filter (e.g. "2024-05-01T00:00:00Z/..")
+        and `projection` trims properties/geometry server-side.
         """
         url = f"{self.api_base}/collections/{collection_id}/items"
-        params: dict[str, Any] = {"f": "json", "limit": int(limit), "offset": int(start_offset)}
+        base_params: dict[str, Any] = {"f": "json"}
         if bbox:
-            params["bbox"] = bbox
+            base_params["bbox"] = bbox
+        if datetime:
+            base_params["datetime"] = datetime
+        if projection is not None:
+            base_params.update(projection.params())
 
+        offset = int(start_offset)
+        if page_size is None:
+            page_size = PageSizeController(limit=limit, max_limit=limit)
         yielded = 0
-        while True:
-            payload = None
-            cur_limit = int(params.get("limit", limit))
-            for _attempt in range(4):
+        cursor: str | None = None  # previous page's next link
+        cursor_seen = False  # the server pages with next links: a full page without one is the last
+        while (max_items is None or yielded < max_items) and (end_offset is None or offset < end_offset):
+            page_limit = page_size.limit
+            cur_limit = page_limit if max_items is None else max(1, min(page_limit, max_items - yielded))
+            if end_offset is not None:
+                cur_limit = min(cur_limit, end_offset - offset)
+            requested = cur_limit
+            errors = 0
+            page: OgcPage | None = None
+            link: str | None = None
+            while page is None:
+                if cursor is not None:
+                    page_url, params = _link_request(cursor, base_params, cur_limit)
+                else:
+                    page_url, params = url, dict(base_params, limit=cur_limit, offset=offset)
                 try:
-                    payload = self.http.get_json(url, params=params)
-                    break
+                    body, payload = self.http.get_json_body(page_url, params=params)
+                    features = list(payload.get("features") or [])
+                    page = OgcPage(
+                        offset,
+                        features,
+                        payload.get("numberMatched"),
+                        via="offset" if cursor is None else "next",
+                        body=body,
+                    )
+                    link = next_link(payload)
+                    if cur_limit == requested:
+                        page_size.on_success(page_limit)
+                except CacheMiss:
+                    raise
+                except TruncatedResponseError as exc:
+                    # The page is too large to come through intact (and its links are gone with the tail).
+                    cursor = None
+                    page_size.on_truncation(cur_limit)
+                    feats = features_from_truncated(exc)
+                    if feats:
+                        page = OgcPage(offset, feats[:cur_limit], salvaged=True)
+                        continue
+                    if cur_limit > 1:
+                        cur_limit = max(1, min(page_size.limit, cur_limit // 2))
+                        continue
+                    if not skip_failed:
+                        raise
+                    page = self._skip(offset, exc, on_skip)
                 except Exception as exc:
-                    cur_limit = max(5, cur_limit // 2)
-                    params["limit"] = cur_limit
-                    if _attempt >= 3:
-                        raise exc
-
-            assert payload is not None
-            feats = payload.get("features") or []
-            for feat in feats:
+                    if cursor is not None:
+                        # Don't trust a link that fails: retry the same position by offset.
+                        cursor = None
+                        continue
+                    errors += 1
+                    if skip_failed:
+                        # Server errors (e.g. HTTP 500 on one bad record): shrink until isolated.
+                        if cur_limit > 1:
+                            cur_limit = max(1, cur_limit // 2)
+                            continue
+                        page = self._skip(offset, exc, on_skip)
+                    else:
+                        cur_limit = max(min(5, cur_limit), cur_limit // 2)
+                        if errors >= 4:
+                            raise
+
+            if page.features:
+                if max_items is not None and len(page.features) > max_items - yielded:
+                    page = replace(page, features=page.features[: max_items - yielded], body=None)
+                yield page
+                yielded += len(page.features)
+                offset += len(page.features)
+                cursor = self._follow(link, offset) if not page.salvaged else None
+                if cursor is not None:
+                    cursor_seen = True
+                elif cursor_seen and link is None and not page.salvaged:
+                    return  # the server stopped handing out next links: this was the last page
+            elif page.offset == offset:
+                return
+            else:
+                cursor = None
+                offset = page.offset
+
+    def iter_pages_prefetch(
+        self,
+        collection_id: str,
+        *,
+        limit: int = 50,
+        window: int = 4,
+        max_items: int | None = None,
+        bbox: str | None = None,
+        datetime: str | None = None,
+        projection: Projection | None = None,
+        start_offset: int = 0,
+        skip_failed: bool = False,
+        on_skip: Callable[[int, Exception], None] | None = None,
+        page_size: PageSizeController | None = None,
+    ) -> Iterator[OgcPage]:
+        """
+        Like `iter_pages`, but keeps up to `window` page ranges in flight.
+
+        The first page's `numberMatched` bounds the following ranges (each sized by the shared
+        controller's current page size when it is scheduled), which are fetched concurrently (each with the full salvage logic of `iter_pages`, sharing
+        one `page_size` controller) and yielded strictly in offset order; the bounded deque of
+        futures is the reorder buffer. Ranges are addressed by offset, so next links only help
+        within a range. Without `numberMatched` (or past it, if the collection grew) paging
+        continues sequentially.
+        """
+        if page_size is None:
+            page_size = PageSizeController(limit=limit, max_limit=limit)
+        offset = int(start_offset)
+        end = None if max_items is None else offset + max_items
+
+        def fetch(range_start: int, size: int) -> list[OgcPage]:
+            range_end = range_start + size if end is None else min(range_start + size, end)
+            return list(
+                self.iter_pages(
+                    collection_id,
+                    bbox=bbox,
+                    datetime=datetime,
+                    projection=projection,
+                    start_offset=range_start,
+                    end_offset=range_end,
+                    skip_failed=skip_failed,
+                    on_skip=on_skip,
+                    page_size=page_size,
+                )
+            )
+
+        size = page_size.limit
+        first = fetch(offset, size)
+        yield from first
+        if not first:
+            return
+        matched = first[0].number_matched
+        offset += size
+        stop = offset if not isinstance(matched, int) else matched if end is None else min(matched, end)
+
+        ex = ThreadPoolExecutor(max_workers=max(1, window), thread_name_prefix="rag-for-ra-prefetch")
+        inflight: deque[Future[list[OgcPage]]] = deque()
+        next_start = offset
+        try:
+            while True:
+                while len(inflight) < max(1, window) and next_start < stop:
+                    size = page_size.limit
+                    inflight.append(ex.submit(fetch, next_start, size))
+                    next_start += size
+                if not inflight:
+                    break
+                yield from inflight.popleft().result()
+        finally:
+            for fut in inflight:
+                fut.cancel()
+            ex.shutdown(wait=False)
+
+        if end is None or next_start < end:
+            # The collection may have grown since `numberMatched` was reported.
+            yield from self.iter_pages(
+                collection_id,
+                max_items=None if end is None else end - next_start,
+                bbox=bbox,
+                datetime=datetime,
+                projection=projection,
+                start_offset=next_start,
+                skip_failed=skip_failed,
+                on_skip=on_skip,
+                page_size=page_size,
+            )
+
+    @staticmethod
+    def _follow(link: str | None, offset: int) -> str | None:
+        """`link` if it continues at `offset` (offset-style links are checked; opaque cursors trusted)."""
+        if link is None:
+            return None
+        linked = dict(parse_qsl(urlsplit(link).query)).get("offset")
+        if linked is not None and linked != str(offset):
+            return None
+        return link
+
+    @staticmethod
+    def _skip(offset: int, exc: Exception, on_skip: Callable[[int, Exception], None] | None) -> OgcPage:
+        if on_skip is not None:
+            on_skip(offset, exc)
+        # An empty page positioned after the bad offset: the caller just moves on.
+        return OgcPage(offset + 1, [])
+
+    def iter_items(
+        self,
+        collection_id: str,
+        *,
+        limit: int = 50,
+        max_items: int | None = None,
+        bbox: str | None = None,
+        datetime: str | None = None,
+        projection: Projection | None = None,
+        start_offset: int = 0,
+        prefetch: int = 0,
+        page_size: PageSizeController | None = None,
+        strategies: Counter[str] | None = None,
+        skip_failed: bool = False,
+        on_skip: Callable[[int, Exception], None] | None = None,
+    ) -> Iterable[dict[str, Any]]:
+        """
+        Iterates GeoJSON features for a collection using OGC paging via `offset`.
+
+        Note: Some api.ra.no responses become invalid/truncated when `limit` is too large
+        (even with HTTP 200). We therefore default to a conservative page size; see
+        `iter_pages` for how truncated pages are salvaged. `prefetch` > 1 keeps that many
+        pages in flight (see `iter_pages_prefetch`). Pass `page_size` to let the page size adapt
+        beyond `limit` (e.g. `PageSizeController.load(...)`, remembered across runs), and a
+        `strategies` counter to learn how pages were fetched (see `paging_summary`). A `projection`
+        (see `OgcSource.projection`) makes pages smaller, which also means fewer truncations.
+        `skip_failed` / `on_skip` skip offsets that keep failing, as in `iter_pages`.
+        """
+        yielded = 0
+        pages = self.iter_item_pages(
+            collection_id,
+            limit=limit,
+            max_items=max_items,
+            bbox=bbox,
+            datetime=datetime,
+            projection=projection,
+            start_offset=start_offset,
+            prefetch=prefetch,
+            page_size=page_size,
+            strategies=strategies,
+            skip_failed=skip_failed,
+            on_skip=on_skip,
+        )
+        for page in pages:
+            for feat in page.features:
                 yield feat
                 yielded += 1
                 if max_items is not None and yielded >= max_items:
                     return
 
-            if not feats:
-                return
-            params["offset"] = int(params.get("offset", 0)) + len(feats)
-
-
+    def iter_item_pages(
+        self,
+        collection_id: str,
+        *,
+        limit: int = 50,
+        max_items: int | None = None,
+        bbox: str | None = None,
+        datetime: str | None = None,
+        projection: Projection | None = None,
+        start_offset: int = 0,
+        prefetch: int = 0,
+        page_size: PageSizeController | None = None,
+        strategies: Counter[str] | None = None,
+        skip_failed: bool = False,
+        on_skip: Callable[[int, Exception], None] | None = None,
+    ) -> Iterator[OgcPage]:
+        """The pages behind `iter_items` (same arguments), e.g. to pass their raw bodies on."""
+        if prefetch > 1:
+            pages = self.iter_pages_prefetch(
+                collection_id,
+                limit=limit,
+                window=prefetch,
+                max_items=max_items,
+                bbox=bbox,
+                datetime=datetime,
+                projection=projection,
+                start_offset=start_offset,
+                skip_failed=skip_failed,
+                on_skip=on_skip,
+                page_size=page_size,
+            )
+        else:
+            pages = self.iter_pages(
+                collection_id,
+                limit=limit,
+                max_items=max_items,
+                bbox=bbox,
+                datetime=datetime,
+                projection=projection,
+                start_offset=start_offset,
+                skip_failed=skip_failed,
+                on_skip=on_skip,
+                page_size=page_size,
+            )
+        for page in pages:
+            if strategies is not None:
+                strategies[page.via] += 1
+            yield page
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .state import STATE_FILE, update_json, load_json
+
+if TYPE_CHECKING:
+    from .cache import ResponseCache
+
+
+@dataclass(eq=False)
+class PageSizeController:
+    """
+    AIMD page size for OGC paging (thread-safe, so prefetch workers can share one).
+
+    - `on_truncation(size)`: halve the failing request size (multiplicative decrease) and keep it
+      as the slow-start threshold. Concurrent reports for the same size only shrink once.
+    - `on_success(size)`: after `grow_after` consecutive clean pages at the current size, double
+      back up to that threshold (slow start), then grow by `grow_step` (additive increase) up to
+      `max_limit`.
+
+    `load()` / `save()` persist the size reached per collection in the state file, so the next run
+    starts at the collection's sweet spot instead of relearning it.
+    """
+
+    limit: int = 50
+    min_limit: int = 1
+    max_limit: int = 200
+    grow_after: int = 3
+    grow_step: int = 5
+    key: str | None = None
+    _threshold: int = field(default=0, init=False, repr=False)
+    _streak: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.max_limit = max(self.min_limit, int(self.max_limit))
+        self.limit = min(self.max_limit, max(self.min_limit, int(self.limit)))
+        self._threshold = self.max_limit
+
+    def on_success(self, size: int) -> None:
+        with self._lock:
+            if size < self.limit:
+                return  # a smaller request says nothing about the current size
+            self._streak += 1
+            if self._streak < self.grow_after:
+                return
+            self._streak = 0
+            if self.limit < self._threshold:
+                self.limit = min(self._threshold, self.limit * 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + self.grow_step)
+
+    def on_truncation(self, size: int) -> None:
+        with self._lock:
+            self._streak = 0
+            self.limit = min(self.limit, max(self.min_limit, size // 2))
+            self._threshold = self.limit
+
+    @classmethod
+    def load(
+        cls, key: str, *, limit: int = 50, max_limit: int = 200, cache: ResponseCache | None = None
+    ) -> PageSizeController:
+        """
+        A controller for `key`, starting at its remembered page size (else `limit`).
+
+        With a response `cache`, the run starts at `limit` instead: the page size is part of the
+        cached requests, and every cached run then asks for the same pages (same start, same growth
+        after clean pages), so a later run or an `--offline` replay finds them. Offline replays
+        don't save their size either.
+        """
+        if cache is not None:
+            return cls(limit=limit, max_limit=max(max_limit, limit), key=None if cache.offline else key)
+        remembered = (load_json(STATE_FILE).get("page_sizes") or {}).get(key)
+        start = int(remembered) if isinstance(remembered, int) and remembered > 0 else limit
+        return cls(limit=start, max_limit=max(max_limit, limit), key=key)
+
+    def save(self) -> None:
+        if self.key is None:
+            return
+        key, size = self.key, self.limit
+
+        def remember(state: dict) -> None:
+            sizes = state.get("page_sizes")
+            if not isinstance(sizes, dict):
+                sizes = state["page_sizes"] = {}
+            sizes[key] = size
+
+        update_json(STATE_FILE, remember)
+
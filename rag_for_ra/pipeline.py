@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+import orjson
+
+from . import schema
+from .geometry import GeometrySidecar, split_geometry
+from .docstore import DocStore, is_store
+from .io import JsonlWriter, open_jsonl, open_writer
+from .ogc import OgcPage
+
+
+K = TypeVar("K")
+
+
+@dataclass(frozen=True)
+class NormalizeTask:
+    """
+    One batch for the normalization stage: parsed `features`, or raw input the worker parses
+    itself: `lines` (one GeoJSON / Esri JSON feature per line, e.g. from a local bulk file) or
+    `pages` (FeatureCollection response bodies, e.g. `OgcPage.body`).
+    """
+
+    dataset: str
+    collection: str
+    license_name: str | None = None
+    license_url: str | None = None
+    features: list[dict[str, Any]] | None = None
+    lines: bytes | None = None
+    pages: tuple[bytes, ...] | None = None
+    detach_geometry: bool = False
+
+
+@dataclass(frozen=True)
+class NormalizedBatch:
+    rows: bytes  # JSONL, newline-terminated
+    count: int
+    geometries: list[tuple[str, bytes]] = field(default_factory=list)  # (doc_id, sidecar record)
+
+
+def normalize(task: NormalizeTask) -> NormalizedBatch:
+    """Parses (raw lines / pages), normalizes and serializes one batch; runs in the worker processes."""
+    features: Iterable[dict[str, Any]]
+    if task.lines is not None:
+        features = (orjson.loads(line) for line in task.lines.splitlines() if line.strip())
+    elif task.pages is not None:
+        features = (feat for body in task.pages for feat in orjson.loads(body).get("features") or [])
+    else:
+        features = task.features or []
+    to_document = schema.mapper(
+        task.dataset, task.collection, license_name=task.license_name, license_url=task.license_url
+    )
+    rows: list[bytes] = []
+    geometries: list[tuple[str, bytes]] = []
+    for feature in features:
+        doc = to_document(feature)
+        if task.detach_geometry:
+            record = split_geometry(doc)
+            if record is not None:
+                geometries.append((doc.doc_id, record))
+        rows.append(doc.to_json())
+    return NormalizedBatch(rows=b"".join(row + b"\n" for row in rows), count=len(rows), geometries=geometries)
+
+
+def _init_worker(schemas: dict[str, schema.Schema]) -> None:
+    # Spawned workers start from the built-in schemas: replay the parent's (e.g. --schema-file).
+    schema.SCHEMAS.update(schemas)
+
+
+@dataclass(eq=False)
+class NormalizePool:
+    """
+    The CPU side of an ingest: normalization + serialization of feature batches in `processes`
+    worker processes (0 = inline, on the calling thread), results returned in submission order so a
+    single writer can append them. `window` bounds the batches in flight (default 2 per process).
+
+    Workers are spawned (not forked): fetcher threads may hold locks at fork time.
+    """
+
+    processes: int = 0
+    window: int = 0
+    _executor: ProcessPoolExecutor | None = field(default=None, init=False, repr=False)
+
+    def __enter__(self) -> NormalizePool:
+        if self.processes > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(dict(schema.SCHEMAS),),
+            )
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def imap(self, tasks: Iterable[tuple[K, NormalizeTask]]) -> Iterator[tuple[K, NormalizedBatch]]:
+        """(key, batch) per (key, task), in order; keys let callers checkpoint what a batch covered."""
+        if self._executor is None:
+            for key, task in tasks:
+                yield key, normalize(task)
+            return
+        window = self.window or 2 * self.processes
+        inflight: deque[tuple[K, Future[NormalizedBatch]]] = deque()
+        try:
+            for key, task in tasks:
+                inflight.append((key, self._executor.submit(normalize, task)))
+                while len(inflight) >= window:
+                    done_key, fut = inflight.popleft()
+                    yield done_key, fut.result()
+            while inflight:
+                done_key, fut = inflight.popleft()
+                yield done_key, fut.result()
+        finally:
+            for _key, fut in inflight:
+                fut.cancel()
+
+
+def feature_batches(features: Iterable[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    it = iter(features)
+    while batch := list(islice(it, max(1, size))):
+        yield batch
+
+
+def page_batches(
+    pages: Iterable[OgcPage], size: int, *, raw: bool = False
+) -> Iterator[list[dict[str, Any]] | tuple[bytes, ...]]:
+    """
+    Batches of about `size` features from OGC pages. With `raw` (worker processes normalize), whole
+    pages go as their raw bodies, which the workers parse: shipping bytes is much cheaper than
+    pickling the parsed features. Pages without a body (salvaged / trimmed) go as features.
+    """
+    if not raw:
+        yield from feature_batches((feat for page in pages for feat in page.features), size)
+        return
+    bodies: list[bytes] = []
+    count = 0
+    for page in pages:
+        if page.body is None:
+            if bodies:
+                yield tuple(bodies)
+                bodies, count = [], 0
+            if page.features:
+                yield page.features
+            continue
+        bodies.append(page.body)
+        count += len(page.features)
+        if count >= size:
+            yield tuple(bodies)
+            bodies, count = [], 0
+    if bodies:
+        yield tuple(bodies)
+
+
+def line_batches(path: Path, size: int) -> Iterator[bytes]:
+    """Raw chunks of `size` lines from a line-delimited feature file (GeoJSONL / JSONL, optionally .gz/.xz)."""
+    with open_jsonl(path) as f:
+        while chunk := b"".join(islice(f, max(1, size))):
+            yield chunk
+
+
+def write_batch(out: JsonlWriter | DocStore, batch: NormalizedBatch, sidecar: GeometrySidecar | None) -> None:
+    """Appends a normalized batch to an open JSONL writer or document store (and its geometries to the sidecar)."""
+    if sidecar is not None:
+        for doc_id, record in batch.geometries:
+            sidecar.append(doc_id, record)
+    out.write(batch.rows)
+
+
+def write_normalized(
+    out_path: Path,
+    batches: Iterable[list[dict[str, Any]] | bytes | tuple[bytes, ...]],
+    *,
+    task: NormalizeTask,
+    pool: NormalizePool | None = None,
+    truncate: bool = False,
+    progress: Callable[[int], Any] | None = None,
+) -> int:
+    """
+    Normalizes feature batches (lists of features, raw line chunks from `line_batches` or raw page
+    bodies from `page_batches`) as copies of the `task` template and appends them to `out_path` in order; with `task.detach_geometry`
+    geometries go to the file's `GeometrySidecar`. A document store (`.sqlite` / `.db`) upserts them
+    instead, and `truncate` leaves it (and its sidecar) in place. Returns the number of documents written.
+    """
+    def as_task(batch: list[dict[str, Any]] | bytes | tuple[bytes, ...]) -> NormalizeTask:
+        if isinstance(batch, bytes):
+            return replace(task, lines=batch)
+        if isinstance(batch, tuple):
+            return replace(task, pages=batch)
+        return replace(task, features=batch)
+
+    tasks = ((None, as_task(batch)) for batch in batches)
+    written = 0
+    truncate = truncate and not is_store(out_path)
+    sidecar = GeometrySidecar(out_path, truncate=truncate) if task.detach_geometry else nullcontext()
+    # A caller's (entered) pool is shared with its other writers; otherwise normalize inline.
+    stage = nullcontext(pool) if pool is not None else NormalizePool()
+    with open_writer(out_path, truncate=truncate) as f, sidecar as geom, stage as normalizer:
+        for _key, batch in normalizer.imap(tasks):
+            write_batch(f, batch, geom)
+            written += batch.count
+            if progress is not None:
+                progress(batch.count)
+    return written
+
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import argparse
+from itertools import islice
 from pathlib import Path
+from typing import Any, Iterator
 
-from .io import read_jsonl
+import orjson
+
+from .docstore import DocStore
+from .io import TEXT_FIELDS, is_store, iter_jsonl, strip_codec
 from .openai_utils import REPO_ROOT
 
 
@@ -11,43 +16,69 @@ def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(
         description="Convert normalized JSONL docs into a single chunk-friendly text file for OpenAI Vector Store upload."
     )
-    p.add_argument("--docs", required=True, help="Path to normalized documents JSONL.")
+    p.add_argument(
+        "--docs",
+        required=True,
+        help="Path to normalized documents JSONL (.jsonl, .jsonl.gz or .jsonl.xz) or a document store (.sqlite / .db).",
+    )
     p.add_argument(
         "--out",
         default=None,
         help="Output text file. Default: artifacts/openai_pilot/<stem>.txt",
     )
     p.add_argument("--max-docs", type=int, default=0, help="0 = all docs in the input file.")
+    p.add_argument("--dataset", default=None, help="Only documents of this dataset (document store input only).")
+    p.add_argument("--collection", default=None, help="Only documents of this collection (document store input only).")
+    p.add_argument("--kommune", default=None, help="Only documents in this kommune (document store input only).")
     return p.parse_args()
 
 
+def iter_docs(
+    docs_path: Path, *, dataset: str | None = None, collection: str | None = None, kommune: str | None = None
+) -> Iterator[dict[str, Any]]:
+    """The text fields of each document; a store is filtered on its indexed columns, streaming in insertion order."""
+    if not is_store(docs_path):
+        if dataset or collection or kommune:
+            raise SystemExit("--dataset, --collection and --kommune need a document store (.sqlite / .db) as --docs.")
+        yield from iter_jsonl(docs_path, TEXT_FIELDS)
+        return
+    if not docs_path.exists():
+        raise SystemExit(f"No such document store: {docs_path}")
+    with DocStore(docs_path) as store:
+        for row in store.iter_raw(dataset=dataset, collection=collection, kommune=kommune):
+            doc = orjson.loads(row)
+            yield {k: doc[k] for k in TEXT_FIELDS if k in doc}
+
+
 def main() -> None:
     args = parse_args()
     docs_path = Path(args.docs)
-    out_path = Path(args.out) if args.out else REPO_ROOT / "artifacts" / "openai_pilot" / f"{docs_path.stem}.txt"
+    out_path = Path(args.out) if args.out else REPO_ROOT / "artifacts" / "openai_pilot" / f"{strip_codec(docs_path).stem}.txt"
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    docs = read_jsonl(docs_path)
+    docs = iter_docs(docs_path, dataset=args.dataset, collection=args.collection, kommune=args.kommune)
     if args.max_docs and args.max_docs > 0:
-        docs = docs[: args.max_docs]
-
-    blocks: list[str] = []
-    for d in docs:
-        src = d.get("source") or {}
-        blocks.append(
-            "\n".join(
-                [
-                    f"DOC_ID: {d.get('doc_id','')}",
-                    f"TITLE: {d.get('title','')}",
-                    f"TEXT: {d.get('text','')}",
-                    f"SOURCE_URL: {src.get('web_url') or ''}",
-                    f"LICENSE: {src.get('license_name') or ''} {src.get('license_url') or ''}".strip(),
-                ]
-            ).strip()
-        )
-
-    out_path.write_text("\n\n---\n\n".join(blocks), encoding="utf-8")
-    print(f"Wrote {len(docs)} docs to {out_path}")
+        docs = islice(docs, args.max_docs)
+
+    n = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        for d in docs:
+            src = d.get("source") or {}
+            if n:
+                f.write("\n\n---\n\n")
+            f.write(
+                "\n".join(
+                    [
+                        f"DOC_ID: {d.get('doc_id','')}",
+                        f"TITLE: {d.get('title','')}",
+                        f"TEXT: {d.get('text','')}",
+                        f"SOURCE_URL: {src.get('web_url') or ''}",
+                        f"LICENSE: {src.get('license_name') or ''} {src.get('license_url') or ''}".strip(),
+                    ]
+                ).strip()
+            )
+            n += 1
+    print(f"Wrote {n} docs to {out_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+THROTTLE_STATUSES = {429, 503}  # explicit "slow down" from the server
+ERROR_STATUSES = {500, 502, 504}  # only count as overload when they dominate recent responses
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+@dataclass
+class _HostState:
+    rate: float
+    tokens: float
+    updated: float
+    blocked_until: float = 0.0
+    last_decrease: float = 0.0
+    recent: deque = field(default_factory=lambda: deque(maxlen=50))
+
+
+@dataclass(eq=False)
+class RateLimiter:
+    """
+    Per-host token bucket shared by every HttpClient / worker thread (and the async engine).
+
+    The rate adapts AIMD-style: each success adds `increase / rate` (≈ +`increase` req/s per second
+    at full speed), while a 429/503 — or a burst of 500/502/504 above `error_threshold` of recent
+    responses — multiplies it by `decrease` (at most once per `cooldown_s`). `Retry-After` blocks the
+    host for everybody, so throttled workers back off once, together, instead of each on its own;
+    after the block they are let through at the bucket's rate again, not in one burst.
+    """
+
+    initial_rate: float = 8.0  # requests/second per host
+    min_rate: float = 0.2
+    max_rate: float = 50.0
+    burst: float = 8.0
+    increase: float = 0.5
+    decrease: float = 0.5
+    error_threshold: float = 0.2
+    cooldown_s: float = 1.0
+    _hosts: dict[str, _HostState] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def _state(self, url: str, now: float) -> _HostState:
+        host = urlsplit(url).netloc
+        st = self._hosts.get(host)
+        if st is None:
+            st = _HostState(rate=self.initial_rate, tokens=self.burst, updated=now)
+            self._hosts[host] = st
+        return st
+
+    def reserve(self, url: str) -> float:
+        """Takes a token for `url`'s host and returns how long the caller must wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            st = self._state(url, now)
+            # `updated` lies in the future while the host is blocked: nothing refills before then.
+            if now > st.updated:
+                st.tokens = min(self.burst, st.tokens + (now - st.updated) * st.rate)
+                st.updated = now
+            st.tokens -= 1.0
+            # Negative tokens are debt: later callers queue up behind earlier ones.
+            wait = st.updated - now + (-st.tokens / st.rate if st.tokens < 0 else 0.0)
+            return max(wait, st.blocked_until - now)
+
+    def acquire(self, url: str) -> None:
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url: str) -> None:
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def rate(self, url: str) -> float:
+        with self._lock:
+            return self._state(url, time.monotonic()).rate
+
+    def on_response(self, url: str, status: int, retry_after: str | None = None) -> None:
+        """Feeds one observed response status (and its Retry-After header, if any) back into the limiter."""
+        with self._lock:
+            now = time.monotonic()
+            st = self._state(url, now)
+            overloaded = status in THROTTLE_STATUSES
+            st.recent.append(status in THROTTLE_STATUSES or status in ERROR_STATUSES)
+            if status in ERROR_STATUSES and len(st.recent) >= 10:
+                overloaded = sum(st.recent) / len(st.recent) > self.error_threshold
+
+            wait_s = parse_retry_after(retry_after)
+            if wait_s:
+                st.blocked_until = max(st.blocked_until, now + wait_s)
+                # Refill from the end of the block, so queued callers resume one token apart
+                # instead of all at once.
+                st.updated = max(st.updated, st.blocked_until)
+                st.tokens = min(st.tokens, 0.0)
+
+            if overloaded:
+                if now - st.last_decrease >= self.cooldown_s:
+                    st.rate = max(self.min_rate, st.rate * self.decrease)
+                    st.last_decrease = now
+            elif status < 400:
+                st.rate = min(self.max_rate, st.rate + self.increase / st.rate)
+
+
+DEFAULT_LIMITER = RateLimiter()
+
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Callable
+
+from .documents import (
+    LINK_KEYS,
+    TAG_KEYS,
+    TEXT_KEYS,
+    TITLE_KEYS,
+    RagDocument,
+    SourceInfo,
+    _clean_text,
+    fingerprint,
+)
+
+
+@dataclass(frozen=True)
+class Schema:
+    """
+    Which feature fields make up a document, for one dataset/collection (or ArcGIS layer).
+
+    - `title`: first non-empty field wins (else the feature id)
+    - `text`: scalar fields rendered as `key: value` lines (else the title)
+    - `links`: first non-empty field is the document's `web_url`
+    - `tags`: non-empty string fields
+    - `id`: property fields tried after the feature's own `id` (when `feature_id`)
+    - `properties`: the feature member holding the fields ("properties" for GeoJSON, "attributes" for Esri JSON)
+    """
+
+    title: tuple[str, ...] = TITLE_KEYS
+    text: tuple[str, ...] = TEXT_KEYS
+    links: tuple[str, ...] = LINK_KEYS
+    tags: tuple[str, ...] = TAG_KEYS
+    id: tuple[str, ...] = ("id",)
+    feature_id: bool = True
+    properties: str = "properties"
+    provider: str = "Riksantikvaren"
+
+    def read_fields(self) -> tuple[str, ...]:
+        """Every field the schema reads: what a projected fetch has to request."""
+        return tuple(dict.fromkeys(self.id + self.title + self.text + self.links + self.tags))
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], base: Schema) -> Schema:
+        """`base` with the fields given in `data` (lists become tuples); unknown keys are an error."""
+        names = {f.name for f in fields(cls)}
+        unknown = set(data) - names
+        if unknown:
+            raise ValueError(f"Unknown schema field(s): {', '.join(sorted(unknown))}")
+        return replace(base, **{k: tuple(v) if isinstance(v, list) else v for k, v in data.items()})
+
+
+OGC_SCHEMA = Schema()
+
+ARCGIS_SCHEMA = Schema(
+    title=("navn", "tittel", "KULTURMINNE", "LOKALITET"),
+    text=("BESKRIVELSE", "beskrivelse", "INFORMASJON", "informasjon", "KOMMUNE", "kommune", "FYLKE", "fylke"),
+    links=(),
+    tags=(),
+    id=("OBJECTID", "objectid", "id"),
+    feature_id=False,
+    properties="attributes",
+)
+
+# "<dataset>:<collection>", "<dataset>:*" or "*" -> schema; ArcGIS layers use dataset "arcgis"
+# and the layer name as collection. Built-in defaults below, `load_schemas` adds overrides.
+SCHEMAS: dict[str, Schema] = {"*": OGC_SCHEMA, "arcgis:*": ARCGIS_SCHEMA}
+_LOCK = threading.Lock()
+_MAPPERS: dict[tuple[str, str, str | None, str | None], Callable[[dict[str, Any]], RagDocument]] = {}
+
+
+def schema_for(dataset: str, collection: str) -> Schema:
+    for key in (f"{dataset}:{collection}", f"{dataset}:*", "*"):
+        if key in SCHEMAS:
+            return SCHEMAS[key]
+    return OGC_SCHEMA
+
+
+def load_schemas(path: Path) -> dict[str, Schema]:
+    """
+    Adds the schemas of a JSON file to `SCHEMAS`, e.g.
+
+        {"kulturmiljoer:*": {"title": ["navn"], "text": ["beskrivelse", "kommune"]},
+         "arcgis:Sikringssoner": {"text": ["vernetype", "kommune"]}}
+
+    Fields left out keep the built-in default for that kind of source (`arcgis:*` or `*`).
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"Schema file must hold an object of '<dataset>:<collection>' entries: {path}")
+    loaded: dict[str, Schema] = {}
+    for key, spec in data.items():
+        if not isinstance(spec, dict):
+            raise ValueError(f"Schema {key!r} must be an object: {path}")
+        base = ARCGIS_SCHEMA if key.startswith("arcgis:") else OGC_SCHEMA
+        try:
+            loaded[key] = Schema.from_dict(spec, base)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid schema {key!r} in {path}: {e}") from e
+    with _LOCK:
+        SCHEMAS.update(loaded)
+        _MAPPERS.clear()
+    return loaded
+
+
+def add_schema_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--schema-file",
+        default=None,
+        help="JSON file of per-collection field mappings ('<dataset>:<collection>' -> title/text/tags/links/id lists) "
+        "overriding the built-in normalization schemas.",
+    )
+
+
+def schemas_from_args(args: argparse.Namespace) -> None:
+    if args.schema_file:
+        loaded = load_schemas(Path(args.schema_file))
+        print(f"Loaded {len(loaded)} schema(s) from {args.schema_file}: {', '.join(loaded)}")
+
+
+def compile_mapper(
+    schema: Schema,
+    *,
+    dataset: str,
+    collection: str,
+    license_name: str | None = None,
+    license_url: str | None = None,
+) -> Callable[[dict[str, Any]], RagDocument]:
+    """
+    Builds the feature -> RagDocument function for one collection. Field lists and the
+    source description are bound once here, so per feature only the lookups remain.
+    """
+    title_keys, text_keys, link_keys, tag_keys, id_keys = schema.title, schema.text, schema.links, schema.tags, schema.id
+    member, feature_id, provider = schema.properties, schema.feature_id, schema.provider
+    prefix = f"{dataset}:{collection}:"
+    scalar = (str, int, float, bool)
+
+    def to_document(feature: dict[str, Any]) -> RagDocument:
+        props = dict(feature.get(member) or {})
+        feat_id = feature.get("id") if feature_id else None
+        if not feat_id:
+            feat_id = next((props[k] for k in id_keys if props.get(k)), None)
+        feat_id = str(feat_id or "") or f"{prefix}{fingerprint(props)}"
+
+        title = _clean_text(str(next((props[k] for k in title_keys if props.get(k)), None) or feat_id))
+        parts = [f"{k}: {props[k]}" for k in text_keys if isinstance(props.get(k), scalar)]
+        text = _clean_text("\n".join(parts)) if parts else title
+
+        return RagDocument(
+            doc_id=prefix + feat_id,
+            title=title,
+            text=text,
+            source=SourceInfo(
+                provider=provider,
+                dataset=dataset,
+                collection=collection,
+                license_name=license_name,
+                license_url=license_url,
+                web_url=next((props[k] for k in link_keys if props.get(k)), None),
+            ),
+            tags=[v.strip() for v in (props.get(k) for k in tag_keys) if isinstance(v, str) and v.strip()],
+            geojson_geometry=feature.get("geometry"),
+            properties=props,
+        )
+
+    return to_document
+
+
+def mapper(
+    dataset: str,
+    collection: str,
+    *,
+    license_name: str | None = None,
+    license_url: str | None = None,
+) -> Callable[[dict[str, Any]], RagDocument]:
+    """The compiled mapper for a collection (per `schema_for`), cached until `load_schemas`."""
+    key = (dataset, collection, license_name, license_url)
+    fn = _MAPPERS.get(key)
+    if fn is None:
+        fn = compile_mapper(
+            schema_for(dataset, collection),
+            dataset=dataset,
+            collection=collection,
+            license_name=license_name,
+            license_url=license_url,
+        )
+        with _LOCK:
+            fn = _MAPPERS.setdefault(key, fn)
+    return fn
+
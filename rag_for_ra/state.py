@@ -1,8 +1,15 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
+
+
+STATE_FILE = Path(__file__).resolve().parents[1] / ".rag_state.json"
+
+_LOCK = threading.Lock()
 
 
 def load_json(path: Path) -> dict[str, Any]:
@@ -19,3 +26,13 @@ def save_json(path: Path, data: dict[str, Any]) -> None:
     path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
 
 
+def update_json(path: Path, update: Callable[[dict[str, Any]], None]) -> dict[str, Any]:
+    """Read-modify-write of a JSON state file, keeping keys written by other tools."""
+    with _LOCK:
+        data = load_json(path)
+        update(data)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        save_json(tmp, data)
+        os.replace(tmp, path)
+        return data
+
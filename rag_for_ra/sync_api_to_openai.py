@@ -1,21 +1,51 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 import os
 import time
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from dataclasses import dataclass
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
 
-import orjson
 from tqdm import tqdm
 
-from .arcgis import ArcGisMapServer
+from .aio import AsyncArcGisMapServer, AsyncHttpClient, AsyncOgcSource
+from .arcgis import ArcGisMapServer, IdRange, feature_layers, id_ranges
+from .cache import add_cache_args, cache_from_args
+from .delta import (
+    DELTA_FIELDS,
+    detect_field,
+    format_timestamp,
+    jsonl_digests,
+    jsonl_properties,
+    load_mark,
+    newest,
+    parse_timestamp,
+    record_tombstones,
+    save_mark,
+    since,
+    upsert_jsonl,
+    utc_now,
+)
 from .documents import arcgis_feature_to_document, feature_to_document
-from .io import ensure_parent
-from .ogc import OgcSource
+from .geometry import GeometrySidecar, detached_geometry
+from .http import HttpClient, TruncatedResponseError
+from .io import (
+    TEXT_FIELDS,
+    add_compression_args,
+    count_rows,
+    ensure_parent,
+    is_store,
+    iter_jsonl,
+    jsonl_suffix,
+    open_writer,
+)
+from .ogc import OgcSource, Projection, paging_summary
 from .openai_utils import (
     OpenAiConfig,
     REPO_ROOT,
@@ -25,9 +55,15 @@ from .openai_utils import (
     uploads_enabled,
     write_manifest,
 )
+from .paging import PageSizeController
+from .pipeline import NormalizePool, NormalizeTask, feature_batches, page_batches, write_batch, write_normalized
+from .schema import add_schema_args, schema_for, schemas_from_args
+from .state import load_json, update_json
+from .tiling import TileHarvester
 
 
 DEFAULT_MAPSERVER = "https://kart.ra.no/arcgis/rest/services/Distribusjon/Kulturminner20180301/MapServer"
+DEFAULT_MAX_LIMIT = 200
 
 
 @dataclass(frozen=True)
@@ -37,28 +73,13 @@ class Produced:
     docs: int
 
 
-def write_jsonl_stream(path: Path, rows: Iterable[dict[str, Any]]) -> int:
-    ensure_parent(path)
-    n = 0
-    with path.open("ab") as f:
-        for row in rows:
-            f.write(orjson.dumps(row))
-            f.write(b"\n")
-            n += 1
-    return n
-
-
 def prepare_text_from_jsonl(jsonl_path: Path, *, out_path: Path) -> int:
     # Stream conversion to avoid loading large JSONL into memory.
     out_path.parent.mkdir(parents=True, exist_ok=True)
     n = 0
-    with jsonl_path.open("rb") as fin, out_path.open("w", encoding="utf-8") as fout:
+    with out_path.open("w", encoding="utf-8") as fout:
         first = True
-        for line in fin:
-            line = line.strip()
-            if not line:
-                continue
-            d = orjson.loads(line)
+        for d in iter_jsonl(jsonl_path, TEXT_FIELDS):
             src = d.get("source") or {}
             block = "\n".join(
                 [
@@ -115,90 +136,182 @@ def upload_txt_to_vector_store(cfg: OpenAiConfig, *, txt_path: Path, jsonl_path:
     print(f"Uploaded: {txt_path.name} (status={batch.status}, {dur_s:.1f}s)")
 
 
-def ogc_ingest_jsonl(*, dataset: str, collection: str, bbox: str | None, max_items: int, limit: int, out_jsonl: Path) -> int:
-    api_base = f"https://api.ra.no/{dataset}"
-    src = OgcSource(api_base=api_base)
-
-    license_name = None
-    license_url = None
+def ogc_openapi(src: OgcSource) -> dict[str, Any]:
+    """The dataset's OpenAPI document (best-effort: empty on errors)."""
     try:
-        openapi = src.http.get_json(f"{api_base}/api", params={"f": "json"})
-        lic = (openapi.get("info") or {}).get("license") or {}
-        license_name = lic.get("name")
-        license_url = lic.get("url")
+        return src.openapi()
     except Exception:
-        pass
+        return {}
+
+
+def ogc_license(openapi: dict[str, Any]) -> tuple[str | None, str | None]:
+    """(name, url) license from the dataset's OpenAPI document."""
+    lic = (openapi.get("info") or {}).get("license") or {}
+    return lic.get("name"), lic.get("url")
+
+
+def ogc_projection(
+    src: OgcSource,
+    collection: str,
+    *,
+    dataset: str,
+    openapi: dict[str, Any],
+    project: bool,
+    skip_geometry: bool,
+    keep: Iterable[str] = (),
+) -> Projection | None:
+    """
+    Negotiates the projection for one collection: with `project`, only the properties its schema
+    reads (plus `keep`); with `skip_geometry`, no geometry. Unsupported parts are dropped (and reported).
+    """
+    if not (project or skip_geometry):
+        return None
+    projection = src.projection(
+        collection,
+        properties=schema_for(dataset, collection).read_fields() + tuple(keep) if project else None,
+        skip_geometry=skip_geometry,
+        openapi=openapi,
+    )
+    wanted = [f"{len(projection.properties)} properties" if projection.properties else None]
+    wanted.append("no geometry" if projection.skip_geometry else None)
+    unsupported = [
+        name
+        for name, asked, got in (
+            ("properties", project, projection.properties),
+            ("skipGeometry", skip_geometry, projection.skip_geometry),
+        )
+        if asked and not got
+    ]
+    summary = ", ".join(w for w in wanted if w) or "none"
+    if unsupported:
+        summary += f" (not supported by the server: {', '.join(unsupported)})"
+    print(f"Projection {src.api_base}/{collection}: {summary}")
+    return projection if projection.params() else None
+
+
+def ogc_ingest_jsonl(
+    *,
+    dataset: str,
+    collection: str,
+    bbox: str | None,
+    max_items: int,
+    limit: int,
+    out_jsonl: Path,
+    http: HttpClient | None = None,
+    prefetch: int = 0,
+    tiled: bool = False,
+    tile_max_items: int = 5000,
+    tiled_sweep: bool = False,
+    max_limit: int = 0,
+    project: bool = False,
+    skip_geometry: bool = False,
+    keep_properties: Iterable[str] = (),
+    geometry_sidecar: bool = False,
+    pool: NormalizePool | None = None,
+) -> int:
+    api_base = f"https://api.ra.no/{dataset}"
+    src = OgcSource(api_base=api_base, http=http) if http else OgcSource(api_base=api_base)
+
+    openapi = ogc_openapi(src)
+    license_name, license_url = ogc_license(openapi)
+    projection = ogc_projection(
+        src,
+        collection,
+        dataset=dataset,
+        openapi=openapi,
+        project=project,
+        skip_geometry=skip_geometry,
+        keep=keep_properties,
+    )
 
     max_items_opt = None if max_items == 0 else max_items
 
-    # Resume support: if JSONL exists, resume from its current line-count.
+    # Resume support: if JSONL exists, resume from its current line-count
+    # (tiled mode instead skips features whose doc_id is already in the file).
     start_offset = 0
+    seen: set[str] = set()
     if out_jsonl.exists():
-        with out_jsonl.open("rb") as f:
-            start_offset = sum(1 for _ in f)
+        if tiled:
+            seen.update(str(row.get("doc_id", "")) for row in iter_jsonl(out_jsonl, ("doc_id",)))
+        else:
+            start_offset = count_rows(out_jsonl)
 
-    url = f"{api_base}/collections/{collection}/items"
-    offset = start_offset
-    appended = 0
-    yielded_total = 0
     skipped_offsets: list[int] = []
+    skip_reasons: dict[str, str] = {}
 
-    ensure_parent(out_jsonl)
-    with out_jsonl.open("ab") as f:
-        pbar = tqdm(desc=f"ogc {dataset}/{collection}", unit="feat")
-        try:
-            while True:
-                if max_items_opt is not None and yielded_total >= max_items_opt:
-                    break
+    def on_skip(offset: int, exc: Exception, where: str | None = None) -> None:
+        skipped_offsets.append(offset)
+        # Tiled offsets are relative to their tile's bbox query.
+        skip_reasons[str(offset) if where is None else f"{where}@{offset}"] = (
+            "truncated" if isinstance(exc, TruncatedResponseError) else f"{type(exc).__name__}: {exc}"[:300]
+        )
+        if len(skipped_offsets) >= 50:
+            raise RuntimeError(f"Too many skipped offsets ({len(skipped_offsets)}). Last error: {exc}") from exc
 
-                cur_limit = int(limit)
-                if max_items_opt is not None:
-                    cur_limit = min(cur_limit, max_items_opt - yielded_total)
-                cur_limit = max(1, cur_limit)
-
-                while True:
-                    params: dict[str, Any] = {"f": "json", "limit": cur_limit, "offset": offset}
-                    if bbox:
-                        params["bbox"] = bbox
-                    try:
-                        payload = src.http.get_json(url, params=params)
-                        feats = payload.get("features") or []
-                        break
-                    except Exception as exc:
-                        if cur_limit > 1:
-                            cur_limit = max(1, cur_limit // 2)
-                            continue
-                        skipped_offsets.append(offset)
-                        offset += 1
-                        if len(skipped_offsets) >= 50:
-                            raise RuntimeError(
-                                f"Too many skipped offsets ({len(skipped_offsets)}). Last error: {exc}"
-                            ) from exc
-                        feats = []
-                        break
-
-                if not feats:
-                    if cur_limit == int(limit):
-                        break
-                    continue
-
-                for feat in feats:
-                    doc = feature_to_document(
-                        dataset=dataset,
-                        collection=collection,
-                        feature=feat,
-                        license_name=license_name,
-                        license_url=license_url,
-                    )
-                    f.write(orjson.dumps(doc.to_dict()))
-                    f.write(b"\n")
-                    appended += 1
-                    yielded_total += 1
-                    pbar.update(1)
+    # Page size adapts between runs too: start at the size this collection settled on last time
+    # (except with --cache, where runs start at --limit so their pages can be replayed).
+    page_size = PageSizeController.load(
+        f"{api_base}/collections/{collection}", limit=limit, max_limit=max_limit or limit, cache=src.http.cache
+    )
 
-                offset += len(feats)
-        finally:
-            pbar.close()
+    strategies: Counter[str] = Counter()
+
+    pbar = tqdm(desc=f"ogc {dataset}/{collection}", unit="feat")
+    try:
+        batches: Iterable[list[dict[str, Any]] | tuple[bytes, ...]]
+        if tiled:
+            harvester = TileHarvester(source=src, max_per_tile=tile_max_items, workers=max(1, prefetch))
+            feats = harvester.iter_items(
+                collection,
+                bbox=bbox,
+                limit=limit,
+                max_items=max_items_opt,
+                seen=seen,
+                page_size=page_size,
+                strategies=strategies,
+                projection=projection,
+                skip_failed=True,
+                on_skip=lambda tile, offset, exc: on_skip(offset, exc, tile.bbox() if tile else "sweep"),
+                sweep=tiled_sweep,
+                # The doc_id the writer stores (schema id fields, fingerprint for id-less features).
+                key=lambda feat: feature_to_document(dataset=dataset, collection=collection, feature=feat).doc_id,
+                on_untiled=lambda n: print(
+                    f"\n{dataset}/{collection}: {n} features are in no tile (e.g. no geometry)"
+                    + ("; sweeping the whole collection for them." if tiled_sweep else "; use --tiled-sweep to fetch them.")
+                ),
+            )
+            batches = feature_batches(feats, 256)
+        else:
+            # Next links are followed when offered; truncated pages are salvaged and bad offsets
+            # (still failing at page size 1) skipped; see OgcSource.iter_pages. With prefetch,
+            # pages arrive concurrently but in order.
+            pages = src.iter_item_pages(
+                collection,
+                limit=limit,
+                max_items=max_items_opt,
+                bbox=bbox,
+                start_offset=start_offset,
+                prefetch=prefetch,
+                skip_failed=True,
+                on_skip=on_skip,
+                page_size=page_size,
+                strategies=strategies,
+                projection=projection,
+            )
+            # Pages are parsed by the fetcher too (salvage and next links need them), but worker
+            # processes get the raw bodies: cheaper to send than the parsed features.
+            batches = page_batches(pages, 256, raw=pool is not None and pool.processes > 0)
+        appended = write_normalized(
+            out_jsonl,
+            batches,
+            task=NormalizeTask(dataset, collection, license_name, license_url, detach_geometry=geometry_sidecar),
+            pool=pool,
+            progress=pbar.update,
+        )
+    finally:
+        pbar.close()
+        page_size.save()
+    print(f"Paging {dataset}/{collection}: {paging_summary(strategies)}")
 
     if skipped_offsets:
         sidecar = out_jsonl.with_suffix(out_jsonl.suffix + ".skipped.json")
@@ -208,6 +321,7 @@ def ogc_ingest_jsonl(*, dataset: str, collection: str, bbox: str | None, max_ite
                     "dataset": dataset,
                     "collection": collection,
                     "skipped_offsets": skipped_offsets,
+                    "reasons": skip_reasons,
                     "note": "Offsets that consistently returned upstream errors (e.g., HTTP 500) during sync.",
                 },
                 indent=2,
@@ -219,30 +333,459 @@ def ogc_ingest_jsonl(*, dataset: str, collection: str, bbox: str | None, max_ite
     return appended
 
 
-def arcgis_ingest_jsonl(*, mapserver: str, layer_id: int, bbox: str | None, max_items: int, out_jsonl: Path) -> int:
-    ms = ArcGisMapServer(mapserver_base=mapserver)
+def ogc_delta_jsonl(
+    *,
+    dataset: str,
+    collection: str,
+    bbox: str | None,
+    limit: int,
+    out_jsonl: Path,
+    http: HttpClient | None = None,
+    prefetch: int = 0,
+    tiled: bool = False,
+    tile_max_items: int = 5000,
+    tiled_sweep: bool = False,
+    max_limit: int = 0,
+    delta_field: str | None = None,
+    project: bool = False,
+    skip_geometry: bool = False,
+    geometry_sidecar: bool = False,
+) -> int:
+    """
+    Incremental sync of one OGC collection into its JSONL cache; returns the number of changed documents.
+
+    The first run harvests the collection in full (`ogc_ingest_jsonl`) and records a high-water mark
+    in `<jsonl>.delta.json`: the newest value of a last-modified property (`delta_field`, else the
+    first of `DELTA_FIELDS` found), or the sync time. Later runs then either
+      - "datetime": fetch only features with `datetime=<mark - OVERLAP>/..`, when the collection
+        advertises a temporal extent, and sweep ids only if the upstream count shows removals; or
+      - "scan": page through everything but rewrite only documents whose serialized row changed.
+    Changed rows are upserted in place and removed doc_ids appended to `<jsonl>.tombstones.jsonl`.
+    """
+    api_base = f"https://api.ra.no/{dataset}"
+    src = OgcSource(api_base=api_base, http=http) if http else OgcSource(api_base=api_base)
+    state = load_mark(out_jsonl)
+    started = utc_now()
+
+    if not out_jsonl.exists() or not state.get("mode"):
+        appended = ogc_ingest_jsonl(
+            dataset=dataset,
+            collection=collection,
+            bbox=bbox,
+            max_items=0,
+            limit=limit,
+            out_jsonl=out_jsonl,
+            http=src.http,
+            prefetch=prefetch,
+            tiled=tiled,
+            tile_max_items=tile_max_items,
+            tiled_sweep=tiled_sweep,
+            max_limit=max_limit,
+            project=project,
+            skip_geometry=skip_geometry,
+            keep_properties=(delta_field,) if delta_field else DELTA_FIELDS,
+            geometry_sidecar=geometry_sidecar,
+        )
+        field = delta_field or detect_field(jsonl_properties(out_jsonl))
+        latest = newest(jsonl_properties(out_jsonl), field) if field else None
+        save_mark(
+            out_jsonl,
+            mode="datetime" if src.supports_datetime(collection) else "scan",
+            field=field,
+            mark=format_timestamp(latest) if latest else started,
+            synced_at=started,
+            docs=len(jsonl_digests(out_jsonl)),
+        )
+        return appended
+
+    field = delta_field or state.get("field")
+    openapi = ogc_openapi(src)
+    license_name, license_url = ogc_license(openapi)
+    projection = ogc_projection(
+        src,
+        collection,
+        dataset=dataset,
+        openapi=openapi,
+        project=project,
+        skip_geometry=skip_geometry,
+        keep=(field,) if field else (),
+    )
+    latest = parse_timestamp(state.get("mark"))
+    page_size = PageSizeController.load(
+        f"{api_base}/collections/{collection}", limit=limit, max_limit=max_limit or limit, cache=src.http.cache
+    )
+    skipped: list[int] = []
+    strategies: Counter[str] = Counter()
+
+    def features(datetime: str | None = None) -> Iterable[dict[str, Any]]:
+        pages = src.iter_item_pages(
+            collection,
+            limit=limit,
+            bbox=bbox,
+            datetime=datetime,
+            projection=projection,
+            prefetch=prefetch,
+            page_size=page_size,
+            strategies=strategies,
+            skip_failed=True,
+            on_skip=lambda off, _exc: skipped.append(off),
+        )
+        return (feat for page in pages for feat in page.features)
+
+    cached = jsonl_digests(out_jsonl)
+    changed: dict[str, bytes] = {}
+    upstream_ids: set[str] | None = set() if state["mode"] == "scan" else None
+    with detached_geometry(out_jsonl, geometry_sidecar) as detach:
+        pbar = tqdm(desc=f"delta {dataset}/{collection}", unit="feat")
+        try:
+            lower = since(state.get("mark"))
+            for feat in features(f"{lower}/.." if state["mode"] == "datetime" and lower else None):
+                doc = feature_to_document(
+                    dataset=dataset,
+                    collection=collection,
+                    feature=feat,
+                    license_name=license_name,
+                    license_url=license_url,
+                )
+                if cached.get(doc.doc_id) != doc.content_hash:
+                    changed[doc.doc_id] = detach(doc).to_json()
+                if upstream_ids is not None:
+                    upstream_ids.add(doc.doc_id)
+                if field:
+                    when = parse_timestamp(doc.properties.get(field))
+                    if when is not None and (latest is None or when > latest):
+                        latest = when
+                pbar.update(1)
+
+            if upstream_ids is None:
+                # A datetime filter cannot see deletions: only sweep ids when the upstream count dropped.
+                live = len(cached.keys() | changed.keys())
+                upstream = src.count(collection, bbox=bbox)
+                if upstream is not None and upstream < live:
+                    upstream_ids = set()
+                    for feat in features():
+                        # The writer's own doc_id (schema id fields, fingerprint for id-less features).
+                        upstream_ids.add(feature_to_document(dataset=dataset, collection=collection, feature=feat).doc_id)
+                        pbar.update(1)
+        finally:
+            pbar.close()
+            page_size.save()
+
+    removed: set[str] = set()
+    if upstream_ids is not None:
+        if skipped:
+            # Skipped offsets hide features that still exist upstream: don't mistake them for removals.
+            print(f"Delta {dataset}/{collection}: {len(skipped)} offsets skipped; removal check deferred.")
+        else:
+            removed = cached.keys() - upstream_ids
+    updated, added, dropped = upsert_jsonl(out_jsonl, changed, removed)
+    if removed:
+        record_tombstones(out_jsonl, sorted(removed))
+    save_mark(
+        out_jsonl,
+        field=field,
+        mark=format_timestamp(latest) if field and latest else started,
+        synced_at=started,
+        docs=len(cached) + added - dropped,
+    )
+    print(f"Delta {dataset}/{collection}: updated={updated} added={added} removed={dropped}")
+    print(f"Paging {dataset}/{collection}: {paging_summary(strategies)}")
+    return updated + added + dropped
+
+
+def arcgis_ingest_jsonl(
+    *,
+    mapserver: str,
+    layer_id: int,
+    bbox: str | None,
+    max_items: int,
+    out_jsonl: Path,
+    http: HttpClient | None = None,
+    by_ids: bool = False,
+    range_size: int = 1000,
+    workers: int = 4,
+    query_format: str = "json",
+    max_allowable_offset: float | None = None,
+    geometry_precision: int | None = None,
+    geometry_sidecar: bool = False,
+    pool: NormalizePool | None = None,
+) -> int:
+    options: dict[str, Any] = {
+        "query_format": query_format,
+        "max_allowable_offset": max_allowable_offset,
+        "geometry_precision": geometry_precision,
+    }
+    if http:
+        options["http"] = http
+    ms = ArcGisMapServer(mapserver_base=mapserver, **options)
     layer_info = ms.layer_info(layer_id)
     layer_name = layer_info.get("name") or f"layer_{layer_id}"
+    ms = ms.for_layer(layer_info)
+    if ms.query_format != query_format:
+        print(f"ArcGIS layer {layer_id} does not support f={query_format}; using f={ms.query_format}.")
 
     license_name = "NLOD"
     license_url = "https://data.norge.no/nlod"
     max_items_opt = None if max_items == 0 else max_items
 
-    def row_iter():
-        for feat in tqdm(
-            ms.iter_layer_features(layer_id, bbox_wgs84=bbox, max_items=max_items_opt),
-            desc=f"arcgis {layer_id} ({layer_name})",
-        ):
-            doc = arcgis_feature_to_document(
-                dataset="arcgis",
-                layer_name=layer_name,
-                feature=feat,
-                license_name=license_name,
-                license_url=license_url,
-            )
-            yield doc.to_dict()
+    if by_ids:
+        return arcgis_ranges_jsonl(
+            ms,
+            layer_id=layer_id,
+            layer_name=layer_name,
+            bbox=bbox,
+            max_items=max_items_opt,
+            out_jsonl=out_jsonl,
+            range_size=range_size,
+            workers=workers,
+            license_name=license_name,
+            license_url=license_url,
+            geometry_sidecar=geometry_sidecar,
+            pool=pool,
+        )
+
+    feats = ms.iter_layer_features(layer_id, bbox_wgs84=bbox, max_items=max_items_opt)
+    with tqdm(desc=f"arcgis {layer_id} ({layer_name})", unit="feat") as pbar:
+        return write_normalized(
+            out_jsonl,
+            feature_batches(feats, 256),
+            task=NormalizeTask("arcgis", layer_name, license_name, license_url, detach_geometry=geometry_sidecar),
+            pool=pool,
+            progress=pbar.update,
+        )
+
+
+def arcgis_layer_plan(
+    *,
+    mapserver: str,
+    bbox: str | None,
+    http: HttpClient | None = None,
+    workers: int = 4,
+) -> list[tuple[int, str, int | None]]:
+    """
+    (layer id, name, feature count) for every feature layer of a MapServer, biggest first, so a
+    worker pool starts the long layers early. Layers whose count fails are kept (count None, last).
+    """
+    ms = ArcGisMapServer(mapserver_base=mapserver, http=http) if http else ArcGisMapServer(mapserver_base=mapserver)
+    layers = feature_layers(ms.service_info())
+
+    def count(layer: dict[str, Any]) -> int | None:
+        try:
+            return ms.count(int(layer["id"]), bbox_wgs84=bbox)
+        except Exception as e:  # noqa: BLE001 - still harvested, just not ranked
+            print(f"Could not count ArcGIS layer {layer.get('id')} ({layer.get('name')}): {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        counts = list(ex.map(count, layers))
+    plan = [(int(layer["id"]), str(layer.get("name") or ""), n) for layer, n in zip(layers, counts)]
+    return sorted(plan, key=lambda entry: (entry[2] is None, -(entry[2] or 0), entry[0]))
+
+
+def arcgis_ranges_jsonl(
+    ms: ArcGisMapServer,
+    *,
+    layer_id: int,
+    layer_name: str,
+    bbox: str | None,
+    max_items: int | None,
+    out_jsonl: Path,
+    range_size: int,
+    workers: int,
+    license_name: str | None,
+    license_url: str | None,
+    geometry_sidecar: bool = False,
+    pool: NormalizePool | None = None,
+) -> int:
+    """
+    Appends a layer to `out_jsonl` by ObjectID ranges (fetched concurrently, normalized in `pool`
+    when given, written in order).
+
+    `<jsonl>.ranges.json` checkpoints the range plan, the completed ranges and the file size after
+    the last completed range: a restart truncates rows of an interrupted range and fetches only the
+    ranges still missing (plus ranges for ObjectIDs added upstream since the plan was made). A
+    document store needs no truncation: the interrupted range's rows are upserted again.
+    """
+    sidecar = out_jsonl.with_suffix(out_jsonl.suffix + ".ranges.json")
+    state = load_json(sidecar)
+    if state.get("layer_id") != layer_id or state.get("range_size") != range_size:
+        state = {}
+    oid_field, ids = ms.object_ids(layer_id, bbox_wgs84=bbox)
+    ranges = [IdRange(lo, hi) for lo, hi in state.get("ranges") or []]
+    covered = ranges[-1].hi if ranges else None
+    ranges += id_ranges((i for i in ids if covered is None or i > covered), range_size)
+    done = {(lo, hi) for lo, hi in state.get("done") or []}
+
+    ensure_parent(out_jsonl)
+    stale = out_jsonl.exists() and isinstance(state.get("bytes"), int) and out_jsonl.stat().st_size > state["bytes"]
+    if stale and not is_store(out_jsonl):
+        # Rows of a range that was cut short: it is fetched again in full.
+        with out_jsonl.open("r+b") as f:
+            f.truncate(state["bytes"])
+
+    def checkpoint(size: int) -> None:
+        update_json(
+            sidecar,
+            lambda st: st.update(
+                layer_id=layer_id,
+                range_size=range_size,
+                oid_field=oid_field,
+                ranges=[[r.lo, r.hi] for r in ranges],
+                done=sorted(done),
+                bytes=size,
+            ),
+        )
+
+    todo = [r for r in ranges if (r.lo, r.hi) not in done]
+    template = NormalizeTask("arcgis", layer_name, license_name, license_url, detach_geometry=geometry_sidecar)
+
+    def tasks() -> Iterator[tuple[tuple[IdRange, bool], NormalizeTask]]:
+        submitted = 0
+        for rng, feats in ms.iter_ranges(layer_id, todo, oid_field=oid_field, bbox_wgs84=bbox, workers=workers):
+            batch = feats if max_items is None else feats[: max_items - submitted]
+            submitted += len(batch)
+            # A range cut short by --max-items is written but stays pending.
+            yield (rng, len(batch) == len(feats)), replace(template, features=batch)
+            if max_items is not None and submitted >= max_items:
+                return
+
+    appended = 0
+    geometries = GeometrySidecar(out_jsonl) if geometry_sidecar else nullcontext()
+    stage = nullcontext(pool) if pool is not None else NormalizePool()
+    with open_writer(out_jsonl) as f, geometries as geom, stage as normalizer:
+        checkpoint(f.tell())
+        pbar = tqdm(desc=f"arcgis {layer_id} ({layer_name}) {len(todo)}/{len(ranges)} ranges", unit="feat")
+        try:
+            for (rng, complete), batch in normalizer.imap(tasks()):
+                write_batch(f, batch, geom)
+                appended += batch.count
+                pbar.update(batch.count)
+                if not complete:
+                    break
+                done.add((rng.lo, rng.hi))
+                checkpoint(f.tell())
+        finally:
+            pbar.close()
+    return appended
+
+
+async def ogc_ingest_jsonl_async(
+    *,
+    http: AsyncHttpClient,
+    dataset: str,
+    collection: str,
+    bbox: str | None,
+    max_items: int,
+    limit: int,
+    out_jsonl: Path,
+    window: int = 8,
+    geometry_sidecar: bool = False,
+) -> int:
+    """
+    Async-engine variant of `ogc_ingest_jsonl` (same resume-by-line-count behaviour), keeping up to
+    `window` pages of the collection in flight. Pages are normalized and written on a worker thread,
+    so file I/O never blocks the event loop.
+    """
+    api_base = f"https://api.ra.no/{dataset}"
+    src = AsyncOgcSource(api_base=api_base, http=http)
+
+    license_name = None
+    license_url = None
+    try:
+        openapi = await http.get_json(f"{api_base}/api", params={"f": "json"})
+        lic = (openapi.get("info") or {}).get("license") or {}
+        license_name = lic.get("name")
+        license_url = lic.get("url")
+    except Exception:
+        pass
+
+    max_items_opt = None if max_items == 0 else max_items
+
+    start_offset = 0
+    if out_jsonl.exists():
+        start_offset = await asyncio.to_thread(count_rows, out_jsonl)
+
+    appended = 0
+    with open_writer(out_jsonl) as f, detached_geometry(out_jsonl, geometry_sidecar) as detach:
+
+        def write_page(feats: list[dict[str, Any]]) -> None:
+            for feat in feats:
+                doc = feature_to_document(
+                    dataset=dataset,
+                    collection=collection,
+                    feature=feat,
+                    license_name=license_name,
+                    license_url=license_url,
+                )
+                f.write(detach(doc).to_json() + b"\n")
+
+        pbar = tqdm(desc=f"ogc {dataset}/{collection}", unit="feat")
+        try:
+            async for page in src.iter_pages(
+                collection, limit=limit, window=window, max_items=max_items_opt, bbox=bbox, start_offset=start_offset
+            ):
+                await asyncio.to_thread(write_page, page)
+                appended += len(page)
+                pbar.update(len(page))
+        finally:
+            pbar.close()
+    return appended
+
+
+async def arcgis_ingest_jsonl_async(
+    *,
+    http: AsyncHttpClient,
+    mapserver: str,
+    layer_id: int,
+    bbox: str | None,
+    max_items: int,
+    out_jsonl: Path,
+    max_allowable_offset: float | None = None,
+    geometry_precision: int | None = None,
+    geometry_sidecar: bool = False,
+) -> int:
+    """Async-engine variant of `arcgis_ingest_jsonl` (`f=json` only); pages are written on a worker thread."""
+    ms = AsyncArcGisMapServer(
+        mapserver_base=mapserver,
+        http=http,
+        max_allowable_offset=max_allowable_offset,
+        geometry_precision=geometry_precision,
+    )
+    layer_info = await ms.layer_info(layer_id)
+    layer_name = layer_info.get("name") or f"layer_{layer_id}"
+
+    license_name = "NLOD"
+    license_url = "https://data.norge.no/nlod"
+    max_items_opt = None if max_items == 0 else max_items
+
+    appended = 0
+    with open_writer(out_jsonl) as f, detached_geometry(out_jsonl, geometry_sidecar) as detach:
+
+        def write_page(feats: list[dict[str, Any]]) -> None:
+            for feat in feats:
+                doc = arcgis_feature_to_document(
+                    dataset="arcgis",
+                    layer_name=layer_name,
+                    feature=feat,
+                    license_name=license_name,
+                    license_url=license_url,
+                )
+                f.write(detach(doc).to_json() + b"\n")
+
+        pbar = tqdm(desc=f"arcgis {layer_id} ({layer_name})", unit="feat")
+        try:
+            async for page in ms.iter_layer_pages(layer_id, bbox_wgs84=bbox, max_items=max_items_opt):
+                await asyncio.to_thread(write_page, page)
+                appended += len(page)
+                pbar.update(len(page))
+        finally:
+            pbar.close()
+    return appended
 
-    return write_jsonl_stream(out_jsonl, row_iter())
+
+def spec_matches(specs: list[str], dataset: str, collection: str) -> bool:
+    """Whether an OGC collection is selected by `<dataset>:<collection>`, `<dataset>:*` or `*` specs."""
+    return any(spec in ("*", f"{dataset}:*", f"{dataset}:{collection}") for spec in specs)
 
 
 def parse_args() -> argparse.Namespace:
@@ -252,8 +795,88 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--manifest", default=None, help="Manifest path. Default: artifacts/openai_pilot/upload_manifest.json")
     p.add_argument("--bbox", default=None, help="Optional bbox (minLon,minLat,maxLon,maxLat) applied where supported.")
     p.add_argument("--max-items", type=int, default=0, help="0 = unlimited. Otherwise max items per collection/layer.")
-    p.add_argument("--limit", type=int, default=50, help="OGC page size (keep small).")
+    p.add_argument("--limit", type=int, default=50, help="OGC page size to start from (keep small).")
+    p.add_argument(
+        "--max-limit",
+        type=int,
+        default=None,
+        help=f"Upper bound for the adaptive OGC page size (grows after clean pages, halves on truncation; "
+        f"the size reached is remembered per collection in .rag_state.json). Default {DEFAULT_MAX_LIMIT}; set to "
+        "--limit to disable growth.",
+    )
+    p.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        help="OGC pages kept in flight per collection (uses numberMatched; output stays in order). 0 = sequential "
+        "(with --engine async: --per-host pages).",
+    )
+    p.add_argument(
+        "--tiled",
+        action="store_true",
+        help="Harvest OGC collections as a quadtree of bbox tiles (within --bbox, default all of Norway) "
+        "instead of one deep offset scan. --prefetch sets the number of tiles fetched in parallel.",
+    )
+    p.add_argument("--tile-max-items", type=int, default=5000, help="Split tiles until each matches at most this many features.")
+    p.add_argument(
+        "--tiled-sweep",
+        action="store_true",
+        help="After a --tiled harvest without --bbox, page through the whole collection once more if the tiles "
+        "returned fewer features than it has (features without geometry are in no tile).",
+    )
+    p.add_argument(
+        "--project",
+        action="append",
+        default=[],
+        help="Fetch only the properties the normalizer uses for these OGC collections "
+        "(<dataset>:<collection>, <dataset>:* or *; repeatable), where the server supports `properties=`.",
+    )
+    p.add_argument(
+        "--skip-geometry",
+        action="append",
+        default=[],
+        help="Fetch these OGC collections without geometry (same specs as --project), where the server "
+        "supports `skipGeometry=`. Documents then have no geojson_geometry.",
+    )
+    p.add_argument(
+        "--delta",
+        action="store_true",
+        help="Incremental OGC sync: fetch only features changed since the last run (high-water mark in "
+        "<jsonl>.delta.json), upsert them into the JSONL cache and log removals to <jsonl>.tombstones.jsonl. "
+        "The first run per collection is a full harvest.",
+    )
+    p.add_argument(
+        "--delta-field",
+        default=None,
+        help="Last-modified feature property used as high-water mark. Default: auto-detect (e.g. sistEndret).",
+    )
+    p.add_argument(
+        "--geometry-sidecar",
+        action="store_true",
+        help="Keep geometries in a binary sidecar per cache (<jsonl>.geom, indexed in <jsonl>.geom.idx) and only "
+        "centroid and bbox in the JSONL rows.",
+    )
     p.add_argument("--jobs", type=int, default=1, help="Parallel jobs for ingestion/prep across targets. Recommended: 2.")
+    p.add_argument(
+        "--normalize-procs",
+        type=int,
+        default=0,
+        help="Worker processes that normalize and serialize fetched features (shared by all --jobs), so parsing "
+        "keeps up with cached or fast upstreams. 0 = normalize on the fetching thread.",
+    )
+    p.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="threads = one blocking pager per --jobs worker. async = all targets page concurrently on one event loop.",
+    )
+    p.add_argument(
+        "--per-host",
+        type=int,
+        default=32,
+        help="Async engine: max concurrent requests per host (api.ra.no / kart.ra.no), and the default number of "
+        "pages each OGC collection keeps in flight.",
+    )
     p.add_argument(
         "--ogc",
         action="append",
@@ -273,12 +896,82 @@ def parse_args() -> argparse.Namespace:
         default=[],
         help="ArcGIS layer id to ingest+upload (repeatable). Example: --arcgis-layer 1",
     )
+    p.add_argument(
+        "--arcgis-all",
+        action="store_true",
+        help="Harvest every feature layer of --arcgis-mapserver (from its service info), biggest first across --jobs "
+        "workers. Implies --arcgis-by-ids; a failed layer is reported and resumes from its checkpoint on the next run.",
+    )
+    p.add_argument(
+        "--arcgis-by-ids",
+        action="store_true",
+        help="Harvest ArcGIS layers by ObjectID ranges (returnIdsOnly + `OBJECTID BETWEEN`) fetched concurrently, "
+        "instead of resultOffset paging. Restartable per range (<jsonl>.ranges.json).",
+    )
+    p.add_argument("--arcgis-range-size", type=int, default=1000, help="ObjectIDs per range (keep <= the layer's maxRecordCount).")
+    p.add_argument("--arcgis-workers", type=int, default=4, help="ObjectID ranges fetched in parallel per layer.")
+    p.add_argument(
+        "--arcgis-format",
+        choices=["json", "pbf"],
+        default="json",
+        help="ArcGIS query response format. pbf (protobuf) is several times smaller; layers without it fall back to json.",
+    )
+    p.add_argument(
+        "--arcgis-max-offset",
+        type=float,
+        default=None,
+        help="maxAllowableOffset: generalize ArcGIS geometries server-side to this tolerance (degrees, e.g. 0.0001).",
+    )
+    p.add_argument(
+        "--arcgis-precision",
+        type=int,
+        default=None,
+        help="geometryPrecision: decimals kept in ArcGIS coordinates (e.g. 6).",
+    )
     p.add_argument("--no-upload", action="store_true", help="Only ingest + prepare txt files; do not upload.")
+    p.add_argument(
+        "--hedge-quantile",
+        type=float,
+        default=0.0,
+        help="Hedge slow requests: resend once a request exceeds this latency quantile of its host (e.g. 0.95). 0 = off.",
+    )
+    add_cache_args(p)
+    add_schema_args(p)
+    add_compression_args(p)
+    p.add_argument(
+        "--sqlite",
+        action="store_true",
+        help="Keep each target's documents in a SQLite store (<name>.sqlite, keyed by doc_id) instead of a JSONL "
+        "cache: re-ingests upsert documents in place.",
+    )
     return p.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    schemas_from_args(args)
+    if args.engine == "async":
+        # Threads-engine features the async pagers don't implement: refuse them rather than ignore them.
+        unsupported = [
+            flag
+            for flag, used in (
+                ("--delta", args.delta),
+                ("--tiled", args.tiled or args.tiled_sweep),
+                ("--max-limit", args.max_limit is not None),
+                ("--project", args.project),
+                ("--skip-geometry", args.skip_geometry),
+                ("--hedge-quantile", args.hedge_quantile > 0),
+                ("--arcgis-by-ids", args.arcgis_by_ids),
+                ("--arcgis-all", args.arcgis_all),
+                ("--arcgis-format pbf", args.arcgis_format != "json"),
+                ("--normalize-procs", args.normalize_procs),
+            )
+            if used
+        ]
+        if unsupported:
+            raise SystemExit(f"{', '.join(unsupported)}: only supported with --engine threads.")
+    if args.sqlite and args.compress != "none":
+        raise SystemExit("--sqlite and --compress are mutually exclusive.")
 
     vs_id = load_vs_id(args.vector_store_id)
     out_dir = Path(args.out_dir) if args.out_dir else REPO_ROOT / "artifacts" / "sync"
@@ -288,6 +981,14 @@ def main() -> None:
     cfg = OpenAiConfig(vector_store_id=vs_id, out_dir=out_dir, manifest_path=manifest_path)
     manifest = load_manifest(manifest_path, vs_id)
 
+    # One client (per-thread pooled sessions) shared by every target and worker thread.
+    jobs = max(1, int(args.jobs))
+    cache = cache_from_args(args)
+    http = HttpClient(
+        cache=cache,
+        hedge_quantile=args.hedge_quantile if args.hedge_quantile > 0 else None,
+    )
+
     # Resolve OGC targets
     ogc_targets: list[tuple[str, str]] = []
     for spec in args.ogc:
@@ -297,20 +998,62 @@ def main() -> None:
         ogc_targets.append((ds, col))
 
     for ds in args.ogc_all:
-        src = OgcSource(api_base=f"https://api.ra.no/{ds}")
+        src = OgcSource(api_base=f"https://api.ra.no/{ds}", http=http)
         for c in src.collections():
             cid = c.get("id")
             if cid:
                 ogc_targets.append((ds, str(cid)))
 
     arc_layers = [int(x) for x in args.arcgis_layer]
+    if args.arcgis_all:
+        plan = arcgis_layer_plan(mapserver=args.arcgis_mapserver, bbox=args.bbox, http=http, workers=max(jobs, 4))
+        print(f"ArcGIS layers ({len(plan)}), biggest first:")
+        for layer_id, name, n in plan:
+            print(f"  {layer_id:>4}  {'?' if n is None else n:>9}  {name}")
+        arc_layers += [layer_id for layer_id, _name, n in plan if n != 0 and layer_id not in arc_layers]
+    failed: list[tuple[int, Exception]] = []
 
     produced: list[Produced] = []
+    pool = NormalizePool(processes=max(0, int(args.normalize_procs)))
+
+    suffix = ".sqlite" if args.sqlite else jsonl_suffix(args.compress)
+    max_limit = DEFAULT_MAX_LIMIT if args.max_limit is None else args.max_limit
+
+    def ogc_paths(ds: str, col: str) -> tuple[Path, Path]:
+        return out_dir / f"ogc__{ds}__{col}{suffix}", REPO_ROOT / "artifacts" / "openai_pilot" / f"ogc__{ds}__{col}.txt"
+
+    def arcgis_paths(layer_id: int) -> tuple[Path, Path]:
+        return out_dir / f"arcgis__{layer_id}{suffix}", REPO_ROOT / "artifacts" / "openai_pilot" / f"arcgis__{layer_id}.txt"
+
+    def prepare(jsonl_path: Path, txt_path: Path, n_new: int) -> Produced:
+        docs = prepare_text_from_jsonl(jsonl_path, out_path=txt_path)
+        print(f"Prepared: {txt_path} (docs={docs}, new_rows_appended={n_new})")
+        return Produced(jsonl_path=jsonl_path, txt_path=txt_path, docs=docs)
 
     def ingest_and_prepare_ogc(ds: str, col: str) -> Produced:
-        jsonl_path = out_dir / f"ogc__{ds}__{col}.jsonl"
-        txt_path = REPO_ROOT / "artifacts" / "openai_pilot" / f"ogc__{ds}__{col}.txt"
+        jsonl_path, txt_path = ogc_paths(ds, col)
         print(f"\n[OGC] {ds}/{col}")
+        projection_kwargs = dict(
+            project=spec_matches(args.project, ds, col), skip_geometry=spec_matches(args.skip_geometry, ds, col)
+        )
+        if args.delta:
+            n_new = ogc_delta_jsonl(
+                dataset=ds,
+                collection=col,
+                bbox=args.bbox,
+                limit=args.limit,
+                out_jsonl=jsonl_path,
+                http=http,
+                prefetch=args.prefetch,
+                tiled=args.tiled,
+                tile_max_items=args.tile_max_items,
+                tiled_sweep=args.tiled_sweep,
+                max_limit=max_limit,
+                delta_field=args.delta_field,
+                geometry_sidecar=args.geometry_sidecar,
+                **projection_kwargs,
+            )
+            return prepare(jsonl_path, txt_path, n_new)
         n_new = ogc_ingest_jsonl(
             dataset=ds,
             collection=col,
@@ -318,14 +1061,20 @@ def main() -> None:
             max_items=args.max_items,
             limit=args.limit,
             out_jsonl=jsonl_path,
+            http=http,
+            prefetch=args.prefetch,
+            tiled=args.tiled,
+            tile_max_items=args.tile_max_items,
+            tiled_sweep=args.tiled_sweep,
+            max_limit=max_limit,
+            geometry_sidecar=args.geometry_sidecar,
+            pool=pool,
+            **projection_kwargs,
         )
-        docs = prepare_text_from_jsonl(jsonl_path, out_path=txt_path)
-        print(f"Prepared: {txt_path} (docs={docs}, new_rows_appended={n_new})")
-        return Produced(jsonl_path=jsonl_path, txt_path=txt_path, docs=docs)
+        return prepare(jsonl_path, txt_path, n_new)
 
     def ingest_and_prepare_arcgis(layer_id: int) -> Produced:
-        jsonl_path = out_dir / f"arcgis__{layer_id}.jsonl"
-        txt_path = REPO_ROOT / "artifacts" / "openai_pilot" / f"arcgis__{layer_id}.txt"
+        jsonl_path, txt_path = arcgis_paths(layer_id)
         print(f"\n[ArcGIS] layer {layer_id}")
         n_new = arcgis_ingest_jsonl(
             mapserver=args.arcgis_mapserver,
@@ -333,29 +1082,99 @@ def main() -> None:
             bbox=args.bbox,
             max_items=args.max_items,
             out_jsonl=jsonl_path,
+            http=http,
+            by_ids=args.arcgis_by_ids or args.arcgis_all,
+            range_size=args.arcgis_range_size,
+            workers=args.arcgis_workers,
+            query_format=args.arcgis_format,
+            max_allowable_offset=args.arcgis_max_offset,
+            geometry_precision=args.arcgis_precision,
+            geometry_sidecar=args.geometry_sidecar,
+            pool=pool,
         )
-        docs = prepare_text_from_jsonl(jsonl_path, out_path=txt_path)
-        print(f"Prepared: {txt_path} (docs={docs}, new_rows_appended={n_new})")
-        return Produced(jsonl_path=jsonl_path, txt_path=txt_path, docs=docs)
+        return prepare(jsonl_path, txt_path, n_new)
 
-    jobs = max(1, int(args.jobs))
-    if jobs == 1:
-        for ds, col in ogc_targets:
-            produced.append(ingest_and_prepare_ogc(ds, col))
-        for layer_id in arc_layers:
-            produced.append(ingest_and_prepare_arcgis(layer_id))
-    else:
-        with ThreadPoolExecutor(max_workers=jobs) as ex:
-            futs = []
+    def run_arcgis(layer_id: int) -> Produced | None:
+        if not args.arcgis_all:
+            return ingest_and_prepare_arcgis(layer_id)
+        # Whole-service harvest: one failing layer must not abort the others.
+        try:
+            return ingest_and_prepare_arcgis(layer_id)
+        except Exception as e:  # noqa: BLE001 - reported below, resumed on the next run
+            print(f"ArcGIS layer {layer_id} failed: {e}")
+            failed.append((layer_id, e))
+            return None
+
+    async def ingest_all_async() -> list[int]:
+        # Every target pages concurrently; the per-host semaphore bounds what each server sees.
+        async with AsyncHttpClient(per_host=max(1, int(args.per_host)), cache=cache) as ahttp:
+            tasks = []
             for ds, col in ogc_targets:
-                futs.append(ex.submit(ingest_and_prepare_ogc, ds, col))
+                tasks.append(
+                    ogc_ingest_jsonl_async(
+                        http=ahttp,
+                        dataset=ds,
+                        collection=col,
+                        bbox=args.bbox,
+                        max_items=args.max_items,
+                        limit=args.limit,
+                        out_jsonl=ogc_paths(ds, col)[0],
+                        window=args.prefetch if args.prefetch > 1 else args.per_host,
+                        geometry_sidecar=args.geometry_sidecar,
+                    )
+                )
             for layer_id in arc_layers:
-                futs.append(ex.submit(ingest_and_prepare_arcgis, layer_id))
-            for fut in as_completed(futs):
-                produced.append(fut.result())
+                tasks.append(
+                    arcgis_ingest_jsonl_async(
+                        http=ahttp,
+                        mapserver=args.arcgis_mapserver,
+                        layer_id=layer_id,
+                        bbox=args.bbox,
+                        max_items=args.max_items,
+                        out_jsonl=arcgis_paths(layer_id)[0],
+                        max_allowable_offset=args.arcgis_max_offset,
+                        geometry_precision=args.arcgis_precision,
+                        geometry_sidecar=args.geometry_sidecar,
+                    )
+                )
+            return list(await asyncio.gather(*tasks))
+
+    if args.engine == "async":
+        paths = [ogc_paths(ds, col) for ds, col in ogc_targets] + [arcgis_paths(layer_id) for layer_id in arc_layers]
+        counts = asyncio.run(ingest_all_async())
+        for (jsonl_path, txt_path), n_new in zip(paths, counts):
+            produced.append(prepare(jsonl_path, txt_path, n_new))
+    else:
+        # Fetching runs on the --jobs threads; one process pool normalizes for all of them.
+        with pool:
+            if jobs == 1:
+                for ds, col in ogc_targets:
+                    produced.append(ingest_and_prepare_ogc(ds, col))
+                for layer_id in arc_layers:
+                    result = run_arcgis(layer_id)
+                    if result is not None:
+                        produced.append(result)
+            else:
+                with ThreadPoolExecutor(max_workers=jobs) as ex:
+                    futs = []
+                    for ds, col in ogc_targets:
+                        futs.append(ex.submit(ingest_and_prepare_ogc, ds, col))
+                    for layer_id in arc_layers:
+                        futs.append(ex.submit(run_arcgis, layer_id))
+                    for fut in as_completed(futs):
+                        result = fut.result()
+                        if result is not None:
+                            produced.append(result)
+
+    failure_note = ""
+    if failed:
+        ids = ", ".join(str(layer_id) for layer_id, _e in sorted(failed, key=lambda entry: entry[0]))
+        failure_note = f"{len(failed)} ArcGIS layer(s) failed ({ids}); re-run to resume them."
 
     if args.no_upload:
         print("\nDone (no upload).")
+        if failure_note:
+            raise SystemExit(failure_note)
         return
 
     uploads_enabled()
@@ -364,6 +1183,8 @@ def main() -> None:
         upload_txt_to_vector_store(cfg, txt_path=p.txt_path, jsonl_path=p.jsonl_path, docs=p.docs, manifest=manifest)
 
     print("\nDone.")
+    if failure_note:
+        raise SystemExit(failure_note)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+from .ogc import OgcSource, Projection
+from .paging import PageSizeController
+
+
+@dataclass(frozen=True)
+class Tile:
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+    @classmethod
+    def parse(cls, bbox: str) -> Tile:
+        parts = [float(x) for x in bbox.split(",")]
+        if len(parts) != 4:
+            raise ValueError(f"Invalid bbox: {bbox} (expected minLon,minLat,maxLon,maxLat)")
+        return cls(*parts)
+
+    def bbox(self) -> str:
+        return ",".join(f"{v:.6f}".rstrip("0").rstrip(".") for v in (self.min_lon, self.min_lat, self.max_lon, self.max_lat))
+
+    def split(self) -> list[Tile]:
+        mid_lon = (self.min_lon + self.max_lon) / 2
+        mid_lat = (self.min_lat + self.max_lat) / 2
+        return [
+            Tile(self.min_lon, self.min_lat, mid_lon, mid_lat),
+            Tile(mid_lon, self.min_lat, self.max_lon, mid_lat),
+            Tile(self.min_lon, mid_lat, mid_lon, self.max_lat),
+            Tile(mid_lon, mid_lat, self.max_lon, self.max_lat),
+        ]
+
+
+# Mainland Norway (CRS84) with some margin; pass an explicit bbox for Svalbard / Jan Mayen.
+NORWAY = Tile(4.0, 57.8, 31.5, 71.5)
+
+
+def feature_key(feature: dict[str, Any]) -> str | None:
+    """The id used to deduplicate features seen in several tiles (None = cannot dedupe)."""
+    fid = feature.get("id") or (feature.get("properties") or {}).get("id")
+    return str(fid) if fid not in (None, "") else None
+
+
+@dataclass(frozen=True)
+class TileHarvester:
+    """
+    Harvests a large OGC collection as a quadtree of bbox tiles instead of one deep offset scan.
+
+    Each tile is split until its `numberMatched` is at most `max_per_tile`, so every tile pages
+    with shallow offsets. Tiles are fetched concurrently (`workers`), and features straddling tile
+    borders (returned by several tiles, since bbox means "intersects") are deduplicated by id.
+    """
+
+    source: OgcSource
+    max_per_tile: int = 5000
+    max_depth: int = 12
+    workers: int = 4
+
+    def count(self, collection_id: str, tile: Tile) -> int | None:
+        return self.source.count(collection_id, bbox=tile.bbox())
+
+    def plan(self, collection_id: str, tile: Tile = NORWAY) -> list[tuple[Tile, int | None]]:
+        """Splits `tile` into leaf tiles with at most `max_per_tile` features (empty tiles dropped)."""
+        leaves: list[tuple[Tile, int | None]] = []
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as ex:
+            level = [(tile, self.count(collection_id, tile))]
+            for depth in range(self.max_depth + 1):
+                to_split: list[Tile] = []
+                for t, n in level:
+                    if n == 0:
+                        continue
+                    if n is None or n <= self.max_per_tile or depth == self.max_depth:
+                        leaves.append((t, n))
+                    else:
+                        to_split.extend(t.split())
+                if not to_split:
+                    break
+                level = list(zip(to_split, ex.map(lambda t: self.count(collection_id, t), to_split)))
+        return leaves
+
+    def iter_items(
+        self,
+        collection_id: str,
+        *,
+        bbox: str | None = None,
+        limit: int = 50,
+        max_items: int | None = None,
+        seen: set[str] | None = None,
+        page_size: PageSizeController | None = None,
+        strategies: Counter[str] | None = None,
+        projection: Projection | None = None,
+        skip_failed: bool = False,
+        on_skip: Callable[[Tile | None, int, Exception], None] | None = None,
+        sweep: bool = False,
+        on_untiled: Callable[[int], None] | None = None,
+        key: Callable[[dict[str, Any]], str | None] = feature_key,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Yields each feature once (tile order, not offset order), deduplicated by `key` (default:
+        the feature id). Pass `seen` to skip keys already harvested, e.g. the doc_ids of an existing
+        JSONL when resuming with a doc_id `key`; it is updated in place. A `page_size`
+        controller is shared by all tiles; `strategies` counts pages per paging strategy. With
+        `skip_failed`, an offset of a tile that keeps failing is reported to `on_skip` with its tile
+        (None in the sweep) and skipped (see `OgcSource.iter_pages`) instead of aborting the harvest.
+
+        Features without geometry are in no tile. Without `bbox`, the collection's total count is
+        compared with what the tiles returned afterwards: the shortfall is reported to `on_untiled`,
+        and with `sweep` the whole collection is paged once more for the features no tile returned.
+        """
+        seen = set() if seen is None else seen
+        tiles = [t for t, _n in self.plan(collection_id, Tile.parse(bbox) if bbox else NORWAY)]
+        anonymous = 0  # features without an id (not deduplicated, not in `seen`)
+
+        def fetch(tile: Tile) -> tuple[list[dict[str, Any]], Counter[str]]:
+            counts: Counter[str] = Counter()
+            feats = self.source.iter_items(
+                collection_id,
+                limit=limit,
+                bbox=tile.bbox(),
+                projection=projection,
+                page_size=page_size,
+                strategies=counts,
+                skip_failed=skip_failed,
+                on_skip=None if on_skip is None else lambda offset, exc: on_skip(tile, offset, exc),
+            )
+            return list(feats), counts
+
+        yielded = 0
+        pending = deque(tiles)
+        inflight: deque[Future[tuple[list[dict[str, Any]], Counter[str]]]] = deque()
+        ex = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="rag-for-ra-tiles")
+        try:
+            while pending or inflight:
+                while pending and len(inflight) < max(1, self.workers):
+                    inflight.append(ex.submit(fetch, pending.popleft()))
+                feats, counts = inflight.popleft().result()
+                if strategies is not None:
+                    strategies.update(counts)
+                for feat in feats:
+                    k = key(feat)
+                    if k is not None:
+                        if k in seen:
+                            continue
+                        seen.add(k)
+                    else:
+                        anonymous += 1
+                    yield feat
+                    yielded += 1
+                    if max_items is not None and yielded >= max_items:
+                        return
+        finally:
+            for fut in inflight:
+                fut.cancel()
+            ex.shutdown(wait=False)
+
+        total = self.source.count(collection_id) if bbox is None else None
+        untiled = 0 if total is None else total - len(seen) - anonymous
+        if untiled <= 0:
+            return
+        if on_untiled is not None:
+            on_untiled(untiled)
+        if not sweep:
+            return
+        for feat in self.source.iter_items(
+            collection_id,
+            limit=limit,
+            projection=projection,
+            page_size=page_size,
+            strategies=strategies,
+            skip_failed=skip_failed,
+            on_skip=None if on_skip is None else lambda offset, exc: on_skip(None, offset, exc),
+        ):
+            k = key(feat)
+            if k is None or k in seen:
+                continue  # anonymous features can't be told apart from those the tiles returned
+            seen.add(k)
+            yield feat
+            yielded += 1
+            if max_items is not None and yielded >= max_items:
+                return
+
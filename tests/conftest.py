@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from rag_for_ra.http import HttpClient
+
+
+def make_features(n: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "type": "Feature",
+            "id": f"f{i}",
+            "properties": {"id": f"f{i}", "navn": f"Navn {i}", "kommune": "Oslo", "sistEndret": "2024-01-01"},
+            "geometry": {"type": "Point", "coordinates": [10.0 + i * 0.001, 59.9]},
+        }
+        for i in range(n)
+    ]
+
+
+def id_less(n: int) -> list[dict[str, Any]]:
+    feats = make_features(n)
+    for f in feats:
+        del f["id"], f["properties"]["id"]
+    return feats
+
+
+def lokal_ids(n: int) -> list[dict[str, Any]]:
+    feats = make_features(n)
+    for i, f in enumerate(feats):
+        f["properties"]["lokalId"] = f"L{i}"
+    return feats
+
+
+@dataclass(eq=False)
+class OgcServer:
+    """
+    A local OGC API Features endpoint: `<url>/<dataset>/collections/<collection>/items` pages
+    `features` by `limit`/`offset` (and filters them by point-in-`bbox`). `cut(offset, limit, body)`
+    may return a shortened body to simulate a truncated HTTP 200; a page for which `fail(query,
+    features)` is true gets an HTTP 500. `collection` is merged into the collection metadata.
+    `delay(n)` / `stall(n)` slow the `n`-th request down (seconds before its headers / halfway
+    through its body). With `etag` / `last_modified`, responses carry the validator and a matching
+    conditional request gets a 304.
+    """
+
+    features: list[dict[str, Any]] = field(default_factory=lambda: make_features(40))
+    cut: Callable[[int, int, bytes], bytes | None] | None = None
+    fail: Callable[[dict[str, str], list[dict[str, Any]]], bool] | None = None
+    requests: list[dict[str, str]] = field(default_factory=list)
+    collection: dict[str, Any] = field(default_factory=dict)
+    delay: Callable[[int], float] | None = None
+    stall: Callable[[int], float] | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+    url: str = ""
+
+    def matching(self, query: dict[str, str]) -> list[dict[str, Any]]:
+        if "bbox" not in query:
+            return self.features
+        min_x, min_y, max_x, max_y = (float(v) for v in query["bbox"].split(","))
+        return [
+            f
+            for f in self.features
+            if f.get("geometry")
+            and min_x <= f["geometry"]["coordinates"][0] <= max_x
+            and min_y <= f["geometry"]["coordinates"][1] <= max_y
+        ]
+
+    def body(self, path: str, query: dict[str, str]) -> bytes | None:
+        """The response body, or None for an HTTP 500."""
+        if path.endswith("/items"):
+            offset, limit = int(query.get("offset", 0)), int(query.get("limit", 10))
+            pool = self.matching(query)
+            feats = pool[offset : offset + limit]
+            if self.fail is not None and self.fail(query, feats):
+                return None
+            body = json.dumps(
+                {
+                    "type": "FeatureCollection",
+                    "numberMatched": len(pool),
+                    "numberReturned": len(feats),
+                    "features": feats,
+                }
+            ).encode()
+            if self.cut is not None:
+                body = self.cut(offset, limit, body) or body
+            return body
+        if path.endswith("/api"):
+            return json.dumps({"info": {"license": {"name": "NLOD", "url": "https://data.norge.no/nlod"}}}).encode()
+        return json.dumps({"id": path.rsplit("/", 1)[-1], **self.collection}).encode()
+
+
+@pytest.fixture
+def ogc_server() -> Iterator[OgcServer]:
+    server = OgcServer()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            parts = urlsplit(self.path)
+            query = dict(parse_qsl(parts.query))
+            n = len(server.requests)
+            conditional = {k: v for k in ("If-None-Match", "If-Modified-Since") if (v := self.headers.get(k))}
+            server.requests.append(dict(query, path=parts.path, **conditional))
+            if server.delay is not None:
+                time.sleep(server.delay(n))
+            validators = {"ETag": server.etag, "Last-Modified": server.last_modified}
+            if (server.etag and conditional.get("If-None-Match") == server.etag) or (
+                server.last_modified and conditional.get("If-Modified-Since") == server.last_modified
+            ):
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = server.body(parts.path, query)
+            if body is None:
+                self.send_response(500)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in validators.items():
+                if value:
+                    self.send_header(name, value)
+            self.end_headers()
+            if server.stall is not None:
+                half = len(body) // 2
+                self.wfile.write(body[:half])
+                self.wfile.flush()
+                time.sleep(server.stall(n))
+                body = body[half:]
+            try:
+                self.wfile.write(body)
+            except OSError:
+                pass  # the client hung up (e.g. a cancelled hedge)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def cut_after_feature(n: int) -> Callable[[bytes], bytes]:
+    """Cuts a FeatureCollection body right after the closing `}` of its `n`-th feature."""
+
+    def cut(body: bytes) -> bytes:
+        payload = json.loads(body)
+        head = json.dumps({k: v for k, v in payload.items() if k != "features"})[:-1].encode()
+        feats = b", ".join(json.dumps(f).encode() for f in payload["features"][:n])
+        return head + b', "features": [' + feats
+
+    return cut
+
+
+
+@dataclass(frozen=True)
+class RaClient(HttpClient):
+    """An HttpClient that sends requests for `https://api.ra.no` to a local `OgcServer` instead."""
+
+    server_url: str = ""
+
+    def session(self) -> requests.Session:
+        sess = super().session()
+        if not isinstance(sess.get_adapter(RA_API), _Redirect):
+            sess.mount(RA_API, _Redirect(self.server_url))
+        return sess
+
+
+RA_API = "https://api.ra.no"
+
+
+class _Redirect(HTTPAdapter):
+    def __init__(self, server_url: str) -> None:
+        super().__init__()
+        self.server_url = server_url
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        request.url = self.server_url + request.url.removeprefix(RA_API)
+        return super().send(request, **kwargs)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+
+from rag_for_ra.cache import CacheMiss, ResponseCache
+from rag_for_ra.http import HttpClient
+
+
+def client(cache: ResponseCache) -> HttpClient:
+    return HttpClient(limiter=None, latency=None, cache=cache, retries=0)
+
+
+def test_fresh_entries_skip_the_network(ogc_server, tmp_path) -> None:
+    http = client(ResponseCache(root=tmp_path, ttl_s=3600))
+    url = f"{ogc_server.url}/ds/collections/c1"
+
+    assert http.get_json(url) == http.get_json(url) == {"id": "c1"}
+    assert len(ogc_server.requests) == 1
+
+
+@pytest.mark.parametrize(
+    "validator, header",
+    [("etag", "If-None-Match"), ("last_modified", "If-Modified-Since")],
+)
+def test_stale_entries_are_revalidated(ogc_server, tmp_path, validator, header) -> None:
+    setattr(ogc_server, validator, '"v1"' if validator == "etag" else "Wed, 01 May 2024 10:00:00 GMT")
+    cache = ResponseCache(root=tmp_path, ttl_s=0)
+    url = f"{ogc_server.url}/ds/collections/c1"
+    assert client(cache).get_json(url) == {"id": "c1"}
+    stored_at = cache.lookup(url).meta["stored_at"]
+
+    ogc_server.collection = {"title": "changed"}  # only served if the 304 were ignored
+    assert client(cache).get_json(url) == {"id": "c1"}
+    assert ogc_server.requests[1][header] == getattr(ogc_server, validator)
+    assert cache.lookup(url).meta["stored_at"] > stored_at  # refreshed by the 304
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path) -> None:
+    cache = ResponseCache(root=tmp_path, max_bytes=3000)
+    urls = [f"https://example.org/{i}" for i in range(4)]
+    for i, url in enumerate(urls[:3]):
+        cache.store(url, None, bytes(900), {})
+        body_path, _meta = cache._paths(cache.key(url))
+        os.utime(body_path, (time.time() - 100 + i,) * 2)  # stored in order, a while ago
+    assert cache.lookup(urls[0]) is not None  # a hit makes entry 0 the most recently used
+
+    cache.store(urls[3], None, bytes(900), {})  # 3600 bytes > cap: evict down to 90%
+    assert [cache.lookup(url) is not None for url in urls] == [True, False, True, True]
+
+
+def test_offline_misses_raise_and_hits_ignore_age(ogc_server, tmp_path) -> None:
+    url = f"{ogc_server.url}/ds/collections/c1"
+    with pytest.raises(CacheMiss):
+        client(ResponseCache(root=tmp_path, offline=True)).get_json(url)
+    assert ogc_server.requests == []
+
+    client(ResponseCache(root=tmp_path, ttl_s=0)).get_json(url)
+    assert client(ResponseCache(root=tmp_path, ttl_s=0, offline=True)).get_json(url) == {"id": "c1"}
+    assert len(ogc_server.requests) == 1
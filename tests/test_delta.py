@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+
+import orjson
+import pytest
+
+from rag_for_ra import paging, schema
+from rag_for_ra.delta import jsonl_digests, tombstones_path, upsert_jsonl
+from rag_for_ra.io import iter_jsonl
+from rag_for_ra.sync_api_to_openai import ogc_delta_jsonl
+
+from conftest import RaClient, id_less, lokal_ids
+
+
+@pytest.mark.parametrize(
+    "features, override",
+    [
+        (id_less(6), None),  # doc_ids fall back to a fingerprint of the properties
+        (lokal_ids(6), schema.Schema(id=("lokalId",), feature_id=False)),
+    ],
+    ids=["fingerprint", "schema-id"],
+)
+def test_datetime_delta_sweep_finds_only_removed_features(ogc_server, tmp_path, monkeypatch, features, override) -> None:
+    if override is not None:
+        monkeypatch.setitem(schema.SCHEMAS, "ds:c1", override)
+    monkeypatch.setattr(schema, "_MAPPERS", {})
+    monkeypatch.setattr(paging, "STATE_FILE", tmp_path / "state.json")
+    ogc_server.features = features
+    ogc_server.collection = {"extent": {"temporal": {"interval": [["2020-01-01T00:00:00Z", None]]}}}
+    out = tmp_path / "ds__c1.jsonl"
+
+    def delta() -> int:
+        http = RaClient(limiter=None, latency=None, server_url=ogc_server.url)
+        return ogc_delta_jsonl(dataset="ds", collection="c1", bbox=None, limit=10, out_jsonl=out, http=http)
+
+    assert delta() == 6
+    rows = {row["properties"]["navn"]: row["doc_id"] for row in iter_jsonl(out)}
+    del ogc_server.features[2]  # the upstream count drops, so the delta sweeps ids
+
+    assert delta() == 1
+    assert [json.loads(line)["doc_id"] for line in tombstones_path(out).read_text().splitlines()] == [rows["Navn 2"]]
+    assert sorted(row["doc_id"] for row in iter_jsonl(out)) == sorted(v for k, v in rows.items() if k != "Navn 2")
+
+
+def test_upsert_replaces_every_row_of_a_doc_id(tmp_path) -> None:
+    out = tmp_path / "docs.jsonl"
+    rows = [{"doc_id": "d1", "v": 0}, {"doc_id": "d2", "v": 0}, {"doc_id": "d1", "v": 1}, {"doc_id": "d3", "v": 0}]
+    out.write_bytes(b"".join(orjson.dumps(row) + b"\n" for row in rows))
+    new = orjson.dumps({"doc_id": "d1", "v": 2, "content_hash": "h2"})
+
+    assert upsert_jsonl(out, {"d1": new, "d4": b'{"doc_id": "d4"}'}, ["d3"]) == (1, 1, 1)
+    assert [row["doc_id"] for row in iter_jsonl(out)] == ["d1", "d2", "d4"]
+    assert jsonl_digests(out)["d1"] == "h2"
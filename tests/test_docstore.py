@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import orjson
+import pytest
+
+from rag_for_ra.docstore import DocStore
+from rag_for_ra.io import JsonlWriter, open_writer
+
+
+def row(doc_id: str, content_hash: str | None, text: str = "", kommune: str = "Oslo") -> bytes:
+    doc = {"doc_id": doc_id, "text": text, "content_hash": content_hash, "properties": {"kommune": kommune}}
+    return orjson.dumps(doc) + b"\n"
+
+
+def texts(store: DocStore) -> list[tuple[str, str]]:
+    return [(doc["doc_id"], doc["text"]) for doc in map(orjson.loads, store.iter_raw())]
+
+
+def test_unchanged_content_hash_is_not_rewritten(tmp_path) -> None:
+    with DocStore(tmp_path / "docs.sqlite") as store:
+        store.write(row("a", "h1", "first") + row("b", None, "first"))
+        store.flush()
+        # Same hash: the stored row stays (even though these bytes differ); no hash: always written.
+        store.write(row("a", "h1", "same hash") + row("b", None, "second"))
+        store.flush()
+        assert texts(store) == [("a", "first"), ("b", "second")]
+
+        store.write(row("a", "h2", "changed"))
+        store.flush()
+        assert texts(store) == [("a", "changed"), ("b", "second")]
+
+
+def test_upsert_updates_adds_and_removes(tmp_path) -> None:
+    with DocStore(tmp_path / "docs.sqlite") as store:
+        store.write(b"".join(row(d, "h1", d) for d in "abc"))
+        store.flush()
+
+        changed = {"b": row("b", "h2", "b2").rstrip(), "d": row("d", "h1", "d").rstrip()}
+        assert store.upsert(changed, ["c", "missing"]) == (1, 1, 1)
+        # Insertion order: an updated document keeps its place, new ones come last.
+        assert texts(store) == [("a", "a"), ("b", "b2"), ("d", "d")]
+        assert store.count() == 3 and store.count(kommune="Oslo") == 3 and store.count(kommune="Bergen") == 0
+
+
+def test_rows_split_across_writes(tmp_path) -> None:
+    data = row("a", "h1", "x") + row("b", "h1", "y")
+    with DocStore(tmp_path / "docs.db") as store:
+        store.write(data[:10])
+        store.write(data[10:])
+        assert store.tell() == 0  # commits; not a truncation point
+        assert texts(store) == [("a", "x"), ("b", "y")]
+
+
+@pytest.mark.parametrize("name, kind", [("x.sqlite", DocStore), ("x.db", DocStore), ("x.jsonl", JsonlWriter)])
+def test_open_writer_picks_the_store_by_suffix(tmp_path, name, kind) -> None:
+    assert isinstance(open_writer(tmp_path / name), kind)
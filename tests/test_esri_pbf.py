@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import struct
+
+import pytest
+
+from rag_for_ra.esri_pbf import decode_feature_collection
+
+
+# A minimal protobuf encoder for building FeatureCollectionPBuffer payloads by hand.
+def varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        out.append(b | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def num(field: int, value: int) -> bytes:
+    return varint(field << 3) + varint(value)
+
+
+def msg(field: int, payload: bytes) -> bytes:
+    return varint(field << 3 | 2) + varint(len(payload)) + payload
+
+
+def double(field: int, value: float) -> bytes:
+    return varint(field << 3 | 1) + struct.pack("<d", value)
+
+
+def packed(field: int, values: list[int]) -> bytes:
+    return msg(field, b"".join(varint(v) for v in values))
+
+
+def deltas(points: list[tuple[int, ...]]) -> list[int]:
+    """Quantized points as zigzagged per-dimension deltas across the whole geometry."""
+    out, prev = [], (0,) * len(points[0])
+    for pt in points:
+        out.extend(zigzag(v - p) for v, p in zip(pt, prev))
+        prev = pt
+    return out
+
+
+def field(name: str, field_type: int) -> bytes:
+    return msg(13, msg(1, name.encode()) + num(2, field_type))
+
+
+def collection(result_kind: int, result: bytes) -> bytes:
+    return msg(1, b"1.0") + msg(2, msg(result_kind, result))
+
+
+def transform(origin: int, scale: tuple[float, ...], translate: tuple[float, ...]) -> bytes:
+    return msg(
+        12,
+        num(1, origin)
+        + msg(2, b"".join(double(i + 1, v) for i, v in enumerate(scale)))
+        + msg(3, b"".join(double(i + 1, v) for i, v in enumerate(translate))),
+    )
+
+
+def polygon_layer() -> bytes:
+    attrs = (
+        msg(1, num(5, 7))  # uint
+        + msg(1, msg(1, "Kirkegården".encode()))  # string
+        + msg(1, double(3, 12.5))  # double
+        + msg(1, num(4, zigzag(-3)))  # sint
+        + msg(1, num(9, 1))  # bool
+    )
+    ring = [(0, 0), (20, 0), (20, 10), (0, 0)]
+    geometry = num(1, 3) + packed(2, [4]) + packed(3, deltas(ring))
+    return collection(
+        1,
+        msg(1, b"OBJECTID")
+        + num(7, 3)
+        + msg(8, num(1, 25833) + num(2, 25833))
+        + num(9, 1)
+        + transform(0, (0.5, 0.5, 1, 1), (100.0, 1000.0, 0, 0))
+        + field("OBJECTID", 6)
+        + field("navn", 4)
+        + field("areal", 3)
+        + field("delta", 1)
+        + field("fredet", 4)
+        + msg(15, attrs + msg(2, geometry)),
+    )
+
+
+def test_polygon_with_upper_left_transform() -> None:
+    assert decode_feature_collection(polygon_layer()) == {
+        "objectIdFieldName": "OBJECTID",
+        "geometryType": "esriGeometryPolygon",
+        "spatialReference": {"wkid": 25833, "latestWkid": 25833},
+        "exceededTransferLimit": True,
+        "hasZ": False,
+        "hasM": False,
+        "fields": [
+            {"name": "OBJECTID", "type": "esriFieldTypeOID", "alias": "OBJECTID"},
+            {"name": "navn", "type": "esriFieldTypeString", "alias": "navn"},
+            {"name": "areal", "type": "esriFieldTypeDouble", "alias": "areal"},
+            {"name": "delta", "type": "esriFieldTypeInteger", "alias": "delta"},
+            {"name": "fredet", "type": "esriFieldTypeString", "alias": "fredet"},
+        ],
+        "features": [
+            {
+                "attributes": {"OBJECTID": 7, "navn": "Kirkegården", "areal": 12.5, "delta": -3, "fredet": True},
+                # y counts down from the upper-left origin: y = translate - q * scale.
+                "geometry": {"rings": [[[100.0, 1000.0], [110.0, 1000.0], [110.0, 995.0], [100.0, 1000.0]]]},
+            }
+        ],
+    }
+
+
+def test_polyline_parts_and_lower_left_origin() -> None:
+    paths = [(0, 0), (4, 2), (8, 8), (6, 2), (2, 2)]
+    geometry = packed(2, [2, 3]) + packed(3, deltas(paths))
+    body = collection(
+        1,
+        num(7, 2)
+        + transform(1, (1, 2, 1, 1), (10, 20, 0, 0))
+        + field("id", 1)
+        + msg(15, msg(1, num(5, 1)) + msg(2, geometry)),
+    )
+
+    assert decode_feature_collection(body)["features"][0]["geometry"] == {
+        "paths": [[[10, 20], [14, 24]], [[18, 36], [16, 24], [12, 24]]]
+    }
+
+
+def test_point_with_z_and_m() -> None:
+    # On the wire a point is x, y, z, m; Scale / Translate hold x, y, m, z.
+    geometry = packed(3, deltas([(3, 4, 5, 6)]))
+    body = collection(
+        1,
+        num(7, 0) + num(10, 1) + num(11, 1) + transform(1, (1, 1, 10, 100), (0, 0, 1, 2)) + msg(15, msg(2, geometry)),
+    )
+    result = decode_feature_collection(body)
+
+    assert (result["hasZ"], result["hasM"]) == (True, True)
+    assert result["features"] == [{"attributes": {}, "geometry": {"x": 3, "y": 4, "z": 502}}]
+
+
+def test_count_and_ids_only_results() -> None:
+    assert decode_feature_collection(collection(2, num(1, 12345))) == {"count": 12345}
+    ids = collection(3, msg(1, b"OBJECTID") + packed(3, [1, 2, 300, 70000]))
+    assert decode_feature_collection(ids) == {"objectIdFieldName": "OBJECTID", "objectIds": [1, 2, 300, 70000]}
+
+
+@pytest.mark.parametrize("cut", [1, 5, 20])
+def test_truncated_input_is_an_error(cut: int) -> None:
+    with pytest.raises(ValueError):
+        decode_feature_collection(polygon_layer()[:-cut])
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+from rag_for_ra.http import HttpClient, LatencyTracker, TruncatedResponseError, decode_json
+
+from conftest import cut_after_feature, make_features
+
+
+def collection(n: int) -> bytes:
+    feats = make_features(n)
+    return json.dumps({"type": "FeatureCollection", "numberReturned": n, "features": feats}).encode()
+
+
+def test_complete_body_decodes() -> None:
+    assert len(decode_json(collection(3))["features"]) == 3
+
+
+def test_cut_after_a_feature_is_truncation() -> None:
+    body = cut_after_feature(2)(collection(3))
+    assert body.endswith(b"}")  # passes the cheap closing-brace check
+
+    with pytest.raises(TruncatedResponseError) as info:
+        decode_json(body, url="u")
+    assert info.value.body == body
+
+
+def test_client_reports_cut_after_a_feature_as_truncation(ogc_server) -> None:
+    ogc_server.cut = lambda offset, limit, body: cut_after_feature(3)(body)
+    http = HttpClient(limiter=None, latency=None, backoff_s=30.0, truncation_retries=1)
+
+    with pytest.raises(TruncatedResponseError):
+        http.get_json(f"{ogc_server.url}/ds/collections/c1/items", params={"f": "json", "limit": 10, "offset": 0})
+    # Given up after one truncation retry, without sleeping through the ordinary error backoff.
+    assert len(ogc_server.requests) == 2
+
+
+
+def hedged(tracker: LatencyTracker, **kwargs) -> HttpClient:
+    return HttpClient(limiter=None, latency=tracker, hedge_quantile=0.9, hedge_min_delay_s=0.05, **kwargs)
+
+
+def test_no_hedge_before_enough_samples(ogc_server) -> None:
+    tracker = LatencyTracker()
+    for _ in range(19):
+        tracker.record(ogc_server.url, 0.01)
+    ogc_server.delay = lambda n: 0.3
+
+    hedged(tracker).get_json(f"{ogc_server.url}/ds/collections/c1")
+    assert len(ogc_server.requests) == 1
+
+
+def test_hedge_fires_above_the_quantile(ogc_server) -> None:
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.record(ogc_server.url, 0.01)
+    ogc_server.delay = lambda n: 2.0 if n == 0 else 0.0
+
+    started = time.monotonic()
+    assert hedged(tracker).get_json(f"{ogc_server.url}/ds/collections/c1") == {"id": "c1"}
+    assert time.monotonic() - started < 1.0
+    assert len(ogc_server.requests) == 2
+
+
+def test_hedge_loser_is_cancelled_and_discarded(ogc_server) -> None:
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.record(ogc_server.url, 0.01)
+    # The first response starts at once but stalls halfway through its body; the hedge is fast.
+    ogc_server.stall = lambda n: 1.0 if n == 0 else 0.0
+    url = f"{ogc_server.url}/ds/collections/c1/items"
+
+    started = time.monotonic()
+    page = hedged(tracker).get_json(url, params={"f": "json", "limit": 10, "offset": 0})
+    assert time.monotonic() - started < 0.9
+    assert len(page["features"]) == 10 and len(ogc_server.requests) == 2
+
+    time.sleep(1.2)  # let the loser's body finish arriving
+    # Only the winner's latency was recorded: the loser saw its cancel flag and was dropped.
+    assert len(tracker._samples[urlsplit(url).netloc]) == 21
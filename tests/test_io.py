@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import orjson
+import pytest
+
+from rag_for_ra.io import JsonlWriter, iter_jsonl
+
+
+def rows(start: int, n: int) -> list[dict]:
+    return [{"doc_id": f"d{i}", "text": f"row {i} " * 20} for i in range(start, start + n)]
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz"])
+def test_append_repairs_a_member_cut_mid_way(tmp_path, suffix) -> None:
+    path = tmp_path / f"docs.jsonl{suffix}"
+    first, second, third = rows(0, 50), rows(50, 400), rows(450, 10)
+    with JsonlWriter(path) as f:
+        f.write_rows(first)
+        end = f.tell()
+        f.write_rows(second)
+    # A crash mid-way through the second member leaves a compressed stream without its trailer.
+    size = path.stat().st_size
+    with path.open("r+b") as f:
+        f.truncate(end + (size - end) // 2)
+
+    with JsonlWriter(path) as f:
+        f.write_rows(third)
+
+    got = [row["doc_id"] for row in iter_jsonl(path)]
+    salvaged = got[len(first) : -len(third)]
+    # The first member and the new rows are whole; the cut member gives back the complete rows it decoded.
+    assert got[: len(first)] == [row["doc_id"] for row in first]
+    assert got[-len(third) :] == [row["doc_id"] for row in third]
+    assert 0 < len(salvaged) < len(second) and salvaged == [row["doc_id"] for row in second[: len(salvaged)]]
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import orjson
+import pytest
+
+from rag_for_ra.io import JsonlWriter, open_writer
+from rag_for_ra.jsonl_index import RowIndex, build_index, index_path
+from rag_for_ra.lookup_docs import lookup
+
+
+def test_lookup_returns_latest_rows(tmp_path) -> None:
+    path = tmp_path / "docs.jsonl"
+    rows = [{"doc_id": f"d{i}", "v": 0} for i in range(5)] + [{"doc_id": "d1", "v": 1}, {"doc_id": "d3", "v": 1}]
+    with JsonlWriter(path) as f:
+        f.write(b"".join(orjson.dumps(row) + b"\n" for row in rows))
+    with JsonlWriter(path) as f:
+        f.write(orjson.dumps({"doc_id": "d1", "v": 2}) + b"\n")
+    index = RowIndex.load(path)
+
+    assert index is not None and len(index) == 8
+    assert index.rows_of("d1") == [1, 5, 7] and index.rows_of("d0") == [0] and index.rows_of("nope") == []
+    found = index.lookup(["d1", "d3", "d4", "nope"])
+    assert {k: v["v"] for k, v in found.items()} == {"d1": 2, "d3": 1, "d4": 0}
+
+
+@pytest.mark.parametrize("name", ["docs.jsonl", "docs.jsonl.gz", "docs.jsonl.xz", "docs.sqlite"])
+def test_lookup_docs_reads_every_kind_of_cache(tmp_path, name) -> None:
+    path = tmp_path / name
+    with open_writer(path) as f:
+        f.write_rows([{"doc_id": "a", "v": 0}, {"doc_id": "b", "v": 0}])
+    with open_writer(path) as f:
+        f.write_rows([{"doc_id": "a", "v": 1}])
+
+    assert {k: v["v"] for k, v in lookup(path, ["a", "b", "nope"]).items()} == {"a": 1, "b": 0}
+    assert not index_path(path).exists() or name == "docs.jsonl"
+
+
+@pytest.mark.parametrize("name", ["docs.jsonl.gz", "docs.db"])
+def test_build_index_refuses_unseekable_caches(tmp_path, name) -> None:
+    with pytest.raises(ValueError):
+        build_index(tmp_path / name)
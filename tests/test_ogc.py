@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import json
+
+from rag_for_ra.http import HttpClient
+from rag_for_ra.ogc import OgcSource, salvage_features
+
+from conftest import cut_after_feature, make_features
+
+
+def test_salvage_after_null_geometry() -> None:
+    feats = [dict(f, geometry=None) for f in make_features(4)]
+    body = json.dumps({"type": "FeatureCollection", "features": feats}).encode()
+    cut = body[: body.index(b'"geometry": null}', body.index(b'"id": "f2"')) + len(b'"geometry": null}')]
+
+    assert [f["id"] for f in salvage_features(cut)] == ["f0", "f1", "f2"]
+
+
+def test_truncated_page_cut_after_a_feature_is_salvaged(ogc_server) -> None:
+    # The first request (offset 0) is cut right after its 3rd feature; everything else arrives intact.
+    ogc_server.cut = lambda offset, limit, body: cut_after_feature(3)(body) if offset == 0 else None
+    src = OgcSource(ogc_server.url + "/ds", HttpClient(limiter=None, latency=None, backoff_s=30.0))
+
+    pages = list(src.iter_pages("c1", limit=10))
+
+    assert [f["id"] for page in pages for f in page.features] == [f["id"] for f in ogc_server.features]
+    assert pages[0].salvaged and [f["id"] for f in pages[0].features] == ["f0", "f1", "f2"]
+    assert pages[1].offset == 3
+
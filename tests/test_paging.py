@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import json
+
+from rag_for_ra import paging
+from rag_for_ra.cache import ResponseCache
+from rag_for_ra.sync_api_to_openai import ogc_ingest_jsonl
+
+from conftest import RaClient
+
+
+def test_offline_replay_of_an_adaptive_sync(ogc_server, tmp_path, monkeypatch) -> None:
+    state = tmp_path / "state.json"
+    # A previous uncached run left a page size behind; it must not change the pages a cached run requests.
+    state.write_text(json.dumps({"page_sizes": {"https://api.ra.no/ds/collections/c1": 15}}))
+    monkeypatch.setattr(paging, "STATE_FILE", state)
+
+    def sync(out: str, *, offline: bool) -> int:
+        cache = ResponseCache(root=tmp_path / "cache", offline=offline)
+        http = RaClient(limiter=None, latency=None, cache=cache, server_url=ogc_server.url)
+        return ogc_ingest_jsonl(
+            dataset="ds", collection="c1", bbox=None, max_items=0, limit=4, max_limit=20, out_jsonl=tmp_path / out, http=http
+        )
+
+    assert sync("online.jsonl", offline=False) == 40
+    limits = {int(q["limit"]) for q in ogc_server.requests if q["path"].endswith("/items")}
+    assert min(limits) == 4 and max(limits) > 4  # the page size grew during the harvest
+    remembered = json.loads(state.read_text())["page_sizes"]["https://api.ra.no/ds/collections/c1"]
+
+    fetched = len(ogc_server.requests)
+    assert sync("offline.jsonl", offline=True) == 40
+    assert len(ogc_server.requests) == fetched
+    assert (tmp_path / "offline.jsonl").read_bytes() == (tmp_path / "online.jsonl").read_bytes()
+    assert json.loads(state.read_text())["page_sizes"]["https://api.ra.no/ds/collections/c1"] == remembered
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from rag_for_ra.http import HttpClient
+from rag_for_ra.ogc import OgcSource
+from rag_for_ra.pipeline import NormalizePool, NormalizeTask, page_batches, write_normalized
+
+from conftest import cut_after_feature
+
+
+def test_worker_processes_parse_raw_pages(ogc_server, tmp_path) -> None:
+    # The page at offset 10 is cut after 3 features: its salvaged features have no raw body.
+    ogc_server.cut = lambda offset, limit, body: cut_after_feature(3)(body) if offset == 10 else None
+    src = OgcSource(ogc_server.url + "/ds", HttpClient(limiter=None, latency=None))
+    task = NormalizeTask("ds", "c1", "NLOD")
+
+    batches = list(page_batches(src.iter_item_pages("c1", limit=10), 15, raw=True))
+    assert [type(b).__name__ for b in batches] == ["tuple", "list", "tuple", "tuple"]
+
+    with NormalizePool(processes=2) as pool:
+        assert write_normalized(tmp_path / "raw.jsonl", batches, task=task, pool=pool) == 40
+    inline = page_batches(src.iter_item_pages("c1", limit=10), 15)
+    assert write_normalized(tmp_path / "inline.jsonl", inline, task=task) == 40
+    assert (tmp_path / "raw.jsonl").read_bytes() == (tmp_path / "inline.jsonl").read_bytes()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from rag_for_ra.ratelimit import RateLimiter
+
+
+URL = "https://api.ra.no/kulturminner/collections"
+
+
+def test_waiters_are_staggered_after_retry_after() -> None:
+    limiter = RateLimiter(initial_rate=10.0, burst=4.0)
+    limiter.on_response(URL, 429, "2")
+    rate = limiter.rate(URL)
+
+    delays = [limiter.reserve(URL) for _ in range(20)]
+
+    assert min(delays) >= 2.0 - 0.05  # nobody goes before the block ends
+    gaps = [b - a for a, b in zip(delays, delays[1:])]
+    assert all(abs(gap - 1.0 / rate) < 0.01 for gap in gaps)  # one token apart, not one burst
+
+
+def test_unthrottled_burst_is_free() -> None:
+    limiter = RateLimiter(initial_rate=10.0, burst=4.0)
+    delays = [limiter.reserve(URL) for _ in range(4)]
+    assert all(d <= 0.0 for d in delays)
+    assert limiter.reserve(URL) > 0.0
+
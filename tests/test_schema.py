@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import orjson
+
+from rag_for_ra.documents import arcgis_feature_to_document, feature_to_document, fingerprint
+from rag_for_ra.geometry import split_geometry
+
+
+def arcgis(attrs: dict) -> dict:
+    return arcgis_feature_to_document(dataset="arcgis", layer_name="L", feature={"attributes": attrs}).to_dict()
+
+
+def test_arcgis_fields_match_exactly_as_spelled() -> None:
+    doc = arcgis({"OBJECTID": 1, "NAVN": "Kirke", "BESKRIVELSE": "Stor", "beskrivelse": "liten", "KOMMUNE": "Oslo"})
+
+    assert doc["doc_id"] == "arcgis:L:1"
+    assert doc["title"] == "1"  # NAVN is not navn
+    assert doc["text"] == "BESKRIVELSE: Stor beskrivelse: liten KOMMUNE: Oslo"
+    assert doc["tags"] == [] and doc["source"]["web_url"] is None
+
+
+def test_arcgis_without_id_field_falls_back_to_fingerprint() -> None:
+    attrs = {"ObjectId": 3, "navn": "Kirke"}
+
+    assert arcgis(attrs)["doc_id"] == f"arcgis:L:arcgis:L:{fingerprint(attrs)}"
+
+
+def test_ogc_feature_document() -> None:
+    feature = {
+        "id": "k1",
+        "properties": {"navn": "Gård", "tittel": "Tunet", "kommune": "Oslo", "vernetype": "Fredet", "linkAskeladden": "u"},
+    }
+    doc = feature_to_document(dataset="ds", collection="c", feature=feature).to_dict()
+
+    assert (doc["doc_id"], doc["title"], doc["text"]) == ("ds:c:k1", "Tunet", "vernetype: Fredet kommune: Oslo")
+    assert doc["tags"] == ["Fredet"] and doc["source"]["web_url"] == "u"
+
+
+def test_centroid_and_bbox_are_written_only_with_a_geometry_sidecar() -> None:
+    feature = {
+        "id": "f1",
+        "properties": {"navn": "Kirke"},
+        "geometry": {"type": "Polygon", "coordinates": [[[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0], [0.0, 0.0]]]},
+    }
+    doc = feature_to_document(dataset="ds", collection="c1", feature=feature)
+    row = orjson.loads(doc.to_json())
+    assert "centroid" not in row and "bbox" not in row
+    assert row == orjson.loads(orjson.dumps({k: v for k, v in doc.to_dict().items() if k not in ("centroid", "bbox")}))
+
+    assert split_geometry(doc) is not None
+    row = orjson.loads(doc.to_json())
+    assert row["geojson_geometry"] is None and row["centroid"] == [1.0, 1.0] and row["bbox"] == [0.0, 0.0, 2.0, 2.0]
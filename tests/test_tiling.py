@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import pytest
+
+from rag_for_ra import paging, schema
+from rag_for_ra.http import HttpClient
+from rag_for_ra.io import count_rows, iter_jsonl
+from rag_for_ra.ogc import OgcSource
+from rag_for_ra.sync_api_to_openai import ogc_ingest_jsonl
+from rag_for_ra.tiling import TileHarvester
+
+from conftest import RaClient, id_less, lokal_ids
+
+
+def harvester(server, **kwargs) -> TileHarvester:
+    http = HttpClient(limiter=None, latency=None, backoff_s=0.0, retries=0)
+    return TileHarvester(source=OgcSource(server.url + "/ds", http), max_per_tile=10, workers=2, **kwargs)
+
+
+def test_features_without_geometry_are_reported_and_swept(ogc_server) -> None:
+    for feat in ogc_server.features[:3]:
+        feat["geometry"] = None
+    all_ids = {f["id"] for f in ogc_server.features}
+
+    untiled: list[int] = []
+    tiled = [f["id"] for f in harvester(ogc_server).iter_items("c1", on_untiled=untiled.append)]
+    assert set(tiled) == all_ids - {"f0", "f1", "f2"}
+    assert untiled == [3]
+
+    swept = [f["id"] for f in harvester(ogc_server).iter_items("c1", sweep=True)]
+    assert sorted(swept) == sorted(all_ids)
+
+
+def test_failing_offset_in_a_tile_is_skipped(ogc_server) -> None:
+    # One bad record: any page containing f5 fails with HTTP 500.
+    ogc_server.fail = lambda query, feats: "offset" in query and any(f["id"] == "f5" for f in feats)
+
+    with pytest.raises(Exception):
+        list(harvester(ogc_server).iter_items("c1"))
+
+    skipped: list[tuple[str, int]] = []
+    ids = [
+        f["id"]
+        for f in harvester(ogc_server).iter_items(
+            "c1", skip_failed=True, on_skip=lambda tile, offset, exc: skipped.append((tile.bbox(), offset))
+        )
+    ]
+    assert sorted(ids) == sorted(f["id"] for f in ogc_server.features if f["id"] != "f5")
+    assert len(skipped) == 1
+
+
+
+@pytest.mark.parametrize(
+    "features, override",
+    [(id_less(12), None), (lokal_ids(12), schema.Schema(id=("lokalId",), feature_id=False))],
+    ids=["fingerprint", "schema-id"],
+)
+def test_tiled_resume_skips_documents_already_written(ogc_server, tmp_path, monkeypatch, features, override) -> None:
+    if override is not None:
+        monkeypatch.setitem(schema.SCHEMAS, "ds:c1", override)
+    monkeypatch.setattr(schema, "_MAPPERS", {})
+    monkeypatch.setattr(paging, "STATE_FILE", tmp_path / "state.json")
+    ogc_server.features = features
+    out = tmp_path / "ds__c1.jsonl"
+
+    def sync(max_items: int) -> int:
+        return ogc_ingest_jsonl(
+            dataset="ds",
+            collection="c1",
+            bbox="9.9,59.8,10.2,60.0",
+            max_items=max_items,
+            limit=5,
+            out_jsonl=out,
+            http=RaClient(limiter=None, latency=None, server_url=ogc_server.url),
+            tiled=True,
+        )
+
+    assert sync(7) == 7
+    assert sync(0) == 5
+    assert sync(0) == 0
+    assert len({row["doc_id"] for row in iter_jsonl(out)}) == count_rows(out) == 12